@@ -0,0 +1,196 @@
+"""
+Command line entry point of the Balance_hidrico workflows.
+
+    python cli.py format-ideam --workers 4
+    python cli.py format-ideam --variable PRECIPITACION --start-year 1990
+    python cli.py dhime export_dhime.csv --chunksize 200000
+    python cli.py benchmark --years 5 20 --stations 1 10
+    python cli.py ionic-balance muestras.xlsx --sheet Termales --output balance.xlsx
+    python cli.py hidroquimica
+    python cli.py preprocess
+    python cli.py mixing --no-plot
+    python cli.py spyder
+    python cli.py chelsa temperatura --anio-fin 2021 --n-anios 30
+
+Each folder keeps its own config.py (imported with `from config import *`),
+so a command only puts its folder on sys.path and imports the workflow when
+it runs. Nothing heavy (pandas, matplotlib, sklearn, geopandas) is loaded to
+parse the arguments. Options that are not given keep the config.py value.
+The modules shared by every folder (instrumentation.py) are in the code root,
+which is on sys.path because this script runs from it.
+"""
+import os
+import sys
+import argparse
+import importlib
+
+code_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def load(folder, module, *shared):
+    """
+    Imports `module` with `folder` (relative to the code root) first on
+    sys.path, and the `shared` folders after it.
+    """
+    path = os.path.join(code_dir, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    for shared_folder in shared:
+        shared_path = os.path.join(code_dir, shared_folder)
+        if shared_path not in sys.path:
+            sys.path.append(shared_path)
+    return importlib.import_module(module)
+
+
+def given(args, *names):
+    """Keyword arguments of the options that were set in the command line."""
+    return {name: getattr(args, name) for name in names if getattr(args, name) is not None}
+
+
+def format_ideam(args):
+    workflow = load("format_ideam", "main")
+    return workflow.main(**given(args, "input_dir", "workers", "pipelined",
+                                 "stations", "variables", "start_year", "end_year"))
+
+
+def dhime(args):
+    workflow = load("format_ideam", "read_dhime")
+    return workflow.main(args.file_path, **given(args, "chunksize"))
+
+
+def benchmark(args):
+    workflow = load("format_ideam", "benchmark")
+    return workflow.main(args.options)
+
+
+def ionic_balance(args):
+    balance = load("hidroquimica", "ionic_balance")
+    reader = load("hidroquimica", "dataframe_creator")
+
+    df = reader.read_excel_to_dataframe(args.file_path, args.sheet_name or 0)
+    df = balance.calculate_ionic_balance(df, balance.iones)
+    if args.output:
+        df.to_excel(args.output, index=False)
+        print(f"Ionic balance saved to: {args.output}")
+    else:
+        print(df["ionic_balance"].describe())
+    return df
+
+
+def hidroquimica(args):
+    workflow = load("hidroquimica", "main")
+    return workflow.main(**given(args, "file_path", "sheet_name", "complejo", "report_path"))
+
+
+def preprocess(args):
+    workflow = load("hidroquimica", "preprocess.main")
+    return workflow.main(**given(args, "file_path", "sheet_name", "complejo", "output_path"))
+
+
+def mixing(args):
+    workflow = load("mixing_regression", "main")
+    return workflow.main(plot=not args.no_plot, **given(args, "file_path", "output_path", "report_path"))
+
+
+def spyder(args):
+    # The cached reader is in hidroquimica/utils
+    workflow = load(os.path.join("hidroquimica", "plots", "spyder_plots"), "spyder_plot", "hidroquimica")
+    return workflow.main(**given(args, "file_path"))
+
+
+chelsa_scripts = {
+    "temperatura": "temperature_CHELSA_30",
+    "precipitacion": "preciptitation_CHELSA",
+    "precipitacion-30y": "preciptitation_CHELSA_30y",
+}
+
+
+def chelsa(args):
+    workflow = load("modelos_hidroclimaticos", chelsa_scripts[args.variable])
+    options = ["ruta_shape", "carpeta_salida", "carpeta_reportes"]
+    options += ["anio"] if args.variable == "precipitacion" else ["anio_fin", "n_anios"]
+    return workflow.main(**given(args, *options))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Balance_hidrico workflows")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("format-ideam", help="Format every IDEAM station workbook of a folder")
+    command.add_argument("--input", dest="input_dir", help="Folder with the station workbooks")
+    command.add_argument("--workers", type=int, help="Worker processes (1 runs serially)")
+    command.add_argument("--pipelined", action="store_true", default=None,
+                         help="Overlap the workbook reads, the compute and the writes")
+    command.add_argument("--station", dest="stations", action="append",
+                         help="Only the workbooks of this station (repeatable)")
+    command.add_argument("--variable", dest="variables", action="append",
+                         help="Only the workbooks of this variable (repeatable)")
+    command.add_argument("--start-year", type=int, help="Only workbooks with data from this year on")
+    command.add_argument("--end-year", type=int, help="Only workbooks with data up to this year")
+    command.set_defaults(run=format_ideam)
+
+    command = commands.add_parser("dhime", help="Monthly tables of every station of a DHIME CSV/TXT export")
+    command.add_argument("file_path")
+    command.add_argument("--chunksize", type=int, help="Rows read at a time")
+    command.set_defaults(run=dhime)
+
+    # Every option (--help included) goes to benchmark.py
+    command = commands.add_parser("benchmark", add_help=False,
+                                  help="Benchmark of the format_ideam stages (see benchmark.py)")
+    command.set_defaults(run=benchmark)
+
+    command = commands.add_parser("ionic-balance", help="Ionic balance of the samples of an Excel sheet")
+    command.add_argument("file_path")
+    command.add_argument("--sheet", dest="sheet_name")
+    command.add_argument("--output", help="Excel file for the samples with their balance")
+    command.set_defaults(run=ionic_balance)
+
+    for name, run, help_text in [
+        ("hidroquimica", hidroquimica, "Hidrochemistry workflow (crossplot, ionic balance, log transform)"),
+        ("preprocess", preprocess, "Ionic balance and stats table per sample"),
+    ]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--file", dest="file_path")
+        command.add_argument("--sheet", dest="sheet_name")
+        command.add_argument("--complejo", help="Volcanic complex to keep")
+        if name == "hidroquimica":
+            command.add_argument("--report", dest="report_path")
+        else:
+            command.add_argument("--output", dest="output_path", help="Output folder")
+        command.set_defaults(run=run)
+
+    command = commands.add_parser("mixing", help="Two end-member mixing model")
+    command.add_argument("--file", dest="file_path")
+    command.add_argument("--output", dest="output_path")
+    command.add_argument("--report", dest="report_path")
+    command.add_argument("--no-plot", action="store_true")
+    command.set_defaults(run=mixing)
+
+    command = commands.add_parser("spyder", help="Spyder plot of the samples")
+    command.add_argument("--file", dest="file_path")
+    command.set_defaults(run=spyder)
+
+    command = commands.add_parser("chelsa", help="Download and clip CHELSA monthly rasters")
+    command.add_argument("variable", choices=sorted(chelsa_scripts))
+    command.add_argument("--shape", dest="ruta_shape")
+    command.add_argument("--output", dest="carpeta_salida")
+    command.add_argument("--reports", dest="carpeta_reportes")
+    command.add_argument("--anio", type=int, help="Year (precipitacion)")
+    command.add_argument("--anio-fin", type=int, help="Last year (30 year downloads)")
+    command.add_argument("--n-anios", type=int, help="Number of years (30 year downloads)")
+    command.set_defaults(run=chelsa)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, options = parser.parse_known_args(argv)
+    if args.command == "benchmark":
+        args.options = options
+    elif options:
+        parser.error(f"unrecognized arguments: {' '.join(options)}")
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    main()
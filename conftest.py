@@ -0,0 +1,61 @@
+"""
+Test setup shared by the code folders.
+
+Each folder (format_ideam, hidroquimica, mixing_regression...) runs its
+flat modules with the folder on sys.path (`from config import *`, see
+cli.py), so several folders have modules with the same name (config, utils,
+main). Before collecting or running the tests of a folder, the folder goes
+first on sys.path and the modules imported from the other folders are set
+aside in sys.modules, to be put back when their tests run.
+"""
+import os
+import sys
+
+code_dir = os.path.dirname(os.path.abspath(__file__))
+_set_aside = {}
+
+# Modules shared by every folder (cli.py, instrumentation.py)
+if code_dir not in sys.path:
+    sys.path.append(code_dir)
+
+
+def code_folder(path):
+    """Code folder (first level under the code root) of `path`, None outside them."""
+    path = os.path.abspath(str(path))
+    if not path.startswith(code_dir + os.sep):
+        return None
+    parts = os.path.relpath(path, code_dir).split(os.sep)
+    return parts[0] if len(parts) > 1 or os.path.isdir(path) else None
+
+
+def _workflow_folder(module):
+    """Folder of a workflow module (not the tests, not the code root ones)."""
+    path = getattr(module, "__file__", None)
+    if not path or os.sep + "tests" + os.sep in os.path.abspath(path):
+        return None
+    return code_folder(path)
+
+
+def activate(folder):
+    """Puts `folder` first on sys.path with its own modules in sys.modules."""
+    for name, module in list(sys.modules.items()):
+        owner = _workflow_folder(module)
+        if owner is not None and owner != folder:
+            _set_aside.setdefault(owner, {})[name] = sys.modules.pop(name)
+    sys.modules.update(_set_aside.pop(folder, {}))
+    path = os.path.join(code_dir, folder)
+    if path in sys.path:
+        sys.path.remove(path)
+    sys.path.insert(0, path)
+
+
+def pytest_collectstart(collector):
+    folder = code_folder(collector.path) if getattr(collector, "path", None) else None
+    if folder is not None:
+        activate(folder)
+
+
+def pytest_runtest_setup(item):
+    folder = code_folder(item.path)
+    if folder is not None:
+        activate(folder)
@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import traceback
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import *
+from utils import project_dir
+from manifest import load_manifests, manifest_key
+from store import read_table
+from data_cube import StationCube
+
+from instrumentation import report, stage
+
+
+def list_station_files(input_dir):
+    """Returns the station workbooks of `input_dir` in a stable order."""
+    return sorted(
+        os.path.join(input_dir, filename)
+        for filename in os.listdir(input_dir)
+        if filename.endswith('.xlsx') or filename.endswith('.xls')
+    )
+
+
+def process_station_file(file_path, entry=None, incremental=incremental_build):
+    """
+    Runs the full chain (read -> pivot -> clean -> stats -> plot) for one
+    station workbook. This is the body of the original loop in main.py.
+
+    With `incremental`, the workbook hash, the config values and the code
+    version are compared with the station manifest `entry` of the previous
+    run: unchanged stations are skipped and, when only the config changed,
+    the raw table is read back and only clean/stats/plot are rebuilt.
+
+    The outputs go to <station>/<variable>/, built in a staging folder and
+    swapped in whole, so workbooks of the same station can run in parallel.
+    """
+    from read_xks import read_xks_excel
+    from format_data import pivot_monthly_dataframe
+    from utils import staged_station_directory, variable_directory
+    from manifest import file_hash, code_version, config_values, rebuild_plan, save_manifest
+    from store import table_path, write_table, kept_files
+
+    print('Running script for file: ', file_path)
+
+    label = os.path.basename(file_path)
+
+    if not incremental:
+        with stage('read', file=label):
+            df, info = read_xks_excel(file_path, streaming=streaming_reader)
+        station = info['B2']
+        variable = info['B6']
+        # Built aside and swapped in whole, see utils.publish_directory
+        with staged_station_directory(station, variable, kept_files(variable)) as staging_dir:
+            with stage('pivot', file=label):
+                formatted_df = pivot_monthly_dataframe(df, staging_dir, variable)
+            process_downstream(formatted_df, staging_dir, variable, label)
+            process_records(df, staging_dir, variable, label)
+        return {'station': station, 'variable': variable,
+                'output_dir': variable_directory(station, variable),
+                'metadata': info['D6'], 'rebuilt': 'all'}
+
+    with stage('manifest', file=label):
+        input_hash = file_hash(file_path)
+        version = code_version()
+        plan = rebuild_plan(entry, input_hash, version, config_values(entry and entry['variable']))
+
+    if plan == 'none':
+        print(f"Unchanged, skipping: {file_path}")
+        return {'station': entry['station'], 'variable': entry['variable'],
+                'output_dir': variable_directory(entry['station'], entry['variable']), 'rebuilt': 'none'}
+
+    if plan == 'all':
+        with stage('read', file=label):
+            df, info = read_xks_excel(file_path, streaming=streaming_reader)
+        station = info['B2']
+        variable = info['B6']
+        metadata = info['D6']
+    else:
+        from store import read_table
+        station = entry['station']
+        variable = entry['variable']
+        metadata = entry.get('metadata')
+        print(f"Raw data unchanged, rebuilding clean/stats/plot for {station} - {variable}")
+        with stage('read_raw', file=label):
+            formatted_df = read_table(variable_directory(station, variable), variable, 'raw')
+
+    with staged_station_directory(station, variable, kept_files(variable)) as staging_dir:
+        if plan == 'all':
+            with stage('pivot', file=label):
+                formatted_df = pivot_monthly_dataframe(df, staging_dir, variable)
+        else:
+            write_table(formatted_df, staging_dir, variable, 'raw')
+        outputs = process_downstream(formatted_df, staging_dir, variable, label)
+        if plan == 'all':
+            outputs += process_records(df, staging_dir, variable, label)
+        save_manifest(staging_dir, variable, {
+            'input_file': manifest_key(file_path),
+            'input_hash': input_hash,
+            'code_version': version,
+            'config': config_values(variable),
+            'station': station,
+            'variable': variable,
+            'metadata': metadata,
+            'raw_output': os.path.basename(table_path(staging_dir, variable, 'raw')),
+            'outputs': outputs,
+        })
+    return {'station': station, 'variable': variable,
+            'output_dir': variable_directory(station, variable),
+            'metadata': metadata, 'rebuilt': plan}
+
+
+def process_downstream(formatted_df, output_dir, variable, label=None):
+    """Clean, stats and plot stages. Returns the output file names."""
+    from clean_data import clean_data
+    from plot_histogram import plot_multiyear_monthly_histogram
+    from compute_stats import export_stats
+    from store import table_path, export_station_workbook
+
+    with stage('clean', file=label):
+        clean_data_df = clean_data(formatted_df, output_dir, variable)
+    with stage('stats', file=label):
+        export_stats(clean_data_df, output_dir, variable)
+    outputs = [
+        os.path.basename(table_path(output_dir, variable, stage))
+        for stage in ['Z_scores', 'cleaned', 'outliers', 'stats']
+        if stage != 'Z_scores' or save_z_scores
+    ]
+    # A mean +- std bar chart means nothing for directions (see direction_sectors)
+    if variable_aggregation.get(variable) != 'circular_mean':
+        with stage('plot', file=label):
+            plot_multiyear_monthly_histogram(
+                clean_data_df,
+                f"Histograma Mensual Multianual - {variable}",
+                variable_labels[variable],
+                os.path.join(output_dir, f"{variable}_histograma.png")
+                )
+        outputs.append(f"{variable}_histograma.png")
+    if export_excel:
+        with stage('excel', file=label):
+            outputs.append(os.path.basename(export_station_workbook(output_dir, variable)))
+    return outputs
+
+
+def process_records(df, output_dir, variable, label=None):
+    """
+    Tables computed from the workbook records instead of the monthly table:
+    streamflow tables (see streamflow.py) and wind direction sectors and
+    records (see wind.py). Returns the output file names.
+    """
+    if variable in streamflow_variables:
+        from streamflow import export_streamflow
+        with stage('streamflow', file=label):
+            return export_streamflow(df, output_dir, variable)
+    if variable in (wind_direction_variable, wind_speed_variable):
+        from wind import export_wind_tables
+        with stage('wind', file=label):
+            return export_wind_tables(df, output_dir, variable)
+    return []
+
+
+def run_station(file_path, entry=None):
+    """Wraps process_station_file so a failing station never aborts the batch."""
+    start = time.perf_counter()
+    result = {'file': file_path}
+    try:
+        result.update(process_station_file(file_path, entry))
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = repr(e)
+        result['traceback'] = traceback.format_exc()
+    result['elapsed_s'] = round(time.perf_counter() - start, 3)
+    # Stage timings travel back to the parent with the result
+    result['timings'] = report.drain()
+    return result
+
+
+def add_to_cube(results, cube_dir):
+    """
+    Appends the cleaned table of every rebuilt station to the data cube.
+    Done here, in the parent process, so the cube has a single writer.
+    """
+    cube = StationCube(cube_dir)
+    for result in results:
+        if result['status'] != 'ok' or result.get('rebuilt') == 'none':
+            continue
+        cleaned = read_table(result['output_dir'], result['variable'], 'cleaned')
+        cube.append(result['station'], result['variable'], cleaned, result.get('metadata'))
+    print(f"Data cube updated: {cube_dir}")
+
+
+def fill_gaps_of(variables, cube_dir):
+    """Gap filling of the given variables (see gap_filling.py); never aborts the batch."""
+    from gap_filling import fill_station_gaps
+
+    coordinates_path = os.path.join(project_dir(), station_coordinates_file)
+    if not os.path.exists(coordinates_path):
+        print(f"Station coordinates not found, gap filling skipped: {coordinates_path}")
+        return
+    try:
+        with stage('gap_fill'):
+            fill_station_gaps(cube_dir, variables)
+    except Exception as e:
+        print(f"Gap filling failed: {e!r}")
+
+
+def init_worker():
+    # Workers never open windows: plt.show() is a no-op on Agg
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def run_batch(input_dir, workers=batch_workers, summary_path=None, pipelined=pipelined_batch,
+              stations=None, variables=None, start_year=None, end_year=None):
+    """
+    Processes every station workbook of `input_dir`, spreading them over a
+    pool of `workers` processes (workers=1 runs serially in this process).
+
+    Each station is processed exactly as in a serial run; failures are
+    collected in the run summary instead of stopping the batch. With
+    config.incremental_build, stations are skipped or partially rebuilt
+    according to their manifests (see process_station_file).
+
+    Parameters:
+        input_dir (str): Folder with the IDEAM station workbooks.
+        workers (int): Number of worker processes.
+        summary_path (str): JSON file for the run summary. Defaults to
+            run_summary_file inside the stations output folder.
+        pipelined (bool): Overlap reads, compute and writes (see pipelined.py).
+        stations, variables (list): Only process the workbooks of these
+            stations/variables (None = all).
+        start_year, end_year (int): Only process the workbooks whose records
+            overlap this period. The selection is made with the workbook
+            catalog (see catalog.py), without opening unchanged workbooks.
+
+    Returns:
+        dict: The run summary.
+    """
+    selection = {'stations': stations, 'variables': variables,
+                 'start_year': start_year, 'end_year': end_year}
+    if any(value is not None for value in selection.values()):
+        from catalog import select_station_files
+        with stage('catalog'):
+            files = select_station_files(input_dir, workers=workers, **selection)
+    else:
+        files = list_station_files(input_dir)
+    total = len(files)
+    output_root = os.path.join(project_dir(), output_stations)
+    manifests = load_manifests(output_root) if incremental_build else {}
+
+    def entry(file_path):
+        return manifests.get(manifest_key(file_path))
+
+    started = datetime.now()
+    start = time.perf_counter()
+    print(f"Processing {total} files with {workers} worker(s){' (pipelined)' if pipelined else ''}")
+
+    results = []
+
+    def progress(result):
+        report.extend(result.pop('timings', None))
+        results.append(result)
+        rebuilt = f", rebuilt: {result['rebuilt']}" if 'rebuilt' in result else ''
+        print(f"[{len(results)}/{total}] {result['status']}: {os.path.basename(result['file'])}"
+              f" ({result['elapsed_s']} s{rebuilt})")
+        if result['status'] != 'ok':
+            print(result['error'])
+
+    if pipelined:
+        from pipelined import run_pipeline
+        run_pipeline(files, entry, progress, workers)
+    elif workers <= 1:
+        for file_path in files:
+            progress(run_station(file_path, entry(file_path)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            futures = {pool.submit(run_station, file_path, entry(file_path)): file_path
+                       for file_path in files}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. out of memory)
+                    result = {'file': futures[future], 'status': 'failed',
+                              'error': repr(e), 'elapsed_s': None}
+                progress(result)
+
+    results.sort(key=lambda r: r['file'])
+    if update_data_cube:
+        with stage('cube'):
+            add_to_cube(results, os.path.join(output_root, data_cube_folder))
+        rebuilt = {r['variable'] for r in results if r['status'] == 'ok' and r.get('rebuilt') != 'none'}
+        if gap_filling and rebuilt:
+            fill_gaps_of(rebuilt, os.path.join(output_root, data_cube_folder))
+        if trend_tests and rebuilt:
+            from trend_tests import export_trend_tests
+            with stage('trend_tests'):
+                export_trend_tests(os.path.join(output_root, data_cube_folder), output_root)
+    if wind_roses:
+        from wind import export_wind_roses
+        with stage('wind_rose'):
+            export_wind_roses(results)
+    failed = [r for r in results if r['status'] != 'ok']
+    summary = {
+        'started': started.isoformat(timespec='seconds'),
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'elapsed_s': round(time.perf_counter() - start, 3),
+        'input_dir': input_dir,
+        'selection': {key: value for key, value in selection.items() if value is not None},
+        'workers': workers,
+        'files': total,
+        'succeeded': total - len(failed),
+        'failed': len(failed),
+        'skipped': sum(1 for r in results if r.get('rebuilt') == 'none'),
+        'stations': results,
+    }
+
+    if summary_path is None:
+        summary_path = os.path.join(output_root, run_summary_file)
+    os.makedirs(os.path.dirname(summary_path), exist_ok=True)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False, default=str)
+
+    print(f"Done: {summary['succeeded']} ok, {summary['failed']} failed in {summary['elapsed_s']} s")
+    print(f"Run summary saved to: {summary_path}")
+    report.write(os.path.join(output_root, run_report_file))
+    return summary
@@ -0,0 +1,188 @@
+"""
+Benchmark of the format_ideam stages on synthetic workbooks.
+
+Run from the code folder:
+    python cli.py benchmark --years 5 20 50 --frequency daily hourly --stations 1 10
+    python cli.py benchmark --variables TEMPERATURA CAUDAL --years 20
+    python cli.py benchmark --compare results_old.json results_new.json
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+
+from config import *
+from synthetic_data import synthetic_station_files
+
+from instrumentation import RunReport
+
+benchmark_stages = ["read", "pivot", "clean", "stats", "plot", "records"]
+# Variables of the default mix: the sum, mean, streamflow, wind and sunshine
+# aggregation paths
+benchmark_variables = ["PRECIPITACION", "TEMPERATURA", "CAUDAL", "DIR VIENTO", "VEL VIENTO", "BRILLO SOLAR"]
+
+
+def code_revision():
+    """Git revision of the code, or None outside a repository."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import numpy
+    import pandas
+    import openpyxl
+    import matplotlib
+    return {
+        "revision": code_revision(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "openpyxl": openpyxl.__version__,
+        "matplotlib": matplotlib.__version__,
+    }
+
+
+def benchmark_files(files, report, case, streaming=True):
+    """Runs every stage over `files`, timing each one in `report`."""
+    from read_xks import read_xks_excel
+    from format_data import pivot_monthly_dataframe
+    from clean_data import clean_data
+    from compute_stats import compute_stats
+    from plot_histogram import plot_multiyear_monthly_histogram
+    from batch import process_records
+
+    output_dir = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        for file_path in files:
+            with report.stage("read", **case):
+                df, info = read_xks_excel(file_path, streaming=streaming)
+            variable = info['B6']
+            with report.stage("pivot", **case):
+                formatted_df = pivot_monthly_dataframe(df, output_dir, variable)
+            with report.stage("clean", **case):
+                clean_data_df = clean_data(formatted_df, output_dir, variable)
+            with report.stage("stats", **case):
+                compute_stats(clean_data_df, variable)
+            # No histogram of directions, as in batch.process_downstream
+            if variable_aggregation.get(variable) != 'circular_mean':
+                with report.stage("plot", **case):
+                    plot_multiyear_monthly_histogram(
+                        clean_data_df, variable, variable_labels[variable],
+                        os.path.join(output_dir, f"{variable}_histograma.png"))
+            # Streamflow and wind tables from the records (nothing for the others)
+            with report.stage("records", **case):
+                process_records(df, output_dir, variable)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def run_benchmarks(years, frequencies, stations, work_dir, repeat=1, streaming=True,
+                   variables=benchmark_variables):
+    """
+    Times every stage for each variable x record length x frequency x
+    station count.
+
+    Returns:
+        dict: Environment and one row per case and stage with the total and
+        per-station wall/CPU time and the peak memory.
+    """
+    rows = []
+    for variable in variables:
+        for frequency in frequencies:
+            for n_years in years:
+                for n_stations in stations:
+                    print(f"Generating {n_stations} {variable} {frequency} workbooks of {n_years} years...")
+                    files = synthetic_station_files(work_dir, n_stations, n_years, frequency, variable)
+                    case = {"variable": variable, "frequency": frequency, "years": n_years,
+                            "stations": n_stations}
+                    for _ in range(repeat):
+                        report = RunReport("benchmark")
+                        start = time.perf_counter()
+                        benchmark_files(files, report, case, streaming)
+                        total = time.perf_counter() - start
+                        for summary in report.summary():
+                            rows.append({
+                                **case,
+                                "stage": summary["stage"],
+                                "wall_s": summary["wall_s"],
+                                "cpu_s": summary["cpu_s"],
+                                "wall_s_per_station": round(summary["wall_s"] / n_stations, 4),
+                                "max_rss_delta_mb": summary["max_rss_delta_mb"],
+                                "process_peak_rss_mb": summary["process_peak_rss_mb"],
+                            })
+                        print(f"  {variable} {frequency} {n_years}y x {n_stations}: {total:.2f} s")
+    return {"environment": environment(), "streaming_reader": streaming, "results": rows}
+
+
+def _best(rows):
+    # Fastest repetition of every case and stage
+    best = {}
+    for row in rows:
+        # Results saved before the variable mix are precipitation only
+        key = (row.get("variable", "PRECIPITACION"), row["frequency"], row["years"], row["stations"],
+               row["stage"])
+        if key not in best or row["wall_s"] < best[key]["wall_s"]:
+            best[key] = row
+    return best
+
+
+def compare(baseline_path, current_path):
+    """Prints the wall time ratio current/baseline for every common case and stage."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(current_path, encoding="utf-8") as f:
+        current = json.load(f)
+    old, new = _best(baseline["results"]), _best(current["results"])
+    print(f"baseline {baseline['environment'].get('revision')} -> current {current['environment'].get('revision')}")
+    print(f"{'variable':>13} {'frequency':>9} {'years':>5} {'stations':>8} {'stage':>7} "
+          f"{'old s':>9} {'new s':>9} {'ratio':>6}")
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key]["wall_s"] / old[key]["wall_s"] if old[key]["wall_s"] else float("nan")
+        print(f"{key[0]:>13} {key[1]:>9} {key[2]:>5} {key[3]:>8} {key[4]:>7} "
+              f"{old[key]['wall_s']:>9.3f} {new[key]['wall_s']:>9.3f} {ratio:>6.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the format_ideam stages")
+    parser.add_argument("--years", type=int, nargs="+", default=[5, 20, 50])
+    parser.add_argument("--frequency", nargs="+", default=["daily", "hourly"],
+                        choices=["daily", "hourly"])
+    parser.add_argument("--stations", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--variables", nargs="+", default=benchmark_variables,
+                        choices=sorted(variable_labels))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--legacy-reader", action="store_true",
+                        help="Time the full openpyxl reader instead of the streaming one")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "format_ideam_benchmark"),
+                        help="Folder for the synthetic workbooks (reused between runs)")
+    parser.add_argument("--output", help="JSON results file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run_benchmarks(args.years, args.frequency, args.stations, args.work_dir,
+                             args.repeat, streaming=not args.legacy_reader, variables=args.variables)
+    output = args.output or f"benchmark_{results['environment']['revision'] or 'local'}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
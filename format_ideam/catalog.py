@@ -0,0 +1,219 @@
+"""
+Catalog of the input station workbooks (SQLite).
+
+One row per workbook with its station (B2), variable (B6), metadata (D6),
+first and last date, number of data rows, mtime, size and SHA-256, so the
+files of a station, variable or period are found without opening them.
+refresh() only opens the workbooks that are new or whose mtime or size
+changed, and forgets the ones that were deleted.
+
+Example:
+    catalog = WorkbookCatalog(catalog_path())
+    catalog.refresh(input_dir)
+    files = catalog.select(variables=["PRECIPITACION"], start_year=1990)['path']
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from config import *
+
+catalog_columns = ['path', 'folder', 'file_name', 'station', 'variable', 'metadata',
+                   'first_date', 'last_date', 'n_rows', 'mtime', 'size', 'hash', 'indexed', 'error']
+
+schema = """
+CREATE TABLE IF NOT EXISTS workbooks (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    station TEXT,
+    variable TEXT,
+    metadata TEXT,
+    first_date TEXT,
+    last_date TEXT,
+    n_rows INTEGER,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT,
+    indexed TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS workbooks_station ON workbooks (station, variable);
+CREATE INDEX IF NOT EXISTS workbooks_folder ON workbooks (folder);
+"""
+
+
+def catalog_path():
+    """Default catalog file, in the stations output folder."""
+    from utils import project_dir
+    return os.path.join(project_dir(), output_stations, catalog_file)
+
+
+def workbook_summary(file_path):
+    """
+    Catalog row of one workbook. Only the header cells and the date column
+    are read (read-only mode), not the values.
+    """
+    import openpyxl
+    from read_xks import header_row
+    from manifest import file_hash
+
+    stat = os.stat(file_path)
+    row = {
+        'path': os.path.abspath(file_path),
+        'folder': os.path.dirname(os.path.abspath(file_path)),
+        'file_name': os.path.basename(file_path),
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'indexed': datetime.now().isoformat(timespec='seconds'),
+    }
+    try:
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            top_rows = list(ws.iter_rows(min_row=1, max_row=6, max_col=4, values_only=True))
+            top_rows += [()] * (6 - len(top_rows))
+
+            def cell(r, c):
+                values = top_rows[r - 1]
+                return values[c - 1] if c <= len(values) else None
+
+            dates = [values[0] for values in ws.iter_rows(
+                min_row=header_row + 1, max_col=1, values_only=True) if values]
+        finally:
+            wb.close()
+        dates = pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce').dropna()
+        row.update({
+            'station': None if cell(2, 2) is None else str(cell(2, 2)),
+            'variable': None if cell(6, 2) is None else str(cell(6, 2)),
+            'metadata': None if cell(6, 4) is None else str(cell(6, 4)),
+            'first_date': dates.min().isoformat(sep=' ') if len(dates) else None,
+            'last_date': dates.max().isoformat(sep=' ') if len(dates) else None,
+            'n_rows': len(dates),
+            'hash': file_hash(file_path),
+            'error': None,
+        })
+    except Exception as e:
+        # Kept with its error so it is not reopened until it changes
+        row['error'] = repr(e)
+    return row
+
+
+class WorkbookCatalog:
+    """
+    SQLite index of the station workbooks (one row per file, see
+    catalog_columns). Paths are stored absolute, so several input folders
+    can share one catalog.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(schema)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def refresh(self, input_dir, workers=batch_workers):
+        """
+        Brings the rows of `input_dir` up to date: new workbooks and those
+        whose mtime or size changed are (re)read, rows of deleted workbooks
+        are removed.
+
+        Returns:
+            dict: Number of added, updated, removed and unchanged workbooks.
+        """
+        from batch import list_station_files
+
+        folder = os.path.abspath(input_dir)
+        with self._connect() as connection:
+            known = {path: (mtime, size) for path, mtime, size in connection.execute(
+                "SELECT path, mtime, size FROM workbooks WHERE folder = ?", (folder,))}
+
+        current = [os.path.abspath(f) for f in list_station_files(input_dir)]
+        changed = []
+        for file_path in current:
+            stat = os.stat(file_path)
+            if known.get(file_path) != (stat.st_mtime, stat.st_size):
+                changed.append(file_path)
+        removed = sorted(set(known) - set(current))
+
+        if workers <= 1 or len(changed) <= 1:
+            rows = [workbook_summary(file_path) for file_path in changed]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                rows = list(pool.map(workbook_summary, changed))
+
+        with self._connect() as connection:
+            connection.executemany("DELETE FROM workbooks WHERE path = ?", [(p,) for p in removed])
+            connection.executemany(
+                f"INSERT OR REPLACE INTO workbooks ({', '.join(catalog_columns)}) "
+                f"VALUES ({', '.join('?' * len(catalog_columns))})",
+                [tuple(row.get(c) for c in catalog_columns) for row in rows])
+
+        counts = {
+            'added': sum(1 for row in rows if row['path'] not in known),
+            'updated': sum(1 for row in rows if row['path'] in known),
+            'removed': len(removed),
+            'unchanged': len(current) - len(changed),
+        }
+        failed = [row['file_name'] for row in rows if row['error']]
+        print(f"Catalog refreshed: {counts['added']} added, {counts['updated']} updated, "
+              f"{counts['removed']} removed, {counts['unchanged']} unchanged")
+        if failed:
+            print(f"Could not be indexed: {', '.join(failed)}")
+        return counts
+
+    def select(self, stations=None, variables=None, start_year=None, end_year=None, input_dir=None):
+        """
+        Workbooks of the given stations and variables whose records overlap
+        the start_year..end_year period (None = no filter).
+
+        Returns:
+            pd.DataFrame: Catalog rows, sorted by path.
+        """
+        conditions, parameters = ["error IS NULL"], []
+        if input_dir is not None:
+            conditions.append("folder = ?")
+            parameters.append(os.path.abspath(input_dir))
+        for column, values in (('station', stations), ('variable', variables)):
+            if values is not None:
+                values = [values] if isinstance(values, str) else list(values)
+                conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+                parameters += values
+        if start_year is not None:
+            conditions.append("last_date >= ?")
+            parameters.append(f"{int(start_year):04d}-01-01")
+        if end_year is not None:
+            conditions.append("first_date < ?")
+            parameters.append(f"{int(end_year) + 1:04d}-01-01")
+
+        query = f"SELECT * FROM workbooks WHERE {' AND '.join(conditions)} ORDER BY path"
+        with self._connect() as connection:
+            return pd.read_sql_query(query, connection, params=parameters)
+
+    def to_frame(self):
+        """Every row of the catalog."""
+        with self._connect() as connection:
+            return pd.read_sql_query("SELECT * FROM workbooks ORDER BY path", connection)
+
+
+def select_station_files(input_dir, stations=None, variables=None, start_year=None, end_year=None,
+                         workers=batch_workers):
+    """Refreshes the catalog of `input_dir` and returns the selected workbook paths."""
+    catalog = WorkbookCatalog(catalog_path())
+    catalog.refresh(input_dir, workers)
+    selected = catalog.select(stations, variables, start_year, end_year, input_dir=input_dir)
+    print(f"Selected {len(selected)} workbooks from the catalog")
+    return selected['path'].tolist()
@@ -1,8 +1,8 @@
 from config import *
-from read_xks import *
-from format_data import pivot_monthly_dataframe
-from utils import manage_station_directory
+from store import write_table, remove_table
+from outliers import detect_outliers
 import numpy as np
+import pandas as pd
 import os
 
 def clean_data (df, output_dir, variable):
@@ -18,51 +18,71 @@ def drop_years_with_min_months(df):
     print(f"Dropped {dropped_rows} rows with less than {min_months_per_year} months.")
     return df
 
-def compute_z_scores(df, output_dir, variable):
-    selected_data = df[months].to_numpy()
-    clean_values = selected_data[~np.isnan(selected_data)]
-    mean = clean_values.mean()
-    std = clean_values.std()
-    print('mean\n', mean)
-    print('std\n', std)
+def outlier_tables(df, method=outlier_method, variable=None):
+    """
+    Outliers of the monthly table with the engine of outliers.py. The scores
+    are linear, so directions (circular_mean variables, where 350 and 10
+    degrees are close) are never nullified.
 
-    z_scores = np.abs((df - mean)) / std
-    z_scores['Year'] = df['Year']
+    Returns:
+        tuple: (scores, cleaned, outliers). scores is the Z_scores table
+        (None if save_z_scores is off), cleaned is `df` with the outliers set
+        to NaN and outliers lists each nullified month (Year, Month, value, score).
+    """
+    values = df[months].to_numpy(dtype=float)
+    if variable_aggregation.get(variable) == 'circular_mean':
+        print(f"Outlier detection skipped for the directions of {variable}")
+        mask, scores = np.zeros(values.shape, dtype=bool), np.full(values.shape, np.nan)
+    else:
+        mask, scores = detect_outliers(values, method)
 
-     # Save the pivoted DataFrame to an Excel file
-    output_file = os.path.join(output_dir, variable+'_Z_scores.xlsx')
-    z_scores.to_excel(output_file, index=False)
-    print(f"Z scores data saved to: {output_file}")
-    print('z_scores\n', z_scores.head())
-    return z_scores
+    df_cleaned = df.copy()
+    df_cleaned[months] = np.where(mask, np.nan, values)
+
+    rows, columns = np.nonzero(mask)
+    outliers = pd.DataFrame({
+        'Year': df['Year'].to_numpy()[rows],
+        'Month': np.array(months)[columns],
+        'value': values[rows, columns],
+        'score': scores[rows, columns],
+    })
+    print(f"Nullified {len(outliers)} values with {method} scores above {outlier_thresholds[method]}")
+
+    score_table = None
+    if save_z_scores:
+        score_table = pd.DataFrame(scores, columns=months, index=df.index)
+        score_table.insert(0, 'Year', df['Year'])
+        if verbose:
+            print('z_scores\n', score_table.head())
+    return score_table, df_cleaned, outliers
+
+def clean_tables(df, variable=None):
+    """
+    Same as clean_data without writing anything.
+
+    Returns:
+        tuple: (z_scores, cleaned, outliers) DataFrames, z_scores is None
+        when save_z_scores is off.
+    """
+    df_dropped_years = drop_years_with_min_months(df)
+    return outlier_tables(df_dropped_years, variable=variable)
 
 def nullify_high_z_scores(df, output_dir, variable):
-    z_scores = compute_z_scores(df, output_dir, variable)  # Assuming this returns same-shaped DataFrame
-    
-    # Create a mask of values to nullify
-    to_nullify = z_scores > z_score_threshold
-    
-    # Make a copy to avoid SettingWithCopyWarning
-    df_cleaned = df.copy()
-    
-    # Nullify values where Z-score exceeds threshold
-    df_cleaned[to_nullify] = np.nan
-    df_cleaned['Year'] = df['Year']  # Keep the Year column intact
-    
-    # Count affected values (not rows)
-    num_nullified = to_nullify.sum().sum()
-    print(f"Nullified {num_nullified} values with Z-scores above {z_score_threshold}")
-    
-    # Save the cleaned DataFrame to an Excel file
+    z_scores, df_cleaned, outliers = outlier_tables(df, variable=variable)
+    if z_scores is not None:
+        output_file = write_table(z_scores, output_dir, variable, 'Z_scores')
+        print(f"Z scores data saved to: {output_file}")
+    else:
+        remove_table(output_dir, variable, 'Z_scores')
+    write_table(outliers, output_dir, variable, 'outliers')
+
+    # Save the cleaned DataFrame
     print(f"Saving cleaned data to {output_dir} for variable {variable}")
-    output_file = os.path.join(output_dir, variable+'_cleaned.xlsx')
-    df_cleaned.to_excel(output_file, index=False)
+    write_table(df_cleaned, output_dir, variable, 'cleaned')
     return df_cleaned
 
 
 
-
-
 # Function calling
 """ df, info = read_xks_excel(r"C:\Code\TIP\Balance_hidrico\input\estaciones_ideam\1_El Paraiso.xlsx")
 output_dir = manage_station_directory(info['B2'])
@@ -4,46 +4,240 @@ import pandas as pd
 
 
 from config import *
-from read_xks import *
-from format_data import pivot_monthly_dataframe
-from clean_data import clean_data
-from utils import manage_station_directory
-from plot_histogram import plot_multiyear_monthly_histogram
+from store import write_table
 
 
-def compute_stats(df):
+def _zero_out_fperr(arg):
+    # Same guard pandas applies before skew/kurtosis
+    return np.where(np.abs(arg) < 1e-14, 0, arg)
+
+
+def _skew_kurtosis(n, m2, m3, m4):
     """
-    Compute basic statistics for the DataFrame.
-    Returns a dictionary with mean, std, min, max for each month.
+    Bias-corrected skewness and excess kurtosis (the pandas estimators) from
+    the count and the central moment sums m2, m3, m4.
     """
-    #print(df.head(10))
-    stats = {}
-    for month in months:
-        stats[month] = {
-            'mean': df[month].mean(),
-            'std': df[month].std(),
-            'min': df[month].min(),
-            'max': df[month].max(),
-            'count': df[month].count(),
-            'median': df[month].median(),
-            'mode': df[month].mode()[0] if not df[month].mode().empty else np.nan,
-            'Kurtosis': df[month].kurtosis(),
-            'Skewness': df[month].skew()
-        }
+    with np.errstate(invalid='ignore', divide='ignore'):
+        m2 = _zero_out_fperr(m2)
+        m3 = _zero_out_fperr(m3)
+        skew = (n * (n - 1) ** 0.5 / (n - 2)) * (m3 / m2 ** 1.5)
+        skew = np.where(m2 == 0, 0, skew)
+        skew = np.where(n < 3, np.nan, skew)
+
+        numerator = _zero_out_fperr(n * (n + 1) * (n - 1) * m4)
+        denominator = _zero_out_fperr((n - 2) * (n - 3) * m2 ** 2)
+        adj = 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+        kurt = np.where(denominator == 0, 0, numerator / denominator - adj)
+        kurt = np.where(n < 4, np.nan, kurt)
+    return skew, kurt
+
+
+def _column_mode(values):
+    """
+    Most frequent value of each column ignoring NaN (the smallest one on
+    ties, like Series.mode()[0]); NaN for empty columns.
+    """
+    if values.shape[0] == 0:
+        return np.full(values.shape[1], np.nan)
+    ordered = np.sort(values, axis=0)  # NaN go last
+    valid = ~np.isnan(ordered)
+    rows = np.arange(ordered.shape[0])[:, None]
+    new_run = np.ones(ordered.shape, dtype=bool)
+    new_run[1:] = ordered[1:] != ordered[:-1]
+    run_start = np.maximum.accumulate(np.where(new_run, rows, 0), axis=0)
+    run_length = np.where(valid, rows - run_start + 1, 0)
+    best = np.argmax(run_length, axis=0)
+    mode = ordered[best, np.arange(ordered.shape[1])]
+    return np.where(valid.any(axis=0), mode, np.nan)
+
+
+def monthly_statistics(values, quantiles=(0.25, 0.75)):
+    """
+    Computes every monthly statistic in one vectorized pass over the
+    years x 12 array (NaN are ignored).
+
+    Parameters:
+        values (np.ndarray): Array (n_years, 12).
+        quantiles (sequence): Extra quantiles, returned as 'q25', 'q75'...
+
+    Returns:
+        dict: Statistic name -> array with one value per month.
+    """
+    x = np.asarray(values, dtype=float)
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, x, 0).sum(axis=0) / n
+        deviation = np.where(valid, x - mean, 0)
+        m2 = (deviation ** 2).sum(axis=0)
+        m3 = (deviation ** 3).sum(axis=0)
+        m4 = (deviation ** 4).sum(axis=0)
+        std = np.sqrt(m2 / (n - 1))
+    skew, kurt = _skew_kurtosis(n, m2, m3, m4)
+
+    empty = n == 0
+    filled_min = np.where(valid, x, np.inf).min(axis=0, initial=np.inf)
+    filled_max = np.where(valid, x, -np.inf).max(axis=0, initial=-np.inf)
+
+    stats = {
+        'mean': mean,
+        'std': np.where(n < 2, np.nan, std),
+        'min': np.where(empty, np.nan, filled_min),
+        'max': np.where(empty, np.nan, filled_max),
+        'count': n,
+        'median': _nanquantile(x, 0.5, empty),
+        'mode': _column_mode(x),
+        'Kurtosis': kurt,
+        'Skewness': skew,
+    }
+    for q in quantiles:
+        stats[f"q{round(q * 100):02d}"] = _nanquantile(x, q, empty)
     return stats
 
 
-def export_stats_to_excel(df, output_dir, variable):
+def _nanquantile(x, q, empty):
+    if x.shape[0] == 0:
+        return np.full(x.shape[1], np.nan)
+    filled = np.where(empty, 0, x)  # avoid the all-NaN warning
+    return np.where(empty, np.nan, np.nanquantile(filled, q, axis=0))
+
+
+def circular_statistics(values):
+    """
+    Monthly statistics of directions in degrees (years x 12 array, NaN are
+    ignored): mean direction, circular standard deviation sqrt(-2 ln R) in
+    degrees, mean resultant length R (1: all the same direction, 0: spread
+    evenly) and count.
+    """
+    radians = np.radians(np.asarray(values, dtype=float))
+    valid = ~np.isnan(radians)
+    n = valid.sum(axis=0)
+    sin_total = np.where(valid, np.sin(radians), 0).sum(axis=0)
+    cos_total = np.where(valid, np.cos(radians), 0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        resultant = np.where(n > 0, np.hypot(sin_total, cos_total) / n, np.nan)
+        std = np.degrees(np.sqrt(-2 * np.log(np.minimum(resultant, 1))))
+    return {
+        'mean': np.where(n > 0, np.degrees(np.arctan2(sin_total, cos_total)) % 360, np.nan),
+        'std': std,
+        'resultant_length': resultant,
+        'count': n,
+    }
 
-    stats = compute_stats(df)
+
+def compute_stats(df, variable=None):
+    """
+    Compute basic statistics for the DataFrame.
+    Returns a dictionary with mean, std, min, max, count, median, mode,
+    kurtosis and skewness for each month (circular_statistics for the
+    circular_mean variables).
+    """
+    values = df[months].to_numpy(dtype=float)
+    if variable_aggregation.get(variable) == 'circular_mean':
+        stats = circular_statistics(values)
+    else:
+        stats = monthly_statistics(values, quantiles=())
+    return {
+        month: {name: values[i] for name, values in stats.items()}
+        for i, month in enumerate(months)
+    }
+
+
+class MonthlyStatsAccumulator:
+    """
+    Mergeable monthly moments (count, mean, M2..M4, min, max) so regional
+    statistics over many stations can be combined without re-reading them.
+    Median, quantiles and mode are not mergeable and are not kept.
+
+    Example:
+        total = MonthlyStatsAccumulator()
+        for values in stations_values:  # years x 12 arrays
+            total.update(values)
+        total.result()
+    """
+
+    def __init__(self):
+        self.n = np.zeros(12)
+        self.mean = np.zeros(12)
+        self.m2 = np.zeros(12)
+        self.m3 = np.zeros(12)
+        self.m4 = np.zeros(12)
+        self.min = np.full(12, np.inf)
+        self.max = np.full(12, -np.inf)
+
+    @classmethod
+    def from_values(cls, values):
+        x = np.asarray(values, dtype=float).reshape(-1, 12)
+        valid = ~np.isnan(x)
+        acc = cls()
+        acc.n = valid.sum(axis=0).astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            acc.mean = np.where(acc.n > 0, np.where(valid, x, 0).sum(axis=0) / acc.n, 0)
+        deviation = np.where(valid, x - acc.mean, 0)
+        acc.m2 = (deviation ** 2).sum(axis=0)
+        acc.m3 = (deviation ** 3).sum(axis=0)
+        acc.m4 = (deviation ** 4).sum(axis=0)
+        acc.min = np.where(valid, x, np.inf).min(axis=0, initial=np.inf)
+        acc.max = np.where(valid, x, -np.inf).max(axis=0, initial=-np.inf)
+        return acc
+
+    def update(self, values):
+        """Adds a years x 12 array (e.g. one station) to the accumulator."""
+        return self.merge(MonthlyStatsAccumulator.from_values(values))
+
+    def merge(self, other):
+        """Combines the moments of two accumulators (pairwise update formulas)."""
+        na, nb = self.n, other.n
+        n = na + nb
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = np.where(n > 0, other.mean - self.mean, 0)
+            mean = np.where(n > 0, self.mean + delta * nb / n, 0)
+            m2 = self.m2 + other.m2 + np.where(n > 0, delta ** 2 * na * nb / n, 0)
+            m3 = (self.m3 + other.m3 + np.where(n > 0, delta ** 3 * na * nb * (na - nb) / n ** 2
+                  + 3 * delta * (na * other.m2 - nb * self.m2) / n, 0))
+            m4 = (self.m4 + other.m4 + np.where(n > 0, delta ** 4 * na * nb * (na ** 2 - na * nb + nb ** 2) / n ** 3
+                  + 6 * delta ** 2 * (na ** 2 * other.m2 + nb ** 2 * self.m2) / n ** 2
+                  + 4 * delta * (na * other.m3 - nb * self.m3) / n, 0))
+        self.n, self.mean, self.m2, self.m3, self.m4 = n, mean, m2, m3, m4
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    def result(self):
+        """Returns the statistics per month as a dict of arrays."""
+        n = self.n
+        empty = n == 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self.m2 / (n - 1))
+        skew, kurt = _skew_kurtosis(n, self.m2, self.m3, self.m4)
+        return {
+            'mean': np.where(empty, np.nan, self.mean),
+            'std': np.where(n < 2, np.nan, std),
+            'min': np.where(empty, np.nan, self.min),
+            'max': np.where(empty, np.nan, self.max),
+            'count': n.astype(int),
+            'Kurtosis': kurt,
+            'Skewness': skew,
+        }
+
+
+def stats_table(df, variable=None):
+    """compute_stats as a table: one row per statistic (Stat column) and one column per month."""
+    stats = compute_stats(df, variable)
     # Convert stats dictionary to DataFrame
     stats_df = pd.DataFrame(stats)
     stats_df.reset_index(inplace=True)
     stats_df.rename(columns={'index': 'Stat'}, inplace=True)
+    return stats_df
+
+
+def export_stats(df, output_dir, variable):
 
-    # Save the DataFrame to an Excel file
-    output_file = os.path.join(output_dir, f"{variable}_stats.xlsx")
-    stats_df.to_excel(output_file, index=False)
+    stats_df = stats_table(df, variable)
+
+    # Save the statistics table
+    output_file = write_table(stats_df, output_dir, variable, 'stats')
     print(f"Statistics saved to: {output_file}")
     return output_file
 
@@ -51,6 +245,7 @@ def export_stats_to_excel(df, output_dir, variable):
 
 
 
+
 # Function calling
 """ df, info = read_xks_excel(r"C:\Code\TIP\Balance_hidrico\input\estaciones_ideam\1_El Paraiso.xlsx")
 output_dir = manage_station_directory(info['B2'])
@@ -60,7 +255,7 @@ formatted_df = pivot_monthly_dataframe(df, output_dir, variable)
 clean_data_df = clean_data(formatted_df)
 print('#################')
 print(clean_data_df.head(10))
-export_stats_to_excel(clean_data_df, output_dir, variable)
+export_stats(clean_data_df, output_dir, variable)
 plot_multiyear_monthly_histogram(
     clean_data_df, 
     f"Histograma Mensual Multianual - {variable}",
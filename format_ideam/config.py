@@ -1,7 +1,79 @@
 file_name = r"C:\Code\TIP\Balance_hidrico\input\estaciones_ideam\paraiso_temp.xlsx"
 output_stations = r"results\estaciones"
+# Outputs of each station variable are written here first and then swapped
+# into <station>/<variable>/ (must be on the same disk as output_stations)
+staging_folder = ".staging"
 input_stations = r"input\estaciones_ideam"
 sheet_name = "Data"
+# Read the station workbooks in streaming (read-only) mode
+streaming_reader = True
+# Worker processes for the batch run (1 = serial). Serial by default; more
+# workers (--workers N) rely on the staging folders to keep workbooks of the
+# same station from overwriting each other's outputs
+batch_workers = 1
+run_summary_file = "run_summary.json"
+# SQLite catalog of the input workbooks (station, variable, period...), in
+# the stations output folder. Used to select files without opening them
+catalog_file = "catalog.sqlite"
+# Overlap the workbook reads (threads), the compute (batch_workers processes)
+# and the writes (threads), see pipelined.py. Helps on slow network folders
+pipelined_batch = False
+reader_threads = 4
+writer_threads = 2
+# Workbooks read ahead of the compute, and stations computed but not written
+pipeline_queue_size = 8
+# Stage timings and memory (see instrumentation.py in the code folder)
+run_report_file = "run_report.json"
+# Print intermediate DataFrames (slow on large frames)
+verbose = False
+# Skip stations whose input, config and code did not change since the last run
+incremental_build = True
+manifest_suffix = "_manifest.json"
+# Intermediate tables: "parquet" or "feather"
+intermediate_format = "parquet"
+columnar_compression = "zstd"
+# Pack the tables of each station variable into one workbook at the end
+export_excel = True
+excel_engine = "xlsxwriter"
+# Render the plots without a GUI (Agg backend) and do not show them
+headless_plots = True
+show_plots = False
+png_compress_level = 1
+# Add every processed station to the memory-mapped data cube
+update_data_cube = True
+data_cube_folder = "cube"
+# Fill the missing months of the cube from correlated neighbour stations
+# (see gap_filling.py). Needs a CSV with the coordinates of the stations
+gap_filling = False
+station_coordinates_file = r"input\estaciones_ideam\coordenadas.csv"
+coordinate_columns = {"station": "Estacion", "latitude": "Latitud", "longitude": "Longitud"}
+gap_fill_neighbours = 5
+gap_fill_max_distance_km = 50
+# Minimum common years (per month) and correlation of a donor station
+gap_fill_min_overlap = 8
+gap_fill_min_correlation = 0.7
+# Mann-Kendall, Sen, Pettitt and SNHT tests of every series in the cube,
+# saved in one table (see trend_tests.py)
+trend_tests = False
+trend_tests_file = "trend_tests"
+trend_min_years = 10
+trend_alpha = 0.05
+snht_simulations = 2000
+
+# DHIME CSV/TXT exports (many stations per file)
+dhime_columns = {
+    "station": "CodigoEstacion",
+    "variable": "IdParametro",
+    "date": "Fecha",
+    "value": "Valor",
+}
+# Rename DHIME parameters to the names used in variable_labels
+dhime_variables = {}
+dhime_separator = ","
+dhime_decimal = "."
+dhime_encoding = "utf-8"
+dhime_date_format = None  # None = inferred from the first rows
+dhime_chunksize = 500000
 # Minimum number of months per year with data to keep a station
 min_months_per_year = 4
 months = [
@@ -19,6 +91,53 @@ months = [
     "Dec",
 ]
 z_score_threshold = 1.65
+# Outlier detection of the monthly tables (see outliers.py): global_zscore
+# (one mean/std for the whole table, the original rule), monthly_zscore,
+# mad, hampel or iterative
+outlier_method = "global_zscore"
+# Score above which a month is nullified, per method
+outlier_thresholds = {
+    "global_zscore": z_score_threshold,
+    "monthly_zscore": z_score_threshold,
+    "iterative": 3.0,
+    "mad": 3.5,
+    "hampel": 3.0,
+}
+hampel_window = 5  # years on each side
+outlier_max_iterations = 10
+# Save the score of every month (Z_scores table, off by default: it is as
+# large as the raw table). The nullified months are always listed in the
+# 'outliers' table
+save_z_scores = False
+
+# Monthly aggregation of the daily/hourly records (sum, mean, min, max, count,
+# circular_mean: mean direction, daily_mean: monthly total / days with data).
+# Variables not listed are summed
+variable_aggregation = {
+    "TEMPERATURA": "mean",
+    "CAUDAL": "mean",
+    "VEL VIENTO": "mean",
+    "DIR VIENTO": "circular_mean",
+    "BRILLO SOLAR": "daily_mean",
+}
+
+# Wind (see wind.py): direction sectors of the direction workbooks and, for
+# the stations with direction and speed workbooks, the wind rose
+wind_direction_variable = "DIR VIENTO"
+wind_speed_variable = "VEL VIENTO"
+wind_sectors = 16
+# Speed bin edges [m/s]; below the first one is calm
+wind_speed_bins = [0.5, 2, 4, 6, 8, 10]
+wind_roses = True
+
+# Daily streamflow analysis of these variables (see streamflow.py): baseflow
+# separation, flow duration curve and monthly mean/min/max flows
+streamflow_variables = ["CAUDAL"]
+lyne_hollick_alpha = 0.925
+lyne_hollick_passes = 3
+eckhardt_alpha = 0.98
+eckhardt_bfi_max = 0.80  # 0.80 perennial streams on porous aquifers, 0.50 ephemeral, 0.25 hard rock
+flow_duration_exceedance = [0.01, 0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
 
 variable_labels = {
     "PRECIPITACION": "Precipitación [mm]",
@@ -0,0 +1,142 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import *
+
+index_columns = ['station', 'variable', 'metadata', 'first_year', 'n_years', 'offset', 'added']
+
+
+class StationCube:
+    """
+    Consolidated station x variable x year x month store.
+
+    The monthly tables are appended as dense (n_years, 12) float64 blocks to
+    one binary file that is read through np.memmap, and a small CSV index
+    (the station metadata table) records where each block starts. Both files
+    are append-only: adding or re-processing a station writes one block and
+    one index row, the latest row of a station/variable wins, and the rest of
+    the cube is never rewritten (see compact() to drop superseded blocks).
+
+    Example:
+        cube = StationCube(cube_dir)
+        cube.append("EL PARAISO", "PRECIPITACION", cleaned_df)
+        index, years, values = cube.query(variable="PRECIPITACION",
+                                          start_year=1995, end_year=2005)
+    """
+
+    def __init__(self, cube_dir):
+        self.cube_dir = cube_dir
+        self.values_path = os.path.join(cube_dir, "values.f8")
+        self.index_path = os.path.join(cube_dir, "stations.csv")
+        os.makedirs(cube_dir, exist_ok=True)
+
+    def append(self, station, variable, table, metadata=None):
+        """
+        Adds the monthly table (Year + Jan..Dec columns) of a station variable.
+        Missing years inside the record are stored as NaN.
+        """
+        years = table['Year'].to_numpy(dtype=int)
+        if len(years) == 0:
+            print(f"Empty table, not added to the cube: {station} - {variable}")
+            return None
+        first_year = int(years.min())
+        block = np.full((int(years.max()) - first_year + 1, 12), np.nan)
+        block[years - first_year] = table[months].to_numpy(dtype=float)
+
+        with open(self.values_path, 'ab') as f:
+            offset = f.tell() // 8
+            f.write(np.ascontiguousarray(block, dtype='<f8').tobytes())
+
+        row = pd.DataFrame([{
+            'station': station,
+            'variable': variable,
+            'metadata': metadata,
+            'first_year': first_year,
+            'n_years': block.shape[0],
+            'offset': offset,
+            'added': datetime.now().isoformat(timespec='seconds'),
+        }], columns=index_columns)
+        row.to_csv(self.index_path, mode='a', index=False,
+                   header=not os.path.exists(self.index_path))
+        return offset
+
+    def _data(self):
+        """Read-only memory map of the values file (empty for an empty cube)."""
+        if not os.path.exists(self.values_path) or os.path.getsize(self.values_path) == 0:
+            return np.empty(0, dtype='<f8')
+        return np.memmap(self.values_path, dtype='<f8', mode='r')
+
+    def stations(self):
+        """Metadata table with the current block of every station/variable."""
+        if not os.path.exists(self.index_path):
+            return pd.DataFrame(columns=index_columns)
+        index = pd.read_csv(self.index_path, dtype={'station': str, 'variable': str})
+        index = index.drop_duplicates(['station', 'variable'], keep='last')
+        return index.sort_values(['variable', 'station']).reset_index(drop=True)
+
+    def query(self, stations=None, variable=None, start_year=None, end_year=None):
+        """
+        Slices the cube by station list, variable and period.
+
+        Returns:
+            tuple: (index DataFrame with one row per series, years array,
+            values array (n_series, n_years, 12) with NaN outside each record).
+        """
+        index = self.stations()
+        if stations is not None:
+            index = index[index['station'].isin(list(stations))]
+        if variable is not None:
+            variables = [variable] if isinstance(variable, str) else list(variable)
+            index = index[index['variable'].isin(variables)]
+        index = index.reset_index(drop=True)
+
+        if index.empty:
+            return index, np.array([], dtype=int), np.empty((0, 0, 12))
+
+        last_years = index['first_year'] + index['n_years'] - 1
+        start = int(index['first_year'].min()) if start_year is None else int(start_year)
+        end = int(last_years.max()) if end_year is None else int(end_year)
+        years = np.arange(start, end + 1)
+        values = np.full((len(index), len(years), 12), np.nan)
+
+        data = self._data()
+        for i, (first_year, n_years, offset) in enumerate(
+                index[['first_year', 'n_years', 'offset']].itertuples(index=False)):
+            lo = max(start, first_year)
+            hi = min(end, first_year + n_years - 1)
+            if lo > hi:
+                continue
+            block = data[offset:offset + n_years * 12].reshape(n_years, 12)
+            values[i, lo - start:hi - start + 1] = block[lo - first_year:hi - first_year + 1]
+        del data
+        return index, years, values
+
+    def to_frame(self, stations=None, variable=None, start_year=None, end_year=None):
+        """Same as query() in long format: station, variable, Year, Jan..Dec."""
+        index, years, values = self.query(stations, variable, start_year, end_year)
+        frame = pd.DataFrame(values.reshape(-1, 12), columns=months)
+        frame.insert(0, 'Year', np.tile(years, len(index)))
+        frame.insert(0, 'variable', np.repeat(index['variable'].to_numpy(), len(years)))
+        frame.insert(0, 'station', np.repeat(index['station'].to_numpy(), len(years)))
+        return frame.dropna(subset=months, how='all').reset_index(drop=True)
+
+    def compact(self):
+        """Rewrites the cube keeping only the current block of each series."""
+        index = self.stations()
+        if index.empty and not os.path.exists(self.values_path):
+            return
+        data = self._data()
+        values_tmp = self.values_path + ".tmp"
+        offsets = []
+        with open(values_tmp, 'wb') as f:
+            for n_years, offset in index[['n_years', 'offset']].itertuples(index=False):
+                offsets.append(f.tell() // 8)
+                f.write(np.asarray(data[offset:offset + n_years * 12]).tobytes())
+        del data
+        index['offset'] = offsets
+        index.to_csv(self.index_path + ".tmp", index=False)
+        os.replace(values_tmp, self.values_path)
+        os.replace(self.index_path + ".tmp", self.index_path)
@@ -1,40 +1,144 @@
 import pandas as pd
+import numpy as np
 from read_xks import *
 import os
+from config import months, variable_aggregation
 from utils import manage_station_directory
+from store import write_table
 
+# circular_mean: mean direction in degrees (wind direction)
+# daily_mean: monthly total / days with data (e.g. mean daily sunshine hours)
+aggregations = ['sum', 'mean', 'min', 'max', 'count', 'circular_mean', 'daily_mean']
 
-def pivot_monthly_dataframe(df, output_dir, variable):
 
-    df = df.copy()
+def monthly_aggregate(dates, values, how='sum'):
+    """
+    Aggregates a series into a dense years x 12 array.
+
+    Timestamps are mapped to integer (year, month) codes and the values are
+    accumulated with bincount (sum/mean/count, the sine and cosine of the
+    directions for circular_mean, the days with data for daily_mean) or
+    fmin/fmax.at (min/max), so no month labels or groupby are built. Rows
+    with invalid dates are ignored. Only years with data are returned, in
+    ascending order.
+
+    Parameters:
+        dates (array-like): Timestamps (datetime64).
+        values (array-like): Numeric values, NaN for missing.
+        how (str): One of aggregations.
+
+    Returns:
+        tuple: (years (n_years,), table (n_years, 12) float array). A month
+        without rows is NaN; with 'sum' a month whose rows are all NaN is 0,
+        as with the groupby sum it replaces.
+    """
+    if how not in aggregations:
+        raise ValueError(f"Unknown aggregation '{how}', use one of {aggregations}")
+
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnat(dates)
+    month_index = dates[valid].astype('datetime64[M]').astype(np.int64)
+    values = values[valid]
+
+    years, year_code = np.unique(month_index // 12 + 1970, return_inverse=True)
+    cell = year_code * 12 + month_index % 12
+    size = len(years) * 12
+
+    rows = np.bincount(cell, minlength=size)
+    finite = ~np.isnan(values)
+    cell, values = cell[finite], values[finite]
+    count = np.bincount(cell, minlength=size)
+    total = minimum = maximum = sin_total = cos_total = days = None
+
+    if how in ('sum', 'mean', 'daily_mean'):
+        total = np.bincount(cell, weights=values, minlength=size)
+    elif how == 'min':
+        minimum = np.full(size, np.nan)
+        np.fmin.at(minimum, cell, values)
+    elif how == 'max':
+        maximum = np.full(size, np.nan)
+        np.fmax.at(maximum, cell, values)
+    elif how == 'circular_mean':
+        radians = np.radians(values)
+        sin_total = np.bincount(cell, weights=np.sin(radians), minlength=size)
+        cos_total = np.bincount(cell, weights=np.cos(radians), minlength=size)
+    if how == 'daily_mean':
+        # Each day with data counts once in its month
+        day = dates[valid][finite].astype('datetime64[D]')
+        _, first_row = np.unique(day, return_index=True)
+        days = np.bincount(cell[first_row], minlength=size)
+
+    result = finalize_monthly(how, rows, count, total, minimum, maximum, sin_total, cos_total, days)
+    return years, result.reshape(len(years), 12)
+
+
+def finalize_monthly(how, rows, count, total=None, minimum=None, maximum=None,
+                     sin_total=None, cos_total=None, days=None):
+    """
+    Turns the accumulated rows (rows per cell, NaN included), count (valid
+    values), total, minimum, maximum, sine and cosine totals (circular_mean)
+    and days with data (daily_mean) into the aggregated values.
+    """
+    if how == 'sum':
+        result = np.array(total, dtype=float)
+        result[rows == 0] = np.nan
+    elif how == 'mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = total / count
+        result[count == 0] = np.nan
+    elif how == 'count':
+        result = count.astype(float)
+        result[rows == 0] = np.nan
+    elif how == 'min':
+        result = np.array(minimum, dtype=float)
+    elif how == 'max':
+        result = np.array(maximum, dtype=float)
+    elif how == 'circular_mean':
+        result = np.degrees(np.arctan2(sin_total, cos_total)) % 360
+        result[count == 0] = np.nan
+    elif how == 'daily_mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = total / days
+        result[days == 0] = np.nan
+    else:
+        raise ValueError(f"Unknown aggregation '{how}', use one of {aggregations}")
+    return result
+
+
+def monthly_table(df, how='sum'):
+    """
+    Builds the Year + Jan..Dec table from a dataframe whose first column are
+    the dates and second column the values.
+    """
     # First ensure the first column is datetime
     date_col = pd.to_datetime(df.iloc[:, 0], errors='coerce')
     if date_col.isna().any():
         print("Warning: Some dates couldn't be parsed. First few problematic values:")
         print(df.iloc[:, 0][date_col.isna()].head())
-    
-    df['Year'] = date_col.dt.year
-    df['Month'] = date_col.dt.strftime('%b')
-    
-    # Group by Year and Month, aggregate by sum
-    grouped = df.groupby(['Year', 'Month'])[df.columns[1]].sum().reset_index()
-    
-    pivot_df = grouped.pivot(index='Year', columns='Month', values=df.columns[1])
-    
-    # Ensure columns are ordered Jan-Dec
-    months_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                   'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    pivot_df = pivot_df.reindex(columns=[m for m in months_order if m in pivot_df.columns])
-    
-    pivot_df.reset_index(inplace=True)
-
-    # Save the pivoted DataFrame to an Excel file
-    output_file = os.path.join(output_dir, variable+'_raw.xlsx')
-    pivot_df.to_excel(output_file, index=False)
+
+    values = pd.to_numeric(df.iloc[:, 1], errors='coerce')
+    years, table = monthly_aggregate(date_col.to_numpy(), values.to_numpy(), how)
+
+    pivot_df = pd.DataFrame(table, columns=months)
+    pivot_df.insert(0, 'Year', years)
+    return pivot_df
+
+
+def pivot_monthly_dataframe(df, output_dir, variable, how=None):
+
+    # Sum by default, see config.variable_aggregation
+    if how is None:
+        how = variable_aggregation.get(variable, 'sum')
+
+    pivot_df = monthly_table(df, how)
+
+    # Save the pivoted DataFrame
+    output_file = write_table(pivot_df, output_dir, variable, 'raw')
     print(f"Raw formatted data saved to: {output_file}")
     return pivot_df
 
 """ df, info = read_xks_excel(r"C:\Code\TIP\Balance_hidrico\input\estaciones_ideam\1_El Paraiso.xlsx")
 output_dir = manage_station_directory(info['B2'])
 variable = info['B6']
-print(pivot_monthly_dataframe(df, output_dir, variable)) """
\ No newline at end of file
+print(pivot_monthly_dataframe(df, output_dir, variable)) """
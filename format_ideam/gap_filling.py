@@ -0,0 +1,258 @@
+"""
+Gap filling of the monthly station series from correlated neighbours.
+
+The cleaned tables lose whole years (drop_years_with_min_months) and single
+months (nullify_high_z_scores). For every station of a variable in the data
+cube, the nearest stations are found with a KD-tree over the station
+coordinates (3D unit vectors, so distances are true chords on the sphere),
+and a linear regression station ~ neighbour is fitted for each month on
+their common years. A missing month is filled with the regression of the
+best correlated neighbour that has a value for that month.
+
+All the regressions run at once on (stations, neighbours, years, 12) arrays,
+so a network of 1000 stations is filled in seconds. Only observed values
+are used as predictors (one pass, imputed values are never chained), and
+only months inside each station record are filled. Directions
+(circular_mean variables) are not filled: a linear regression of angles
+breaks across north.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import *
+from data_cube import StationCube
+from store import write_table
+
+earth_radius_km = 6371.0
+
+
+def unit_vectors(latitude, longitude):
+    """(n, 3) unit vectors of the coordinates in degrees."""
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def neighbour_index(latitude, longitude, k=gap_fill_neighbours, max_distance_km=gap_fill_max_distance_km):
+    """
+    The `k` nearest stations of every station within `max_distance_km`.
+
+    Returns:
+        tuple: (neighbours (n, k) int array, distances_km (n, k)). Missing
+        neighbours have index n and an infinite distance.
+    """
+    from scipy.spatial import cKDTree
+
+    points = unit_vectors(latitude, longitude)
+    n = len(points)
+    neighbours = np.full((n, k), n)
+    distances = np.full((n, k), np.inf)
+    if n < 2 or k < 1:
+        return neighbours, distances
+
+    chord = 2 * np.sin(min(max_distance_km / earth_radius_km, np.pi) / 2)
+    query_k = min(k + 1, n)
+    dist, idx = cKDTree(points).query(points, k=list(range(1, query_k + 1)), distance_upper_bound=chord)
+
+    # The station itself is not a neighbour
+    self_match = idx == np.arange(n)[:, None]
+    idx[self_match] = n
+    dist[self_match] = np.inf
+    order = np.argsort(dist, axis=1, kind='stable')[:, :k]
+    idx = np.take_along_axis(idx, order, axis=1)
+    dist = np.take_along_axis(dist, order, axis=1)
+
+    neighbours[:, :idx.shape[1]] = idx
+    with np.errstate(invalid='ignore'):
+        km = 2 * earth_radius_km * np.arcsin(np.minimum(dist / 2, 1))
+    distances[:, :dist.shape[1]] = np.where(np.isfinite(dist), km, np.inf)
+    return neighbours, distances
+
+
+def donor_regressions(values, neighbours, min_overlap=gap_fill_min_overlap):
+    """
+    Least squares station = intercept + slope * neighbour for every station,
+    neighbour and month, on the years both have data.
+
+    Parameters:
+        values (np.ndarray): (n, years, 12) monthly values, NaN when missing.
+        neighbours (np.ndarray): (n, k) neighbour indices (n = no neighbour).
+        min_overlap (int): Minimum common years to fit a month.
+
+    Returns:
+        tuple: slope, intercept, correlation (each (n, k, 12), NaN when the
+        month could not be fitted) and the neighbour values (n, k, years, 12).
+    """
+    padded = np.concatenate([values, np.full((1,) + values.shape[1:], np.nan)])
+    donors = padded[neighbours]
+    target = values[:, None]
+    both = ~np.isnan(target) & ~np.isnan(donors)
+    count = both.sum(axis=2)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.where(both, donors, 0).sum(axis=2) / count
+        mean_y = np.where(both, target, 0).sum(axis=2) / count
+        dx = np.where(both, donors - mean_x[:, :, None], 0)
+        dy = np.where(both, target - mean_y[:, :, None], 0)
+        sxx = (dx * dx).sum(axis=2)
+        syy = (dy * dy).sum(axis=2)
+        sxy = (dx * dy).sum(axis=2)
+        slope = sxy / sxx
+        intercept = mean_y - slope * mean_x
+        correlation = sxy / np.sqrt(sxx * syy)
+
+    fitted = (count >= max(min_overlap, 2)) & (sxx > 0) & (syy > 0)
+    nan = np.full(slope.shape, np.nan)
+    return (np.where(fitted, slope, nan), np.where(fitted, intercept, nan),
+            np.where(fitted, correlation, nan), donors)
+
+
+def fill_gaps(values, neighbours, min_overlap=gap_fill_min_overlap,
+              min_correlation=gap_fill_min_correlation, fill_mask=None, lower_bound=None):
+    """
+    Fills the NaN of `values` from the best correlated neighbour with data.
+
+    Parameters:
+        values (np.ndarray): (n, years, 12) monthly values.
+        neighbours (np.ndarray): (n, k) from neighbour_index.
+        min_overlap (int): Minimum common years of a donor month.
+        min_correlation (float): Minimum correlation of a donor month.
+        fill_mask (np.ndarray): (n, years, 12) cells that may be filled
+            (default: every missing cell).
+        lower_bound (float): Imputed values are clipped to it (e.g. 0 for
+            precipitation).
+
+    Returns:
+        dict: filled values, imputed (bool mask), donor (neighbour index,
+        -1 where not imputed) and correlation of the donor month.
+    """
+    n = values.shape[0]
+    slope, intercept, correlation, donors = donor_regressions(values, neighbours, min_overlap)
+
+    score = np.where(correlation >= min_correlation, correlation, -np.inf)
+    candidates = np.where(np.isnan(donors), -np.inf, score[:, :, None, :])
+    best = candidates.argmax(axis=1)[:, None]
+    best_score = np.take_along_axis(candidates, best, axis=1)[:, 0]
+
+    missing = np.isnan(values)
+    if fill_mask is not None:
+        missing &= fill_mask
+    imputed = missing & np.isfinite(best_score)
+
+    def pick(per_month):
+        return np.take_along_axis(np.broadcast_to(per_month[:, :, None, :], donors.shape), best, axis=1)[:, 0]
+
+    with np.errstate(invalid='ignore'):
+        estimate = pick(intercept) + pick(slope) * np.take_along_axis(donors, best, axis=1)[:, 0]
+    if lower_bound is not None:
+        estimate = np.maximum(estimate, lower_bound)
+
+    donor = neighbours[np.arange(n)[:, None, None], best[:, 0]]
+    return {
+        'filled': np.where(imputed, estimate, values),
+        'imputed': imputed,
+        'donor': np.where(imputed, donor, -1),
+        'correlation': np.where(imputed, best_score, np.nan),
+    }
+
+
+def load_coordinates(file_path=None):
+    """Station coordinates (station, latitude, longitude) from the config CSV."""
+    if file_path is None:
+        from utils import project_dir
+        file_path = os.path.join(project_dir(), station_coordinates_file)
+    coordinates = pd.read_csv(file_path)
+    coordinates = coordinates.rename(columns={v: k for k, v in coordinate_columns.items()})
+    coordinates['station'] = coordinates['station'].astype(str)
+    return coordinates[['station', 'latitude', 'longitude']].dropna().drop_duplicates('station')
+
+
+def fill_variable(cube, coordinates, variable, start_year=None, end_year=None):
+    """
+    Gap filling of every station of `variable` in the cube that has coordinates.
+
+    Returns:
+        tuple: (index of the filled series, with latitude/longitude, years
+        array, fill_gaps result). Donors are indices into the index rows.
+    """
+    index, years, values = cube.query(variable=variable, start_year=start_year, end_year=end_year)
+    index = index.merge(coordinates, on='station', how='left')
+    located = index['latitude'].notna().to_numpy()
+    if not located.all():
+        print(f"No coordinates, not filled: {', '.join(index.loc[~located, 'station'])}")
+    index = index[located].reset_index(drop=True)
+    values = values[located]
+    if index.empty:
+        return index, years, fill_gaps(values, np.empty((0, gap_fill_neighbours), dtype=int))
+
+    # Only inside each station record
+    first_year = index['first_year'].to_numpy()[:, None]
+    last_year = first_year + index['n_years'].to_numpy()[:, None] - 1
+    in_record = (years >= first_year) & (years <= last_year)
+
+    neighbours, _ = neighbour_index(index['latitude'], index['longitude'])
+    summed = variable_aggregation.get(variable, 'sum') == 'sum'
+    result = fill_gaps(values, neighbours,
+                       fill_mask=np.broadcast_to(in_record[:, :, None], values.shape),
+                       lower_bound=0.0 if summed else None)
+    print(f"{variable}: {int(result['imputed'].sum())} of {int(np.isnan(values).sum())} "
+          f"missing months filled in {len(index)} stations")
+    return index, years, result
+
+
+def station_tables(index, years, result, i):
+    """
+    'filled' (Year + Jan..Dec) and 'imputed' (Year + the donor station of
+    each imputed month, empty when observed) tables of the station row `i`.
+    """
+    first_year = int(index.loc[i, 'first_year'])
+    rows = slice(first_year - years[0], first_year - years[0] + int(index.loc[i, 'n_years']))
+    filled = pd.DataFrame(result['filled'][i, rows], columns=months)
+    filled.insert(0, 'Year', years[rows])
+    names = np.append(index['station'].to_numpy(dtype=object), None)
+    imputed = pd.DataFrame(names[result['donor'][i, rows]], columns=months)
+    imputed.insert(0, 'Year', years[rows])
+    keep = filled[months].notna().any(axis=1).to_numpy()
+    return filled[keep].reset_index(drop=True), imputed[keep].reset_index(drop=True)
+
+
+def fill_station_gaps(cube_dir, variables, coordinates=None):
+    """
+    Fills the stations of `variables` and writes their 'filled' and
+    'imputed' tables next to the other tables of each station: the folder is
+    published again with both tables added to its manifest outputs and to
+    its workbook (see utils.staged_station_directory).
+
+    Returns:
+        dict: Number of imputed months per variable.
+    """
+    from utils import staged_station_directory, variable_directory
+    from store import export_station_workbook
+    from manifest import read_manifest, save_manifest
+
+    if coordinates is None:
+        coordinates = load_coordinates()
+    cube = StationCube(cube_dir)
+    filled_months = {}
+    for variable in sorted(variables):
+        if variable_aggregation.get(variable) == 'circular_mean':
+            print(f"{variable}: directions are not gap filled")
+            continue
+        index, years, result = fill_variable(cube, coordinates, variable)
+        filled_months[variable] = int(result['imputed'].sum()) if len(index) else 0
+        for i, station in enumerate(index['station']):
+            if not os.path.isdir(variable_directory(station, variable)):
+                continue
+            filled, imputed = station_tables(index, years, result, i)
+            with staged_station_directory(station, variable, keep_outputs=True) as staging_dir:
+                output_files = [os.path.basename(write_table(filled, staging_dir, variable, 'filled')),
+                                os.path.basename(write_table(imputed, staging_dir, variable, 'imputed'))]
+                if export_excel:
+                    export_station_workbook(staging_dir, variable)
+                entry = read_manifest(staging_dir, variable)
+                if entry is not None and not set(output_files) <= set(entry['outputs']):
+                    entry['outputs'] += [f for f in output_files if f not in entry['outputs']]
+                    save_manifest(staging_dir, variable, entry)
+    return filled_months
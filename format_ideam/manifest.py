@@ -0,0 +1,174 @@
+import os
+import json
+import glob
+import hashlib
+
+from config import *
+from utils import variable_directory
+
+# Modules whose code changes invalidate the station outputs: every module of
+# the per-station chain and the drivers that decide what is written (the
+# values of config.py are compared separately, see config_values)
+pipeline_modules = [
+    "read_xks.py",
+    "format_data.py",
+    "clean_data.py",
+    "outliers.py",
+    "streamflow.py",
+    "wind.py",
+    "compute_stats.py",
+    "plot_histogram.py",
+    "store.py",
+    "utils.py",
+    "manifest.py",
+    "batch.py",
+    "pipelined.py",
+]
+
+# Config settings that do not change the tables of a station (paths, workers,
+# batch level stages run after the stations: cube, gap filling, trend tests)
+run_settings = {
+    "file_name", "output_stations", "staging_folder", "input_stations", "sheet_name",
+    "streaming_reader", "batch_workers", "run_summary_file", "catalog_file",
+    "pipelined_batch", "reader_threads", "writer_threads", "pipeline_queue_size",
+    "run_report_file", "verbose", "incremental_build", "manifest_suffix",
+    "headless_plots", "show_plots", "update_data_cube", "data_cube_folder",
+    "gap_filling", "station_coordinates_file", "coordinate_columns", "snht_simulations",
+}
+run_prefixes = ("gap_fill_", "trend_", "dhime_")
+# Settings that only change the outputs of some variables
+streamflow_settings = {"streamflow_variables", "lyne_hollick_alpha", "lyne_hollick_passes",
+                       "eckhardt_alpha", "eckhardt_bfi_max", "flow_duration_exceedance"}
+wind_settings = {"wind_direction_variable", "wind_speed_variable", "wind_sectors",
+                 "wind_speed_bins", "wind_roses"}
+# Settings that change the raw table: a change needs the workbook again
+raw_settings = {"months", "variable_aggregation"}
+
+
+def file_hash(file_path, block_size=1024 * 1024):
+    """SHA-256 of a file, read by blocks."""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def code_version():
+    """Hash of the pipeline source files."""
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    sha = hashlib.sha256()
+    for module in pipeline_modules:
+        with open(os.path.join(code_dir, module), 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()[:16]
+
+
+def config_values(variable=None):
+    """
+    Config values that change the outputs of a station `variable`: every
+    setting of config.py except run_settings and the streamflow and wind
+    settings of other variables, as JSON values. The per variable
+    dictionaries are reduced to the entry of `variable` (or of the outlier
+    method). Settings of raw_settings are grouped under 'raw'.
+    """
+    import config
+
+    values = {'raw': {}}
+    for name, value in sorted(vars(config).items()):
+        if name.startswith('_') or name in run_settings or name.startswith(run_prefixes) \
+                or callable(value) or isinstance(value, type(config)):
+            continue
+        if name in streamflow_settings and variable not in streamflow_variables:
+            continue
+        if name in wind_settings and variable not in (wind_direction_variable, wind_speed_variable):
+            continue
+        if name == 'variable_aggregation':
+            value = value.get(variable, 'sum')
+        elif name == 'variable_labels':
+            value = value.get(variable)
+        elif name == 'outlier_thresholds':
+            name, value = 'outlier_threshold', value[outlier_method]
+        if name in raw_settings:
+            values['raw'][name] = value
+        else:
+            values[name] = value
+    # Same values as read back from a manifest (tuples as lists...)
+    return json.loads(json.dumps(values, default=str))
+
+
+def needs_records(variable):
+    """Whether some outputs of `variable` come from the workbook records, not the raw table."""
+    return variable in streamflow_variables or variable in (wind_direction_variable, wind_speed_variable)
+
+
+def manifest_path(output_dir, variable):
+    return os.path.join(output_dir, variable + manifest_suffix)
+
+
+def save_manifest(output_dir, variable, entry):
+    with open(manifest_path(output_dir, variable), 'w', encoding='utf-8') as f:
+        json.dump(entry, f, indent=2, ensure_ascii=False)
+
+
+def read_manifest(output_dir, variable):
+    """Manifest entry saved in `output_dir` (None if missing or unreadable)."""
+    try:
+        with open(manifest_path(output_dir, variable), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_key(file_path):
+    """
+    Key of the manifest of an input workbook: its path relative to the
+    project folder (absolute when it is on another drive), so workbooks with
+    the same name in different input folders do not share a manifest.
+    """
+    from utils import project_dir
+
+    file_path = os.path.abspath(file_path)
+    try:
+        return os.path.relpath(file_path, project_dir()).replace(os.sep, '/')
+    except ValueError:
+        return file_path.replace(os.sep, '/')
+
+
+def load_manifests(output_root):
+    """
+    Reads every station manifest under `output_root` and indexes them by the
+    key of the input workbook (see manifest_key), so a station can be looked
+    up before opening its workbook.
+    """
+    manifests = {}
+    for path in glob.glob(os.path.join(output_root, '*', '*', '*' + manifest_suffix)):
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue
+        manifests[entry['input_file']] = entry
+    return manifests
+
+
+def rebuild_plan(entry, input_hash, version, config):
+    """
+    Decides what has to be recomputed for a workbook:
+        'all'        -> new or changed input, code or raw settings: full chain
+        'downstream' -> same raw data, different config: clean, stats and plot
+        'none'       -> nothing changed and all outputs exist
+    Streamflow and wind variables are never rebuilt 'downstream':
+    their tables need the records of the workbook (see needs_records).
+    """
+    if entry is None or entry.get('input_hash') != input_hash or entry.get('code_version') != version:
+        return 'all'
+    if (entry.get('config') or {}).get('raw') != config.get('raw'):
+        return 'all'
+    output_dir = variable_directory(entry['station'], entry['variable'])
+    if not os.path.exists(os.path.join(output_dir, entry['raw_output'])):
+        return 'all'
+    if entry.get('config') != config or \
+            not all(os.path.exists(os.path.join(output_dir, f)) for f in entry['outputs']):
+        return 'all' if needs_records(entry['variable']) else 'downstream'
+    return 'none'
@@ -0,0 +1,110 @@
+"""
+Outlier detection of monthly tables.
+
+Works on any array whose last two axes are (years, 12): one station table
+or the whole (stations, years, 12) data cube in one call. Methods
+(config.outlier_method):
+    global_zscore   |x - mean| / std over all the months of the series
+                    (the original clean_data rule)
+    monthly_zscore  same, with the mean and std of each calendar month
+    mad             |x - median| / (1.4826 MAD) of each calendar month
+    hampel          |x - median| / (1.4826 MAD) of the same calendar month
+                    over a moving window of +-hampel_window years
+    iterative       monthly_zscore repeated with the mean and std of the
+                    values not yet flagged, until no new value is flagged
+When the MAD is 0 (e.g. dry months with mostly 0 rain) the robust scale
+falls back to 1.2533 times the mean absolute deviation, so a single rainy
+month is not flagged just because the median month is dry.
+"""
+import warnings
+
+import numpy as np
+
+from config import *
+
+outlier_methods = ["global_zscore", "monthly_zscore", "mad", "hampel", "iterative"]
+
+
+def _zscores(values, axis):
+    mean = np.nanmean(values, axis=axis, keepdims=True)
+    std = np.nanstd(values, axis=axis, keepdims=True)
+    return np.abs(values - mean) / std
+
+
+def _robust_scores(values, axis):
+    median = np.nanmedian(values, axis=axis, keepdims=True)
+    deviation = np.abs(values - median)
+    mad = np.nanmedian(deviation, axis=axis, keepdims=True)
+    mean_deviation = np.nanmean(deviation, axis=axis, keepdims=True)
+    scale = np.where(mad > 0, 1.4826 * mad, 1.2533 * mean_deviation)
+    return deviation / np.where(scale > 0, scale, np.nan)
+
+
+def _hampel_scores(values, window):
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    pad = [(0, 0)] * (values.ndim - 2) + [(window, window), (0, 0)]
+    windows = sliding_window_view(np.pad(values, pad, constant_values=np.nan), 2 * window + 1, axis=-2)
+    return _robust_scores(windows, axis=-1)[..., window]
+
+
+def outlier_scores(values, method=outlier_method, window=hampel_window):
+    """Score of every cell of `values` (..., years, 12) for `method` (NaN where missing)."""
+    values = np.asarray(values, dtype=float)
+    with np.errstate(all='ignore'), warnings.catch_warnings():
+        # Empty or constant months give NaN scores (never flagged)
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if method == 'global_zscore':
+            return _zscores(values, axis=(-2, -1))
+        if method in ('monthly_zscore', 'iterative'):
+            return _zscores(values, axis=-2)
+        if method == 'mad':
+            return _robust_scores(values, axis=-2)
+        if method == 'hampel':
+            return _hampel_scores(values, window)
+    raise ValueError(f"Unknown outlier method {method!r}, use one of {outlier_methods}")
+
+
+def detect_outliers(values, method=outlier_method, threshold=None,
+                    window=hampel_window, max_iterations=outlier_max_iterations):
+    """
+    Flags the outliers of `values` (..., years, 12).
+
+    Parameters:
+        values (np.ndarray): Monthly values, NaN when missing.
+        method (str): One of outlier_methods.
+        threshold (float): Score above which a value is an outlier
+            (default: config.outlier_thresholds of the method).
+        window (int): Half window of the hampel method, in years.
+        max_iterations (int): Limit of the iterative method.
+
+    Returns:
+        tuple: (mask of the outliers, scores), both shaped like `values`.
+    """
+    if threshold is None:
+        threshold = outlier_thresholds[method]
+    values = np.asarray(values, dtype=float)
+    scores = outlier_scores(values, method, window)
+    with np.errstate(invalid='ignore'):
+        mask = scores > threshold
+    if method != 'iterative':
+        return mask, scores
+
+    for _ in range(max_iterations):
+        # Every value is scored against the mean and std of the values not flagged
+        scores = _kept_zscores(values, mask)
+        with np.errstate(invalid='ignore'):
+            flagged = mask | (scores > threshold)
+        if flagged.sum() == mask.sum():
+            break
+        mask = flagged
+    return mask, scores
+
+
+def _kept_zscores(values, mask):
+    with np.errstate(all='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        kept = np.where(mask, np.nan, values)
+        mean = np.nanmean(kept, axis=-2, keepdims=True)
+        std = np.nanstd(kept, axis=-2, keepdims=True)
+        return np.abs(values - mean) / std
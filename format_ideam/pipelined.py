@@ -0,0 +1,266 @@
+"""
+Pipelined batch run: reading, computing and writing overlap.
+
+    reader threads --(read queue)--> compute processes --> writer threads
+
+* Reader threads load each workbook into memory (the slow part on network
+  folders) and, with incremental_build, hash it to skip unchanged stations.
+* The main thread hands the workbooks to a pool of compute processes, which
+  parse them and build every table (raw, Z_scores, cleaned, outliers, stats) and the
+  histogram PNG in memory.
+* Writer threads write the tables, the PNG, the workbook and the manifest
+  to a staging folder and swap it into <station>/<variable>/.
+
+Backpressure: the read queue holds at most pipeline_queue_size workbooks,
+and at most pipeline_queue_size stations can be between the compute
+submission and the end of their writes. Readers block when the compute
+falls behind, and the compute waits when the writes fall behind, so memory
+stays bounded whatever the number of stations.
+"""
+import io
+import os
+import time
+import queue
+import hashlib
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from config import *
+from utils import variable_directory
+from batch import init_worker
+from instrumentation import report, stage
+
+_done = object()
+
+
+def read_workbook(file_path, entry=None, incremental=incremental_build):
+    """
+    Loads the workbook bytes. Returns (data, plan, input_hash); data is None
+    when the station is unchanged since its manifest (plan 'none').
+    """
+    from manifest import code_version, config_values, rebuild_plan
+
+    label = os.path.basename(file_path)
+    with stage('read_file', file=label):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    if not incremental:
+        return data, 'all', None
+    with stage('manifest', file=label):
+        input_hash = hashlib.sha256(data).hexdigest()
+        plan = rebuild_plan(entry, input_hash, code_version(), config_values(entry and entry['variable']))
+    if plan == 'none':
+        return None, plan, input_hash
+    # The raw table is rebuilt from the workbook already in memory, so
+    # 'downstream' (only the config changed) costs the same as 'all' here
+    return data, 'all', input_hash
+
+
+def compute_station(file_path, data):
+    """
+    Compute stage (runs in a worker process): parses the workbook bytes and
+    builds every table and the histogram without touching the output folder.
+    """
+    from read_xks import read_xks_excel
+    from format_data import monthly_table
+    from clean_data import clean_tables
+    from compute_stats import stats_table
+    from plot_histogram import monthly_means_stds, get_renderer
+
+    label = os.path.basename(file_path)
+    result = {'file': file_path}
+    try:
+        with stage('read', file=label):
+            df, info = read_xks_excel(io.BytesIO(data), streaming=streaming_reader)
+        variable = info['B6']
+        with stage('pivot', file=label):
+            raw = monthly_table(df, variable_aggregation.get(variable, 'sum'))
+        with stage('clean', file=label):
+            z_scores, cleaned, outliers = clean_tables(raw, variable)
+        with stage('stats', file=label):
+            stats = stats_table(cleaned, variable)
+        tables = {'raw': raw, 'Z_scores': z_scores, 'cleaned': cleaned,
+                  'outliers': outliers, 'stats': stats}
+        if variable in streamflow_variables:
+            from streamflow import streamflow_tables
+            with stage('streamflow', file=label):
+                tables.update(streamflow_tables(df))
+        if variable in (wind_direction_variable, wind_speed_variable):
+            from wind import sector_frequencies, workbook_records, records_table
+            with stage('wind', file=label):
+                if variable == wind_direction_variable:
+                    tables['direction_sectors'] = sector_frequencies(*workbook_records(df))
+                if wind_roses:
+                    tables['records'] = records_table(df)
+        png = None
+        # No histogram of directions, as in batch.process_downstream
+        if variable_aggregation.get(variable) != 'circular_mean':
+            with stage('plot', file=label):
+                means, stds = monthly_means_stds(cleaned)
+                png = io.BytesIO()
+                get_renderer().render(
+                    means, stds, f"Histograma Mensual Multianual - {variable}",
+                    variable_labels[variable], png)
+        result.update({
+            'status': 'ok', 'station': info['B2'], 'variable': variable, 'metadata': info['D6'],
+            'tables': tables,
+            'png': None if png is None else png.getvalue(),
+        })
+    except Exception as e:
+        result.update({'status': 'failed', 'error': repr(e), 'traceback': traceback.format_exc()})
+    result['timings'] = report.drain()
+    return result
+
+
+def write_station(result, input_hash=None, incremental=incremental_build):
+    """Write stage (runs in a writer thread). Returns the batch result of the station."""
+    from utils import staged_station_directory, variable_directory
+    from store import write_table, table_path, export_station_workbook, kept_files
+    from manifest import code_version, config_values, save_manifest, manifest_key
+
+    label = os.path.basename(result['file'])
+    station, variable = result['station'], result['variable']
+    # Built aside and swapped in whole, see utils.publish_directory
+    with staged_station_directory(station, variable, kept_files(variable)) as staging_dir:
+        with stage('write', file=label):
+            tables = {name: table for name, table in result.pop('tables').items() if table is not None}
+            for name, table in tables.items():
+                write_table(table, staging_dir, variable, name)
+            outputs = [os.path.basename(table_path(staging_dir, variable, name))
+                       for name in tables if name != 'raw']
+            png = result.pop('png')
+            if png is not None:
+                png_name = f"{variable}_histograma.png"
+                with open(os.path.join(staging_dir, png_name), 'wb') as f:
+                    f.write(png)
+                outputs.append(png_name)
+        if export_excel:
+            with stage('excel', file=label):
+                outputs.append(os.path.basename(export_station_workbook(staging_dir, variable)))
+        if incremental:
+            save_manifest(staging_dir, variable, {
+                'input_file': manifest_key(result['file']),
+                'input_hash': input_hash,
+                'code_version': code_version(),
+                'config': config_values(variable),
+                'station': station,
+                'variable': variable,
+                'metadata': result['metadata'],
+                'raw_output': os.path.basename(table_path(staging_dir, variable, 'raw')),
+                'outputs': outputs,
+            })
+    output_dir = variable_directory(station, variable)
+    print(f"Station written: {station} - {variable} -> {output_dir}")
+    return {'file': result['file'], 'station': station, 'variable': variable,
+            'output_dir': output_dir, 'metadata': result['metadata'],
+            'rebuilt': 'all', 'status': 'ok'}
+
+
+def run_pipeline(files, entry, progress, workers=batch_workers,
+                 readers=reader_threads, writers=writer_threads, queue_size=pipeline_queue_size):
+    """
+    Processes `files` through the read -> compute -> write pipeline, calling
+    `progress(result)` once per file with the same result dict as
+    batch.run_station (from the writer threads, one call at a time). If a
+    compute process dies, the pool breaks and every workbook not computed
+    yet is reported as failed, as in batch.run_batch.
+
+    Parameters:
+        files (list): Station workbooks.
+        entry (callable): Manifest entry of a workbook (None if new).
+        progress (callable): Receives the result of every station.
+        workers (int): Compute processes.
+        readers (int), writers (int): I/O threads of each side.
+        queue_size (int): Bound of the read queue and of the stations in
+            flight between compute and write.
+    """
+    read_queue = queue.Queue(maxsize=queue_size)
+    in_flight = threading.BoundedSemaphore(queue_size)
+    progress_lock = threading.Lock()
+    starts = {}
+    # Set when the compute pool breaks: the readers stop loading workbooks
+    stop = threading.Event()
+    pool_error = []
+
+    def finish(result):
+        result['elapsed_s'] = round(time.perf_counter() - starts[result['file']], 3)
+        with progress_lock:
+            progress(result)
+
+    def failed(file_path, error, trace=None):
+        result = {'file': file_path, 'status': 'failed', 'error': error}
+        if trace is not None:
+            result['traceback'] = trace
+        finish(result)
+
+    def read(file_path):
+        starts[file_path] = time.perf_counter()
+        if stop.is_set():
+            failed(file_path, pool_error[0])
+            return
+        try:
+            data, plan, input_hash = read_workbook(file_path, entry(file_path))
+        except Exception as e:
+            failed(file_path, repr(e), traceback.format_exc())
+            return
+        if data is None:
+            print(f"Unchanged, skipping: {file_path}")
+            existing = entry(file_path)
+            finish({'file': file_path, 'status': 'ok', 'rebuilt': plan,
+                    'station': existing['station'], 'variable': existing['variable'],
+                    'output_dir': variable_directory(existing['station'], existing['variable'])})
+            return
+        # Blocks while the compute is queue_size workbooks behind
+        read_queue.put((file_path, data, input_hash))
+
+    def write(future, file_path, input_hash):
+        try:
+            result = future.result()
+            report.extend(result.pop('timings', None))
+            if result['status'] == 'ok':
+                result = write_station(result, input_hash)
+        except Exception as e:
+            # The worker process died, or the write failed
+            result = {'file': file_path, 'status': 'failed',
+                      'error': repr(e), 'traceback': traceback.format_exc()}
+        finally:
+            in_flight.release()
+        finish(result)
+
+    def read_all(reader_pool):
+        for future in [reader_pool.submit(read, file_path) for file_path in files]:
+            future.result()
+        read_queue.put(_done)
+
+    with ThreadPoolExecutor(max_workers=readers) as reader_pool, \
+            ThreadPoolExecutor(max_workers=writers) as writer_pool, \
+            ProcessPoolExecutor(max_workers=max(workers, 1), initializer=init_worker) as compute_pool:
+        feeder = threading.Thread(target=read_all, args=(reader_pool,), daemon=True)
+        feeder.start()
+        while True:
+            item = read_queue.get()
+            if item is _done:
+                break
+            file_path, data, input_hash = item
+            del item
+            if stop.is_set():
+                # Drained so that no reader stays blocked on the full queue
+                failed(file_path, pool_error[0])
+                continue
+            # Blocks while queue_size stations are computing or waiting to be written
+            in_flight.acquire()
+            try:
+                future = compute_pool.submit(compute_station, file_path, data)
+            except Exception as e:
+                # A worker process died (e.g. out of memory) and broke the pool:
+                # every remaining workbook fails, as in batch.run_batch
+                in_flight.release()
+                pool_error.append(repr(e))
+                stop.set()
+                failed(file_path, repr(e), traceback.format_exc())
+                continue
+            future.add_done_callback(
+                lambda f, p=file_path, h=input_hash: writer_pool.submit(write, f, p, h))
+            del data
+        feeder.join()
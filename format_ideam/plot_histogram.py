@@ -1,12 +1,89 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import matplotlib
 from config import *
 
+import matplotlib.pyplot as plt
+
+# Spanish month abbreviations
+meses = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun',
+         'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+
+
+def monthly_means_stds(df):
+    """Mean and std of each month (first column is the year)."""
+    # Extract only the monthly data (assume first column is year)
+    monthly_data = df.iloc[:, 1:13]
+    return monthly_data.mean(axis=0).to_numpy(), monthly_data.std(axis=0).to_numpy()
+
+
+class HistogramRenderer:
+    """
+    One figure and axes template reused for every station: render() only
+    updates the bar heights, the error bars and the labels in place, so no
+    figure is created (or leaked) per station.
+    """
+
+    def __init__(self):
+        self.x = np.arange(12)
+        if headless_plots:
+            # Render to files only, on an Agg canvas of its own: no GUI window,
+            # and the pyplot backend of the session is left as it is
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.fig = Figure(figsize=(10,6))
+            FigureCanvasAgg(self.fig)
+            self.ax = self.fig.subplots()
+        else:
+            self.fig, self.ax = plt.subplots(figsize=(10,6))
+        zeros = np.zeros(12)
+        self.bars = self.ax.bar(self.x, zeros, yerr=zeros, capsize=5, color='skyblue', edgecolor='black')
+        _, self.caplines, barlinecols = self.bars.errorbar.lines
+        self.errorlines = barlinecols[0]
+
+        self.ax.set_xticks(self.x)
+        self.ax.set_xticklabels(meses)
+        self.ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    def render(self, means, stds, title, y_tag, output_path=None):
+        means = np.asarray(means, dtype=float)
+        stds = np.asarray(stds, dtype=float)
+        lower, upper = means - stds, means + stds
+
+        for bar, height in zip(self.bars.patches, means):
+            bar.set_height(height)
+        self.errorlines.set_segments(np.stack(
+            [np.column_stack([self.x, lower]), np.column_stack([self.x, upper])], axis=1))
+        for capline, y in zip(self.caplines, (lower, upper)):
+            capline.set_data(self.x, y)
+
+        self.ax.set_ylabel(y_tag)
+        self.ax.set_title(title)
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+        if output_path is not None:
+            # Fast zlib level: same pixels, bigger file
+            self.fig.savefig(output_path, pil_kwargs={'compress_level': png_compress_level})
+        return self.fig
+
+
+_renderer = None
+
+
+def get_renderer():
+    """Renderer of this process, created on first use."""
+    global _renderer
+    if _renderer is None:
+        _renderer = HistogramRenderer()
+    return _renderer
+
+
 def plot_multiyear_monthly_histogram(
         df, 
         title, 
         y_tag,
-        output_path
+        output_path,
+        show=show_plots
         ):
     """
     Plots a histogram of multiyear monthly data with standard deviation lines on each bar.
@@ -14,33 +91,62 @@ def plot_multiyear_monthly_histogram(
     Parameters:
         df (pd.DataFrame): DataFrame with first column as year, next 12 columns as monthly data.
         title (str): Title of the plot.
+        y_tag (str): Label of the y axis.
+        output_path (str): Image file to save.
+        show (bool): Also show the figure (blocks until it is closed).
     """
-    # Spanish month abbreviations
-    meses = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 
-             'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
-    
-    # Extract only the monthly data (assume first column is year)
-    monthly_data = df.iloc[:, 1:13]
-    
     # Calculate mean and std for each month
-    means = monthly_data.mean(axis=0)
-    stds = monthly_data.std(axis=0)
-    
-    x = np.arange(12)
-    
-    fig, ax = plt.subplots(figsize=(10,6))
-    bars = ax.bar(x, means, yerr=stds, capsize=5, color='skyblue', edgecolor='black')
-    
-    ax.set_xticks(x)
-    ax.set_xticklabels(meses)
-    ax.set_ylabel(y_tag)
-    ax.set_title(title)
-    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    means, stds = monthly_means_stds(df)
+    get_renderer().render(means, stds, title, y_tag, output_path)
 
-    fig.savefig(output_path)
-    
-    plt.tight_layout()
-    plt.show()
+    if show:
+        plt.show()
+
+
+def _render_job(job):
+    means, stds, title, y_tag, output_path = job
+    get_renderer().render(means, stds, title, y_tag, output_path)
+    return output_path
+
+
+def _init_render_worker():
+    matplotlib.use("Agg")
+
+
+def render_histograms(jobs, workers=1, pdf_path=None):
+    """
+    Renders many station histograms.
+
+    Parameters:
+        jobs (list): Tuples (df, title, y_tag, output_path). output_path may
+            be None when only the PDF is wanted.
+        workers (int): Worker processes for the image files; each worker
+            reuses its own figure template.
+        pdf_path (str): If given, every histogram is also added as a page of
+            this multi-page PDF (rendered in this process).
+
+    Returns:
+        list: The image files written.
+    """
+    # Only the 12 means and stds travel to the workers
+    prepared = [(*monthly_means_stds(df), title, y_tag, output_path)
+                for df, title, y_tag, output_path in jobs]
+
+    if pdf_path is not None:
+        from matplotlib.backends.backend_pdf import PdfPages
+        renderer = get_renderer()
+        with PdfPages(pdf_path) as pdf:
+            for means, stds, title, y_tag, output_path in prepared:
+                pdf.savefig(renderer.render(means, stds, title, y_tag, output_path))
+        print(f"Histograms saved to: {pdf_path}")
+        return [job[-1] for job in prepared if job[-1] is not None]
+
+    if workers <= 1:
+        return [_render_job(job) for job in prepared]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as pool:
+        return list(pool.map(_render_job, prepared, chunksize=max(1, len(prepared) // (4 * workers))))
 
 # Ejemplo de uso:
 # df = pd.read_csv('tu_archivo.csv')
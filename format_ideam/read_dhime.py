@@ -0,0 +1,206 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import *
+from format_data import finalize_monthly
+from utils import staged_station_directory, variable_directory
+from store import write_table
+
+
+class MonthlySeriesAccumulator:
+    """
+    Running monthly aggregates (rows, valid count, sum, min, max, sine and
+    cosine sums) of one station/variable series, stored as years x 12 arrays
+    that grow as new years appear in the chunks, and the days with data
+    (for daily_mean, a day split between two chunks counts once).
+    """
+
+    def __init__(self):
+        self.first_year = None
+        self.rows = np.zeros((0, 12))
+        self.count = np.zeros((0, 12))
+        self.total = np.zeros((0, 12))
+        self.minimum = np.full((0, 12), np.nan)
+        self.maximum = np.full((0, 12), np.nan)
+        self.sin_total = np.zeros((0, 12))
+        self.cos_total = np.zeros((0, 12))
+        self.days = np.array([], dtype='datetime64[D]')
+
+    def _cover(self, first_year, last_year):
+        """Grows the arrays so they span first_year..last_year."""
+        if self.first_year is None:
+            self.first_year = first_year
+        current_last = self.first_year + self.rows.shape[0] - 1
+        before = max(0, self.first_year - first_year)
+        after = max(0, last_year - current_last)
+        if before or after:
+            for name, fill in [('rows', 0), ('count', 0), ('total', 0),
+                               ('minimum', np.nan), ('maximum', np.nan),
+                               ('sin_total', 0), ('cos_total', 0)]:
+                setattr(self, name, np.pad(getattr(self, name), ((before, after), (0, 0)),
+                                           constant_values=fill))
+            self.first_year -= before
+
+    def add(self, first_year, rows, count, total, minimum, maximum,
+            sin_total=None, cos_total=None, days=None):
+        """
+        Adds the (n_years, 12) aggregates of a chunk starting at first_year
+        (and the days with data of the chunk, if given).
+        """
+        last_year = first_year + rows.shape[0] - 1
+        self._cover(first_year, last_year)
+        start = first_year - self.first_year
+        block = slice(start, start + rows.shape[0])
+        self.rows[block] += rows
+        self.count[block] += count
+        self.total[block] += total
+        self.minimum[block] = np.fmin(self.minimum[block], minimum)
+        self.maximum[block] = np.fmax(self.maximum[block], maximum)
+        if sin_total is not None:
+            self.sin_total[block] += sin_total
+            self.cos_total[block] += cos_total
+        if days is not None:
+            self.days = np.union1d(self.days, days)
+
+    def table(self, how='sum'):
+        """Year + Jan..Dec table, same layout as pivot_monthly_dataframe."""
+        days = None
+        if how == 'daily_mean':
+            month_index = self.days.astype('datetime64[M]').astype(np.int64)
+            cell = (month_index // 12 + 1970 - self.first_year) * 12 + month_index % 12
+            days = np.bincount(cell, minlength=self.rows.size).reshape(self.rows.shape)
+        result = finalize_monthly(how, self.rows, self.count, self.total, self.minimum, self.maximum,
+                                  self.sin_total, self.cos_total, days)
+        keep = self.rows.sum(axis=1) > 0
+        table = pd.DataFrame(result[keep], columns=months)
+        table.insert(0, 'Year', np.arange(self.first_year, self.first_year + len(keep))[keep])
+        return table
+
+
+def _aggregate_chunk(chunk, accumulators):
+    """Splits a chunk by station/variable and accumulates it by year and month."""
+    dates = pd.to_datetime(chunk[dhime_columns['date']], errors='coerce', format=dhime_date_format)
+    values = pd.to_numeric(chunk[dhime_columns['value']], errors='coerce').to_numpy(dtype=float)
+    dates = dates.to_numpy(dtype='datetime64[ns]')
+    valid = ~np.isnat(dates)
+    if not valid.any():
+        return
+
+    series = pd.MultiIndex.from_arrays([
+        chunk[dhime_columns['station']].astype(str).to_numpy()[valid],
+        chunk[dhime_columns['variable']].astype(str).to_numpy()[valid],
+    ])
+    series_code, keys = series.factorize()
+    month_index = dates[valid].astype('datetime64[M]').astype(np.int64)
+    values = values[valid]
+
+    year = month_index // 12 + 1970
+    first_year = int(year.min())
+    n_years = int(year.max()) - first_year + 1
+    shape = (len(keys), n_years, 12)
+    size = len(keys) * n_years * 12
+    cell = (series_code * n_years + (year - first_year)) * 12 + month_index % 12
+
+    rows = np.bincount(cell, minlength=size)
+    finite = ~np.isnan(values)
+    cell, values = cell[finite], values[finite]
+    count = np.bincount(cell, minlength=size)
+    total = np.bincount(cell, weights=values, minlength=size)
+    minimum = np.full(size, np.nan)
+    maximum = np.full(size, np.nan)
+    np.fmin.at(minimum, cell, values)
+    np.fmax.at(maximum, cell, values)
+
+    # Directions and days with data only for the variables that need them
+    how = [variable_aggregation.get(dhime_variables.get(variable, variable), 'sum') for _, variable in keys]
+    sin_total = cos_total = None
+    if 'circular_mean' in how:
+        radians = np.radians(values)
+        sin_total = np.bincount(cell, weights=np.sin(radians), minlength=size).reshape(shape)
+        cos_total = np.bincount(cell, weights=np.cos(radians), minlength=size).reshape(shape)
+    if 'daily_mean' in how:
+        # Distinct (series, day) pairs, sorted by series
+        day = dates[valid][finite].astype('datetime64[D]').astype(np.int64)
+        first_day = day.min() if len(day) else 0
+        span = int(day.max()) - first_day + 1 if len(day) else 1
+        series_days = np.unique(series_code[finite] * span + (day - first_day))
+        bounds = np.searchsorted(series_days // span, np.arange(len(keys) + 1))
+
+    rows, count, total = rows.reshape(shape), count.reshape(shape), total.reshape(shape)
+    minimum, maximum = minimum.reshape(shape), maximum.reshape(shape)
+    for i, key in enumerate(keys):
+        # Only the years this series has in the chunk
+        used = np.flatnonzero(rows[i].sum(axis=1))
+        lo, hi = used[0], used[-1] + 1
+        extra = {}
+        if how[i] == 'circular_mean':
+            extra = {'sin_total': sin_total[i, lo:hi], 'cos_total': cos_total[i, lo:hi]}
+        elif how[i] == 'daily_mean':
+            days = series_days[bounds[i]:bounds[i + 1]] % span + first_day
+            extra = {'days': days.astype('datetime64[D]')}
+        accumulators.setdefault(key, MonthlySeriesAccumulator()).add(
+            first_year + lo, rows[i, lo:hi], count[i, lo:hi], total[i, lo:hi],
+            minimum[i, lo:hi], maximum[i, lo:hi], **extra)
+
+
+def ingest_dhime_csv(file_path, chunksize=dhime_chunksize):
+    """
+    Reads a DHIME CSV/TXT export (many stations and variables, one record
+    per row) in chunks of `chunksize` rows and aggregates it on the fly into
+    one years x 12 table per station and variable.
+
+    Only the four columns in config.dhime_columns are parsed, and each chunk
+    is reduced to monthly aggregates before the next one is read, so peak
+    memory depends on the chunk size and not on the export size.
+
+    Returns:
+        dict: (station, variable) -> DataFrame with Year + Jan..Dec, built
+        with the aggregation of config.variable_aggregation.
+    """
+    accumulators = {}
+    reader = pd.read_csv(
+        file_path,
+        sep=dhime_separator,
+        decimal=dhime_decimal,
+        encoding=dhime_encoding,
+        usecols=list(dhime_columns.values()),
+        dtype={dhime_columns['station']: str, dhime_columns['variable']: str,
+               dhime_columns['date']: str},
+        chunksize=chunksize,
+    )
+    n_rows = 0
+    for chunk in reader:
+        _aggregate_chunk(chunk, accumulators)
+        n_rows += len(chunk)
+    print(f"Read {n_rows} rows, {len(accumulators)} station/variable series from: {file_path}")
+
+    tables = {}
+    for (station, variable), accumulator in accumulators.items():
+        variable = dhime_variables.get(variable, variable)
+        tables[(station, variable)] = accumulator.table(variable_aggregation.get(variable, 'sum'))
+    return tables
+
+
+def export_dhime_tables(tables):
+    """
+    Writes every ingested table as the 'dhime' stage of its station folder.
+    The other outputs of the folder (raw, cleaned, stats... of the workbooks)
+    are carried into the new folder unchanged.
+    """
+    output_files = []
+    for (station, variable), table in tables.items():
+        with staged_station_directory(station, variable, keep_outputs=True) as staging_dir:
+            output_file = os.path.basename(write_table(table, staging_dir, variable, 'dhime'))
+        output_files.append(os.path.join(variable_directory(station, variable), output_file))
+    return output_files
+
+
+def main(file_path, chunksize=dhime_chunksize):
+    """Ingests a DHIME export and writes the table of every station and variable."""
+    tables = ingest_dhime_csv(file_path, chunksize)
+    output_files = export_dhime_tables(tables)
+    for output_file in output_files:
+        print(f"DHIME monthly table saved to: {output_file}")
+    return output_files
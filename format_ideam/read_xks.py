@@ -1,7 +1,17 @@
 import pandas as pd
+import numpy as np
 import openpyxl
+from itertools import islice
+
+# Layout of the IDEAM station workbooks
+header_row = 8
+merged_columns = [0, 2, 4]  # A-B, C-D, E-F
+
+
+def read_xks_excel(file_path, streaming=False):
+    if streaming:
+        return read_xks_excel_streaming(file_path)
 
-def read_xks_excel(file_path):
     # Load workbook and sheet
     wb = openpyxl.load_workbook(file_path, data_only=True)
     ws = wb.active
@@ -15,7 +25,6 @@ def read_xks_excel(file_path):
 
 
     # Read the header (row 8, 1-based index)
-    header_row = 8
     headers = []
     for col in range(1, ws.max_column + 1):
         cell = ws.cell(row=header_row, column=col)
@@ -58,6 +67,98 @@ def read_xks_excel(file_path):
     return df, info
 
 
+def merged_column_indices(n_columns):
+    """
+    Returns the 0-based indices of the columns kept after collapsing the
+    merged pairs A-B, C-D and E-F (same rule as the loop in read_xks_excel).
+    """
+    indices = []
+    col = 0
+    while col < n_columns:
+        indices.append(col)
+        col += 2 if col in merged_columns else 1
+    return indices
+
+
+def read_xks_excel_streaming(file_path, chunk_rows=50000):
+    """
+    Streaming version of read_xks_excel with the same (df, info) contract.
+
+    The workbook is opened in read-only mode, so openpyxl never builds the
+    cell tree: only rows 1-8 (B2/B6/D6 and the header) are read as values and
+    the data block from row 9 is consumed in blocks of `chunk_rows` rows. Each
+    block is converted to an array, the merged columns are dropped by slicing
+    and the values are stored as typed column arrays, so memory only grows
+    with the extracted columns and not with the workbook size.
+
+    Parameters:
+        file_path (str): Path to the IDEAM workbook.
+        chunk_rows (int): Number of rows converted at a time.
+    """
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        # The <dimension> tag of some exports is missing or reports "A1",
+        # which would cut the rows and columns: read the real ones instead
+        ws.reset_dimensions()
+        top_rows = list(ws.iter_rows(min_row=1, max_row=header_row, values_only=True))
+        top_rows += [()] * (header_row - len(top_rows))
+
+        def cell(row, col):
+            values = top_rows[row - 1]
+            return values[col - 1] if col <= len(values) else None
+
+        info = {
+            'B2': cell(2, 2),
+            'B6': cell(6, 2),
+            'D6': cell(6, 4)
+        }
+
+        # Width of the header row, widened if a data row is longer
+        headers = list(top_rows[header_row - 1])
+        n_columns = 0
+        keep = []
+        n_rows = 0
+
+        # One list of arrays per kept column, concatenated at the end
+        blocks = []
+        rows = ws.iter_rows(min_row=header_row + 1, values_only=True)
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            width = max([len(headers)] + [len(row) for row in chunk])
+            if width > n_columns:
+                n_columns = width
+                keep = merged_column_indices(n_columns)
+                # Columns first seen in this chunk are empty in the previous ones
+                for i in range(len(blocks), len(keep)):
+                    blocks.append([np.full(n_rows, np.nan)] if n_rows else [])
+            if not chunk:
+                break
+            # Rows end at their last cell: pad them to the full width
+            chunk = [tuple(row) + (None,) * (n_columns - len(row)) for row in chunk]
+            values = np.array(chunk, dtype=object)[:, keep]
+            blocks[0].append(values[:, 0])
+            for i in range(1, len(keep)):
+                # Convert all columns except the first to numeric
+                blocks[i].append(pd.to_numeric(values[:, i], errors='coerce'))
+            n_rows += len(chunk)
+            del chunk, values
+    finally:
+        wb.close()
+
+    headers += [None] * n_columns
+    merged_headers = [headers[col] for col in keep]
+    columns = {}
+    for i in range(len(keep)):
+        if blocks[i]:
+            columns[i] = np.concatenate(blocks[i])
+        else:
+            columns[i] = np.array([], dtype=object if i == 0 else float)
+        blocks[i] = None
+
+    df = pd.DataFrame(columns)
+    df.columns = merged_headers
+    return df, info
 
 
 # Example usage:
@@ -0,0 +1,76 @@
+import os
+import pandas as pd
+
+from config import *
+
+# Stages written by the pipeline, in the order they are produced (and
+# packed in the station workbook). The wind 'records' table is not listed:
+# hourly records do not fit in a sheet
+stages = ["raw", "Z_scores", "cleaned", "outliers", "stats",
+          "daily_flow", "monthly_flow", "flow_duration", "flow_summary",
+          "direction_sectors", "wind_rose", "dhime", "filled", "imputed"]
+# Stages written by other ingestions (read_dhime.py) or after the batch
+# (gap_filling.py), kept when a workbook of the same station variable is
+# processed again
+kept_stages = ["dhime", "filled", "imputed"]
+
+
+def table_extension():
+    return "parquet" if intermediate_format == "parquet" else "feather"
+
+
+def table_path(output_dir, variable, stage):
+    return os.path.join(output_dir, f"{variable}_{stage}.{table_extension()}")
+
+
+def kept_files(variable):
+    """File names of the kept_stages of a variable (see utils.staged_station_directory)."""
+    return [os.path.basename(table_path("", variable, stage)) for stage in kept_stages]
+
+
+def write_frame(df, output_file):
+    """
+    Writes a table in the columnar intermediate format
+    (config.intermediate_format: "parquet" or "feather").
+    """
+    df = df.reset_index(drop=True)
+    if intermediate_format == "parquet":
+        df.to_parquet(output_file, index=False, compression=columnar_compression)
+    else:
+        df.to_feather(output_file, compression=columnar_compression)
+    return output_file
+
+
+def write_table(df, output_dir, variable, stage):
+    """Writes one pipeline table (see write_frame)."""
+    return write_frame(df, table_path(output_dir, variable, stage))
+
+
+def read_table(output_dir, variable, stage):
+    """Reads back a table written by write_table."""
+    input_file = table_path(output_dir, variable, stage)
+    if intermediate_format == "parquet":
+        return pd.read_parquet(input_file)
+    return pd.read_feather(input_file)
+
+
+def remove_table(output_dir, variable, stage):
+    """Deletes a table left by a previous run (e.g. a stage turned off in config)."""
+    input_file = table_path(output_dir, variable, stage)
+    if os.path.exists(input_file):
+        os.remove(input_file)
+
+
+def export_station_workbook(output_dir, variable):
+    """
+    Packs every table of the station variable into one workbook
+    (<variable>.xlsx, one sheet per stage) using a fast writer.
+    """
+    output_file = os.path.join(output_dir, f"{variable}.xlsx")
+    with pd.ExcelWriter(output_file, engine=excel_engine) as writer:
+        for stage in stages:
+            if os.path.exists(table_path(output_dir, variable, stage)):
+                read_table(output_dir, variable, stage).to_excel(
+                    writer, sheet_name=stage, index=False)
+    print(f"Station workbook saved to: {output_file}")
+    return output_file
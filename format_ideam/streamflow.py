@@ -0,0 +1,259 @@
+"""
+Daily streamflow analysis: baseflow separation and flow statistics.
+
+Every kernel works on a (n_stations, n_days) array of daily flows over the
+same calendar (NaN when missing, see daily_matrix), so a whole network of
+decades of daily data is processed at once:
+    * lyne_hollick: Lyne & Hollick recursive digital filter (forward,
+      backward, forward... passes)
+    * eckhardt: Eckhardt two-parameter recursive filter
+    * flow_duration_curve: flows exceeded a given fraction of the days
+    * monthly_flow_stats: mean, minimum and maximum daily flow of each month
+The recursions step over the days with numpy operations on the column of
+all the stations, so the constraints 0 <= baseflow <= flow are applied at
+every time step (the next step starts from the constrained value) and the
+Python loop over the days is shared by the whole network. Gaps are
+interpolated linearly before filtering and are NaN again in the results.
+"""
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from config import *
+
+
+def daily_series(dates, values):
+    """
+    Daily mean of (sub-)daily records.
+
+    Returns:
+        tuple: (days datetime64[D] array from the first to the last day,
+        daily mean flow, NaN for days without data).
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnat(dates)
+    day = dates[valid].astype('datetime64[D]').astype(np.int64)
+    values = values[valid]
+    if len(day) == 0:
+        return np.array([], dtype='datetime64[D]'), np.array([])
+
+    first = day.min()
+    code = day - first
+    size = int(code.max()) + 1
+    finite = ~np.isnan(values)
+    total = np.bincount(code[finite], weights=values[finite], minlength=size)
+    count = np.bincount(code[finite], minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+    return (first + np.arange(size)).astype('datetime64[D]'), mean
+
+
+def daily_matrix(series):
+    """
+    Aligns several daily series on one calendar.
+
+    Parameters:
+        series (list): (days, flows) pairs from daily_series.
+
+    Returns:
+        tuple: (days array, (n_series, n_days) flows, NaN outside each record).
+    """
+    series = [(days, flows) for days, flows in series if len(days)]
+    if not series:
+        return np.array([], dtype='datetime64[D]'), np.empty((0, 0))
+    first = min(days[0] for days, _ in series)
+    last = max(days[-1] for days, _ in series)
+    days = np.arange(first, last + 1).astype('datetime64[D]')
+    matrix = np.full((len(series), len(days)), np.nan)
+    for i, (station_days, flows) in enumerate(series):
+        start = int((station_days[0] - first).astype(np.int64))
+        matrix[i, start:start + len(flows)] = flows
+    return days, matrix
+
+
+def _interpolate(q):
+    """Linear interpolation of the NaN of every row (edges take the nearest value)."""
+    missing = np.isnan(q)
+    if not missing.any():
+        return q
+    n_days = q.shape[1]
+    index = np.arange(n_days)
+    previous = np.maximum.accumulate(np.where(missing, -1, index), axis=1)
+    following = n_days - 1 - np.maximum.accumulate(np.where(missing[:, ::-1], -1, index), axis=1)[:, ::-1]
+
+    # Only the missing cells are computed
+    rows, days = np.nonzero(missing)
+    before, after = previous[rows, days], following[rows, days]
+    q_before = q[rows, np.clip(before, 0, n_days - 1)]
+    q_after = q[rows, np.clip(after, 0, n_days - 1)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        between = q_before + (days - before) / (after - before) * (q_after - q_before)
+    filled = q.copy()
+    filled[rows, days] = np.where(before < 0, q_after, np.where(after >= n_days, q_before, between))
+    # Rows without any value are left at 0 (NaN again in the results)
+    filled[np.isnan(filled)] = 0.0
+    return filled
+
+
+def lyne_hollick(q, alpha=lyne_hollick_alpha, passes=lyne_hollick_passes):
+    """
+    Baseflow of every row of `q` (n_stations, n_days) with the Lyne-Hollick filter:
+        quick[t] = alpha * quick[t-1] + (1 + alpha) / 2 * (Q[t] - Q[t-1])
+    with quick[t] kept between 0 and Q[t] at every step (baseflow = Q - quick),
+    applied `passes` times, alternating the direction, each pass on the
+    baseflow of the previous one. The quickflow starts at 0.
+    """
+    q = np.atleast_2d(np.asarray(q, dtype=float))
+    if q.shape[1] == 0:
+        return q.copy()
+    gain = (1 + alpha) / 2
+    # Days x stations, so each step works on one contiguous row
+    baseflow = np.ascontiguousarray(_interpolate(q).T)
+    for i in range(passes):
+        x = baseflow if i % 2 == 0 else baseflow[::-1]
+        base = np.empty_like(x)
+        base[0] = x[0]
+        quick = np.zeros(x.shape[1])
+        for t in range(1, len(x)):
+            quick = alpha * quick + gain * (x[t] - x[t - 1])
+            quick = np.minimum(np.maximum(quick, 0), x[t])
+            base[t] = x[t] - quick
+        baseflow = base if i % 2 == 0 else base[::-1]
+    return np.where(np.isnan(q), np.nan, baseflow.T)
+
+
+def eckhardt(q, alpha=eckhardt_alpha, bfi_max=eckhardt_bfi_max):
+    """
+    Baseflow of every row of `q` (n_stations, n_days) with the Eckhardt filter:
+        b[t] = ((1 - BFImax) * a * b[t-1] + (1 - a) * BFImax * Q[t]) / (1 - a * BFImax)
+    with b[t] kept between 0 and Q[t] at every step, starting from b = Q on
+    the first day.
+    """
+    q = np.atleast_2d(np.asarray(q, dtype=float))
+    if q.shape[1] == 0:
+        return q.copy()
+    c1 = (1 - bfi_max) * alpha / (1 - alpha * bfi_max)
+    c2 = (1 - alpha) * bfi_max / (1 - alpha * bfi_max)
+    x = np.ascontiguousarray(_interpolate(q).T)
+    baseflow = np.empty_like(x)
+    baseflow[0] = x[0]
+    for t in range(1, len(x)):
+        baseflow[t] = np.minimum(np.maximum(c1 * baseflow[t - 1] + c2 * x[t], 0), x[t])
+    return np.where(np.isnan(q), np.nan, baseflow.T)
+
+
+def baseflow_index(q, baseflow):
+    """Baseflow volume / total volume of every row, over the days with data."""
+    valid = ~np.isnan(q)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, baseflow, 0).sum(axis=1) / np.where(valid, q, 0).sum(axis=1)
+
+
+def flow_duration_curve(q, exceedance=flow_duration_exceedance):
+    """
+    Flow exceeded on each fraction `exceedance` of the days with data, for
+    every row of `q`. Returns a (n_stations, len(exceedance)) array.
+    """
+    q = np.atleast_2d(np.asarray(q, dtype=float))
+    exceedance = np.asarray(exceedance, dtype=float)
+    with warnings.catch_warnings():
+        # Stations without data give NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanquantile(q, 1 - exceedance, axis=1).T
+
+
+def monthly_flow_stats(days, q):
+    """
+    Mean, minimum and maximum daily flow and number of days with data of
+    every month of every row of `q`.
+
+    Returns:
+        tuple: (months datetime64[M] array, dict of (n_stations, n_months)
+        arrays 'mean', 'min', 'max', 'n_days').
+    """
+    q = np.atleast_2d(np.asarray(q, dtype=float))
+    month = np.asarray(days, dtype='datetime64[D]').astype('datetime64[M]')
+    if len(month) == 0:
+        empty = np.empty((q.shape[0], 0))
+        return month, {'mean': empty, 'min': empty, 'max': empty, 'n_days': empty}
+    starts = np.flatnonzero(np.r_[True, month[1:] != month[:-1]])
+    valid = ~np.isnan(q)
+    total = np.add.reduceat(np.where(valid, q, 0), starts, axis=1)
+    count = np.add.reduceat(valid, starts, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+    return month[starts], {
+        'mean': mean,
+        'min': np.fmin.reduceat(q, starts, axis=1),
+        'max': np.fmax.reduceat(q, starts, axis=1),
+        'n_days': count,
+    }
+
+
+def streamflow_tables(df):
+    """
+    Streamflow tables of one station from the workbook dataframe (dates in
+    the first column, flows in the second).
+
+    Returns:
+        dict: 'daily_flow' (Date, flow and the baseflow of both filters),
+        'monthly_flow' (Year, Month, mean/min/max flow, days with data,
+        mean baseflow and BFI of each filter), 'flow_duration' (exceedance,
+        flow) and 'flow_summary' (one row).
+    """
+    dates = pd.to_datetime(df.iloc[:, 0], errors='coerce').to_numpy()
+    values = pd.to_numeric(df.iloc[:, 1], errors='coerce').to_numpy()
+    days, flow = daily_series(dates, values)
+    q = flow[None, :]
+    baseflows = {'lh': lyne_hollick(q), 'eckhardt': eckhardt(q)}
+
+    daily = pd.DataFrame({'Date': days.astype('datetime64[ns]'), 'flow': flow})
+    for name, baseflow in baseflows.items():
+        daily[f'baseflow_{name}'] = baseflow[0]
+
+    month_starts, stats = monthly_flow_stats(days, q)
+    monthly = pd.DataFrame({
+        'Year': month_starts.astype('datetime64[Y]').astype(int) + 1970,
+        'Month': np.array(months)[month_starts.astype(np.int64) % 12],
+    })
+    for name in ['mean', 'min', 'max', 'n_days']:
+        monthly[name] = stats[name][0]
+    for name, baseflow in baseflows.items():
+        _, base_stats = monthly_flow_stats(days, np.where(np.isnan(q), np.nan, baseflow))
+        monthly[f'baseflow_{name}'] = base_stats['mean'][0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            monthly[f'bfi_{name}'] = base_stats['mean'][0] / stats['mean'][0]
+
+    duration = pd.DataFrame({
+        'exceedance': flow_duration_exceedance,
+        'flow': flow_duration_curve(q)[0],
+    })
+    q95, q50, q10 = flow_duration_curve(q, [0.95, 0.5, 0.1])[0]
+    summary = pd.DataFrame([{
+        'first_day': days[0].astype('datetime64[ns]') if len(days) else pd.NaT,
+        'last_day': days[-1].astype('datetime64[ns]') if len(days) else pd.NaT,
+        'n_days': int((~np.isnan(flow)).sum()),
+        'missing_days': int(np.isnan(flow).sum()),
+        'mean': np.nanmean(flow) if (~np.isnan(flow)).any() else np.nan,
+        'q95': q95,
+        'q50': q50,
+        'q10': q10,
+        'bfi_lh': baseflow_index(q, baseflows['lh'])[0],
+        'bfi_eckhardt': baseflow_index(q, baseflows['eckhardt'])[0],
+    }])
+    return {'daily_flow': daily, 'monthly_flow': monthly,
+            'flow_duration': duration, 'flow_summary': summary}
+
+
+def export_streamflow(df, output_dir, variable):
+    """Writes the streamflow_tables of a station. Returns the output file names."""
+    from store import write_table
+
+    outputs = []
+    for name, table in streamflow_tables(df).items():
+        outputs.append(os.path.basename(write_table(table, output_dir, variable, name)))
+    print(f"Streamflow tables saved to: {output_dir}")
+    return outputs
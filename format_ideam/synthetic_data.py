@@ -0,0 +1,122 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from config import *
+from read_xks import header_row
+
+# Columns of the data block: (header, merged with the next column)
+synthetic_columns = [
+    ("Fecha", True),
+    ("Valor", True),
+    ("Grado", True),
+    ("Calificador", False),
+    ("NivelAprobacion", False),
+]
+
+
+def synthetic_series(n_years, frequency="daily", variable="PRECIPITACION", start_year=1980,
+                     missing_fraction=0.05, seed=0):
+    """
+    Random daily or hourly series with a seasonal cycle.
+
+    Returns:
+        tuple: (dates DatetimeIndex, values array with NaN for missing data).
+    """
+    rng = np.random.default_rng(seed)
+    freq = "h" if frequency == "hourly" else "D"
+    dates = pd.date_range(f"{start_year}-01-01", f"{start_year + n_years - 1}-12-31 23:00", freq=freq)
+    season = np.cos(2 * np.pi * (dates.month.to_numpy() - 4) / 12)
+
+    if variable == "TEMPERATURA":
+        values = 14 + 2 * season + rng.normal(0, 1.5, len(dates))
+    elif variable == "DIR VIENTO":
+        # Prevailing easterlies, veering with the season
+        values = np.mod(90 + 30 * season + np.degrees(rng.vonmises(0, 2, len(dates))), 360)
+    elif variable == "CAUDAL":
+        # Seasonal baseflow plus storm runoff receding from the rainy days
+        from scipy.signal import lfilter
+        wet = rng.random(len(dates)) < 0.35 + 0.2 * season
+        rain = np.where(wet, rng.gamma(0.8, 8, len(dates)), 0.0)
+        values = 3 + 1.5 * season + lfilter([0.2], [1, -0.85], rain)
+    elif variable == "VEL VIENTO":
+        values = rng.gamma(2, 1.5 + 0.5 * season)
+    elif variable == "BRILLO SOLAR":
+        # Hours of sun in each record (daytime only for hourly records)
+        if frequency == "hourly":
+            daytime = (dates.hour.to_numpy() >= 6) & (dates.hour.to_numpy() < 18)
+            values = np.where(daytime, rng.random(len(dates)) < 0.4 - 0.1 * season, 0.0)
+        else:
+            values = rng.uniform(0, 9 - 2 * season)
+    else:
+        scale = 1 / 24 if frequency == "hourly" else 1
+        wet = rng.random(len(dates)) < 0.45 + 0.2 * season
+        values = np.where(wet, rng.gamma(0.8, 8 * scale, len(dates)), 0.0)
+    values = np.round(values, 1)
+    values[rng.random(len(dates)) < missing_fraction] = np.nan
+    return dates, values
+
+
+def write_synthetic_workbook(file_path, n_years, frequency="daily", station="ESTACION SINTETICA",
+                             variable="PRECIPITACION", seed=0):
+    """
+    Writes a workbook with the layout read_xks_excel expects: station name
+    in B2, variable in B6, metadata in D6, headers in row 8 and data from
+    row 9, with the A-B, C-D and E-F columns merged.
+    """
+    dates, values = synthetic_series(n_years, frequency, variable, seed=seed)
+
+    # constant_memory writes row by row, so the file size does not matter
+    workbook = xlsxwriter.Workbook(file_path, {"constant_memory": True})
+    worksheet = workbook.add_worksheet(sheet_name)
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm"})
+
+    worksheet.write(1, 0, "Estación")
+    worksheet.write(1, 1, station)
+    worksheet.write(5, 0, "Variable")
+    worksheet.write(5, 1, variable)
+    worksheet.write(5, 2, "Código")
+    worksheet.write(5, 3, f"{seed:08d} - {frequency}")
+
+    def write_row(row, cells, cell_format=None):
+        col = 0
+        for _, merged in synthetic_columns:
+            if merged:
+                worksheet.merge_range(row, col, row, col + 1, None)
+                col += 2
+            else:
+                col += 1
+        col = 0
+        for (_, merged), value in zip(synthetic_columns, cells):
+            if isinstance(value, datetime):
+                worksheet.write_datetime(row, col, value, cell_format)
+            elif value is not None:
+                worksheet.write(row, col, value)
+            col += 2 if merged else 1
+
+    write_row(header_row - 1, [name for name, _ in synthetic_columns])
+    for i, (date, value) in enumerate(zip(dates.to_pydatetime(), values)):
+        value = None if np.isnan(value) else float(value)
+        write_row(header_row + i, [date, value, 50, None, 1], date_format)
+
+    workbook.close()
+    return file_path
+
+
+def synthetic_station_files(output_dir, n_stations, n_years, frequency="daily",
+                            variable="PRECIPITACION"):
+    """
+    Creates (or reuses) `n_stations` synthetic workbooks in `output_dir`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+    for i in range(n_stations):
+        file_path = os.path.join(output_dir, f"{variable}_{frequency}_{n_years}y_{i:04d}.xlsx")
+        if not os.path.exists(file_path):
+            write_synthetic_workbook(file_path, n_years, frequency,
+                                     station=f"SINTETICA {i:04d}", variable=variable, seed=i)
+        files.append(file_path)
+    return files
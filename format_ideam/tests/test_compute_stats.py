@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from config import months
+from compute_stats import monthly_statistics, compute_stats, MonthlyStatsAccumulator
+
+
+def monthly_values(n_years=30, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.gamma(2.0, 50.0, size=(n_years, 12)).round(1)
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[:, 3] = np.nan  # a month without data
+    values[:-1, 4] = np.nan  # a month with one value
+    values[:, 5] = np.where(np.arange(n_years) % 3 == 0, 10.0, values[:, 5])  # ties for the mode
+    return values
+
+
+def pandas_statistics(values):
+    df = pd.DataFrame(values)
+    return {
+        'mean': df.mean().to_numpy(),
+        'std': df.std().to_numpy(),
+        'min': df.min().to_numpy(),
+        'max': df.max().to_numpy(),
+        'count': df.count().to_numpy(),
+        'median': df.median().to_numpy(),
+        'mode': np.array([df[c].mode()[0] if df[c].notna().any() else np.nan for c in df]),
+        'Kurtosis': df.kurt().to_numpy(),
+        'Skewness': df.skew().to_numpy(),
+        'q25': df.quantile(0.25).to_numpy(),
+        'q75': df.quantile(0.75).to_numpy(),
+    }
+
+
+def test_monthly_statistics_match_pandas():
+    values = monthly_values()
+    stats = monthly_statistics(values)
+    for name, expected in pandas_statistics(values).items():
+        np.testing.assert_allclose(stats[name], expected, rtol=1e-9, atol=1e-12, equal_nan=True, err_msg=name)
+
+
+def test_compute_stats_table_layout():
+    values = monthly_values(n_years=5, seed=1)
+    df = pd.DataFrame(values, columns=months)
+    df.insert(0, 'Year', range(2000, 2005))
+    stats = compute_stats(df)
+    assert list(stats) == months
+    assert stats['Jan']['count'] == df['Jan'].count()
+    np.testing.assert_allclose(stats['Feb']['mean'], df['Feb'].mean())
+
+
+def test_accumulator_merge_matches_one_pass():
+    values = monthly_values(n_years=40, seed=2)
+    total = MonthlyStatsAccumulator()
+    for chunk in np.array_split(values, [7, 8, 25]):
+        total.update(chunk)
+    merged = total.result()
+    expected = pandas_statistics(values)
+    for name in ['mean', 'std', 'min', 'max', 'count', 'Kurtosis', 'Skewness']:
+        np.testing.assert_allclose(merged[name], expected[name], rtol=1e-9, atol=1e-9, equal_nan=True,
+                                   err_msg=name)
+
+
+def test_import_does_not_load_plotting_or_excel():
+    # The statistics helpers are pure numpy: importing them must not load
+    # matplotlib (nor change its backend) or openpyxl
+    code = ("import sys, compute_stats, clean_data; "
+            "print(sorted(m for m in ('matplotlib', 'openpyxl') if m in sys.modules))")
+    folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=folder, check=True,
+                            capture_output=True, text=True).stdout
+    assert output.strip() == '[]'
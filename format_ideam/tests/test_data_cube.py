@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import months
+from data_cube import StationCube
+
+
+def monthly_table(first_year, n_years, seed=0, skip_years=()):
+    """Year + Jan..Dec table with some missing months and missing years."""
+    rng = np.random.default_rng(seed)
+    values = rng.gamma(2, 50, (n_years, 12))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    table = pd.DataFrame(values, columns=months)
+    table.insert(0, 'Year', np.arange(first_year, first_year + n_years))
+    return table[~table['Year'].isin(skip_years)].reset_index(drop=True)
+
+
+def expected_values(table, years):
+    """(n_years, 12) values of `table` on `years`, NaN outside the table."""
+    values = np.full((len(years), 12), np.nan)
+    rows = table.set_index('Year').reindex(years)
+    values[:] = rows[months].to_numpy(dtype=float)
+    return values
+
+
+def test_append_and_query(tmp_path):
+    cube = StationCube(str(tmp_path / 'cube'))
+    paraiso = monthly_table(1990, 10, seed=1, skip_years=[1994])
+    llano = monthly_table(1985, 8, seed=2)
+    cube.append('EL PARAISO', 'PRECIPITACION', paraiso)
+    cube.append('EL LLANO', 'PRECIPITACION', llano)
+    cube.append('EL PARAISO', 'TEMPERATURA', monthly_table(2000, 3, seed=3))
+
+    index, years, values = cube.query(variable='PRECIPITACION')
+    assert index['station'].tolist() == ['EL LLANO', 'EL PARAISO']
+    assert years.tolist() == list(range(1985, 2000))
+    np.testing.assert_array_equal(values[0], expected_values(llano, years))
+    np.testing.assert_array_equal(values[1], expected_values(paraiso, years))
+
+    # Period and station slices
+    index, years, values = cube.query(stations=['EL PARAISO'], variable='PRECIPITACION',
+                                      start_year=1988, end_year=1995)
+    assert len(index) == 1 and years.tolist() == list(range(1988, 1996))
+    np.testing.assert_array_equal(values[0], expected_values(paraiso, years))
+
+    frame = cube.to_frame(stations=['EL PARAISO'], variable='PRECIPITACION')
+    assert frame['Year'].tolist() == paraiso['Year'].tolist()
+
+
+def test_appended_again_and_compact(tmp_path):
+    cube = StationCube(str(tmp_path / 'cube'))
+    cube.append('EL PARAISO', 'PRECIPITACION', monthly_table(1990, 10, seed=1))
+    cube.append('EL LLANO', 'PRECIPITACION', monthly_table(1985, 8, seed=2))
+    # Every rebuild of a station appends a new block, the last one wins
+    cube.append('EL PARAISO', 'PRECIPITACION', monthly_table(1992, 5, seed=3))
+    latest = monthly_table(1991, 12, seed=4)
+    cube.append('EL PARAISO', 'PRECIPITACION', latest)
+
+    before = cube.query()
+    assert len(before[0]) == 2
+    np.testing.assert_array_equal(before[2][1], expected_values(latest, before[1]))
+    assert os.path.getsize(cube.values_path) == (10 + 8 + 5 + 12) * 12 * 8
+
+    cube.compact()
+    assert os.path.getsize(cube.values_path) == (8 + 12) * 12 * 8
+    after = cube.query()
+    pd.testing.assert_frame_equal(after[0].drop(columns='offset'),
+                                  before[0].drop(columns='offset'))
+    np.testing.assert_array_equal(after[1], before[1])
+    np.testing.assert_array_equal(after[2], before[2])
+
+    # Appending after a compact continues at the end of the compacted file
+    cube.append('EL LLANO', 'PRECIPITACION', monthly_table(1985, 2, seed=5))
+    cube.compact()
+    assert os.path.getsize(cube.values_path) == (2 + 12) * 12 * 8
+    np.testing.assert_array_equal(cube.query(stations=['EL PARAISO'])[2][0],
+                                  expected_values(latest, np.arange(1991, 2003)))
+
+
+def test_empty_cube(tmp_path):
+    cube = StationCube(str(tmp_path / 'cube'))
+    cube.compact()
+    index, years, values = cube.query()
+    assert index.empty and years.size == 0 and values.shape == (0, 0, 12)
+    assert cube.to_frame().empty
+
+    # Empty table: nothing is added
+    assert cube.append('EL PARAISO', 'PRECIPITACION', monthly_table(1990, 0)) is None
+    cube.compact()
+    assert cube.query()[0].empty
+
+    # Cube where every block was dropped: empty values file
+    cube.append('EL PARAISO', 'PRECIPITACION', monthly_table(1990, 3))
+    pd.DataFrame(columns=cube.stations().columns).to_csv(cube.index_path, index=False)
+    cube.compact()
+    assert os.path.getsize(cube.values_path) == 0
+    cube.compact()
+    assert cube.query()[0].empty
+    cube.append('EL PARAISO', 'PRECIPITACION', monthly_table(1990, 3, seed=6))
+    assert cube.query()[2].shape == (1, 3, 12)
@@ -0,0 +1,151 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+from config import months
+from data_cube import StationCube
+from gap_filling import earth_radius_km, neighbour_index, fill_gaps, fill_station_gaps
+from store import write_table, read_table, table_path, kept_files
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * earth_radius_km * np.arcsin(np.sqrt(a))
+
+
+def network(n_stations, n_years, seed=0):
+    """Stations sharing a regional signal, with missing months."""
+    rng = np.random.default_rng(seed)
+    regional = rng.gamma(2, 50, (n_years, 12))
+    scale = rng.uniform(0.5, 1.5, n_stations)[:, None, None]
+    values = scale * regional + rng.normal(0, 5 + 20 * rng.random((n_stations, 1, 1)), (n_stations, n_years, 12))
+    values[rng.random(values.shape) < 0.15] = np.nan
+    return values
+
+
+@pytest.mark.parametrize('k, max_distance_km', [(5, 80), (3, 1000), (8, 20)])
+def test_neighbour_index_matches_brute_force(k, max_distance_km):
+    rng = np.random.default_rng(3)
+    n = 40
+    latitude = rng.uniform(4, 7, n)
+    longitude = rng.uniform(-76, -73, n)
+    neighbours, distances = neighbour_index(latitude, longitude, k, max_distance_km)
+
+    assert neighbours.shape == distances.shape == (n, k)
+    for i in range(n):
+        km = haversine_km(latitude[i], longitude[i], latitude, longitude)
+        others = [j for j in np.argsort(km, kind='stable') if j != i and km[j] <= max_distance_km][:k]
+        assert neighbours[i, :len(others)].tolist() == others
+        np.testing.assert_allclose(distances[i, :len(others)], km[others], rtol=1e-9)
+        assert (neighbours[i, len(others):] == n).all()
+        assert np.isinf(distances[i, len(others):]).all()
+
+
+def test_neighbour_index_without_neighbours():
+    neighbours, distances = neighbour_index([5.0], [-75.0], k=3)
+    assert neighbours.tolist() == [[1, 1, 1]] and np.isinf(distances).all()
+
+
+def reference_fill(values, neighbours, min_overlap, min_correlation, lower_bound):
+    """Cell by cell: best correlated neighbour with data, regression fitted on the common years."""
+    n, n_years, _ = values.shape
+    filled = values.copy()
+    donor = np.full(values.shape, -1)
+    correlation = np.full(values.shape, np.nan)
+    for i in range(n):
+        for month in range(12):
+            y = values[i, :, month]
+            fits = []
+            for j in neighbours[i]:
+                if j == n:
+                    continue
+                x = values[j, :, month]
+                common = ~np.isnan(x) & ~np.isnan(y)
+                if common.sum() < max(min_overlap, 2) or x[common].std() == 0 or y[common].std() == 0:
+                    continue
+                r = np.corrcoef(x[common], y[common])[0, 1]
+                if r >= min_correlation:
+                    slope, intercept = np.polyfit(x[common], y[common], 1)
+                    fits.append((r, j, slope, intercept))
+            for year in np.flatnonzero(np.isnan(y)):
+                available = [fit for fit in fits if not np.isnan(values[fit[1], year, month])]
+                if not available:
+                    continue
+                r, j, slope, intercept = max(available, key=lambda fit: fit[0])
+                estimate = intercept + slope * values[j, year, month]
+                filled[i, year, month] = estimate if lower_bound is None else max(estimate, lower_bound)
+                donor[i, year, month] = j
+                correlation[i, year, month] = r
+    return filled, donor, correlation
+
+
+@pytest.mark.parametrize('min_overlap, min_correlation, lower_bound', [
+    (8, 0.7, 0.0), (15, 0.9, None), (3, -1.0, None)])
+def test_fill_gaps_matches_reference(min_overlap, min_correlation, lower_bound):
+    values = network(8, 20, seed=1)
+    rng = np.random.default_rng(2)
+    neighbours, _ = neighbour_index(rng.uniform(4, 5, 8), rng.uniform(-75, -74, 8), k=4)
+    neighbours[0, 2:] = 8  # a station with fewer neighbours
+
+    result = fill_gaps(values, neighbours, min_overlap, min_correlation, lower_bound=lower_bound)
+    filled, donor, correlation = reference_fill(values, neighbours, min_overlap, min_correlation, lower_bound)
+
+    np.testing.assert_allclose(result['filled'], filled, rtol=1e-9, atol=1e-9)
+    np.testing.assert_array_equal(result['donor'], donor)
+    np.testing.assert_array_equal(result['imputed'], donor >= 0)
+    np.testing.assert_allclose(result['correlation'], correlation, rtol=1e-9)
+    assert result['imputed'].any()
+
+
+def test_fill_gaps_only_inside_the_mask():
+    values = network(5, 15, seed=4)
+    neighbours, _ = neighbour_index(np.linspace(4, 4.2, 5), np.full(5, -75.0), k=4)
+    fill_mask = np.zeros(values.shape, dtype=bool)
+    fill_mask[:, 5:10] = True
+    result = fill_gaps(values, neighbours, min_correlation=0.0, fill_mask=fill_mask)
+    assert result['imputed'].any() and not result['imputed'][~fill_mask].any()
+    np.testing.assert_array_equal(result['filled'][~fill_mask], values[~fill_mask])
+
+
+def test_filled_tables_are_published_and_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'project_dir', lambda: str(tmp_path))
+    variable = 'PRECIPITACION'
+    values = network(4, 12, seed=5)
+    stations = ['S1', 'S2', 'S3', 'S4']
+    cube = StationCube(str(tmp_path / 'cube'))
+    for station, station_values in zip(stations, values):
+        table = pd.DataFrame(station_values, columns=months)
+        table.insert(0, 'Year', np.arange(2000, 2012))
+        cube.append(station, variable, table)
+        # Published folder of the station, as left by the batch
+        with utils.staged_station_directory(station, variable) as staging_dir:
+            cleaned = os.path.basename(write_table(table, staging_dir, variable, 'cleaned'))
+            with open(os.path.join(staging_dir, f"{variable}_manifest.json"), 'w') as f:
+                json.dump({'outputs': [cleaned]}, f)
+    coordinates = pd.DataFrame({'station': stations, 'latitude': [4.0, 4.1, 4.2, 4.3],
+                                'longitude': [-75.0, -75.0, -75.1, -75.1]})
+
+    filled_months = fill_station_gaps(str(tmp_path / 'cube'), [variable], coordinates)
+    assert filled_months[variable] > 0
+
+    output_dir = utils.variable_directory('S1', variable)
+    filled = read_table(output_dir, variable, 'filled')
+    imputed = read_table(output_dir, variable, 'imputed')
+    assert filled[months].isna().sum().sum() < np.isnan(values[0]).sum()
+    assert imputed[months].notna().sum().sum() == np.isnan(values[0]).sum() - filled[months].isna().sum().sum()
+    names = [os.path.basename(table_path(output_dir, variable, stage))
+             for stage in ['cleaned', 'filled', 'imputed']]
+    with open(os.path.join(output_dir, f"{variable}_manifest.json")) as f:
+        assert json.load(f)['outputs'] == names
+    assert {'cleaned', 'filled', 'imputed'} <= set(pd.ExcelFile(os.path.join(output_dir, f"{variable}.xlsx")).sheet_names)
+
+    # The batch publishes the station again: the gap filled tables are carried
+    with utils.staged_station_directory('S1', variable, kept_files(variable)) as staging_dir:
+        write_table(pd.DataFrame({'Year': [2000]}), staging_dir, variable, 'cleaned')
+    pd.testing.assert_frame_equal(read_table(output_dir, variable, 'filled'), filled)
+    pd.testing.assert_frame_equal(read_table(output_dir, variable, 'imputed'), imputed)
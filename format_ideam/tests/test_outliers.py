@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import months, outlier_thresholds
+from outliers import detect_outliers, outlier_methods
+from clean_data import outlier_tables
+
+
+def robust_score(x, sample):
+    """|x - median| / (1.4826 MAD) of `sample`, 1.2533 mean deviation when the MAD is 0."""
+    sample = sample[~np.isnan(sample)]
+    median = np.median(sample)
+    mad = np.median(np.abs(sample - median))
+    scale = 1.4826 * mad if mad > 0 else 1.2533 * np.mean(np.abs(sample - median))
+    return abs(x - median) / scale if scale > 0 else np.nan
+
+
+def z_score(x, sample):
+    sample = sample[~np.isnan(sample)]
+    std = np.std(sample)
+    return abs(x - np.mean(sample)) / std if std > 0 else np.nan
+
+
+def reference_scores(table, method, window=5):
+    """Score of each cell of one (years, 12) table, cell by cell."""
+    years = table.shape[0]
+    scores = np.full(table.shape, np.nan)
+    for i in range(years):
+        for j in range(12):
+            x = table[i, j]
+            if np.isnan(x):
+                continue
+            if method == 'global_zscore':
+                scores[i, j] = z_score(x, table.ravel())
+            elif method in ('monthly_zscore', 'iterative'):
+                scores[i, j] = z_score(x, table[:, j])
+            elif method == 'mad':
+                scores[i, j] = robust_score(x, table[:, j])
+            elif method == 'hampel':
+                scores[i, j] = robust_score(x, table[max(0, i - window): i + window + 1, j])
+    return scores
+
+
+def reference_iterative(table, threshold, max_iterations=10):
+    mask = reference_scores(table, 'monthly_zscore') > threshold
+    for _ in range(max_iterations):
+        kept = np.where(mask, np.nan, table)
+        scores = np.array([[z_score(table[i, j], kept[:, j]) if not np.isnan(table[i, j]) else np.nan
+                            for j in range(12)] for i in range(table.shape[0])])
+        flagged = mask | (scores > threshold)
+        if flagged.sum() == mask.sum():
+            break
+        mask = flagged
+    return mask
+
+
+@pytest.fixture
+def cube():
+    rng = np.random.default_rng(11)
+    values = rng.gamma(2.0, 50.0, (3, 30, 12))
+    values[:, rng.random(30) < 0.2, :3] = 0.0  # dry months, MAD 0 fallback
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[0, 4, 6] = 2000.0
+    values[1, 20, 1] = 1500.0
+    values[1, 21, 1] = 1400.0  # masks the first spike until it is flagged
+    values[2, :, 11] = 0.0  # a constant month is never flagged
+    return values
+
+
+@pytest.mark.parametrize('method', outlier_methods)
+def test_detect_outliers_matches_reference(cube, method):
+    threshold = outlier_thresholds[method]
+    mask, scores = detect_outliers(cube, method)
+    station_mask, _ = detect_outliers(cube[1], method)
+    np.testing.assert_array_equal(station_mask, mask[1])
+    assert not mask[2, :, 11].any()
+
+    for station, table in enumerate(cube):
+        if method == 'iterative':
+            np.testing.assert_array_equal(mask[station], reference_iterative(table, threshold))
+            continue
+        expected = reference_scores(table, method)
+        np.testing.assert_allclose(scores[station], expected, rtol=1e-12, equal_nan=True)
+        np.testing.assert_array_equal(mask[station], expected > threshold)
+    assert mask[0, 4, 6]
+
+
+def test_outlier_tables_list_the_nullified_months(cube):
+    df = pd.DataFrame(cube[0], columns=months)
+    df.insert(0, 'Year', np.arange(1990, 2020))
+    scores, cleaned, outliers = outlier_tables(df, 'mad')
+    assert scores is None  # save_z_scores is off by default
+
+    mask, expected = detect_outliers(cube[0], 'mad')
+    assert len(outliers) == mask.sum()
+    assert cleaned[months].isna().to_numpy().sum() == np.isnan(cube[0]).sum() + mask.sum()
+    row = outliers.set_index(['Year', 'Month']).loc[(1994, 'Jul')]
+    assert row['value'] == 2000.0 and row['score'] == pytest.approx(expected[4, 6])
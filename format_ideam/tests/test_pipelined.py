@@ -0,0 +1,32 @@
+import os
+import threading
+
+import pipelined
+
+
+def dying_compute(file_path, data):
+    # Same as a worker killed by the system (out of memory, segfault)
+    os._exit(1)
+
+
+def test_dead_worker_fails_every_remaining_file(tmp_path, monkeypatch):
+    # The workers are forked, so they run the patched compute stage
+    monkeypatch.setattr(pipelined, 'compute_station', dying_compute)
+    files = []
+    for i in range(12):
+        path = tmp_path / f'station_{i:02d}.xlsx'
+        path.write_bytes(b'workbook %d' % i)
+        files.append(str(path))
+
+    results = []
+    run = threading.Thread(target=pipelined.run_pipeline, daemon=True, kwargs={
+        'files': files, 'entry': lambda file_path: None, 'progress': results.append,
+        'workers': 1, 'readers': 3, 'writers': 1, 'queue_size': 2})
+    run.start()
+    run.join(timeout=60)
+
+    # The readers blocked on the full read queue are released
+    assert not run.is_alive()
+    assert sorted(result['file'] for result in results) == files
+    assert all(result['status'] == 'failed' for result in results)
+    assert all('BrokenProcessPool' in result['error'] for result in results)
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from config import months
+from plot_histogram import HistogramRenderer, monthly_means_stds
+
+
+def test_renderer_keeps_the_session_backend():
+    # Importing the module and rendering headless leaves the backend chosen
+    # by the session (here the svg backend) as it was
+    code = ("import matplotlib, plot_histogram; plot_histogram.get_renderer(); "
+            "print(matplotlib.get_backend())")
+    folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=folder, check=True,
+                            capture_output=True, text=True,
+                            env={**os.environ, 'MPLBACKEND': 'svg'}).stdout
+    assert output.strip() == 'svg'
+
+
+def test_renderer_writes_the_histogram(tmp_path):
+    table = pd.DataFrame(np.arange(36, dtype=float).reshape(3, 12), columns=months)
+    table.insert(0, 'Year', [2000, 2001, 2002])
+    means, stds = monthly_means_stds(table)
+    renderer = HistogramRenderer()
+    output_path = tmp_path / 'histograma.png'
+    renderer.render(means, stds, 'EL PARAISO', 'mm', str(output_path))
+    assert output_path.read_bytes()[:8] == b'\x89PNG\r\n\x1a\n'
+    assert [bar.get_height() for bar in renderer.bars.patches] == list(means)
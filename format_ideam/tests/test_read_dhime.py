@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+from config import dhime_columns, variable_aggregation
+from format_data import monthly_table
+from read_dhime import ingest_dhime_csv, main
+from store import write_table, read_table, table_path
+
+
+def dhime_export(path, seed=0):
+    """Small DHIME export: two stations, three variables, daily records over three years."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for station in ['52010010', '52010020']:
+        for variable in ['PRECIPITACION', 'TEMPERATURA', 'DIR VIENTO']:
+            dates = pd.date_range('2001-03-01', '2003-11-30', freq='D')
+            values = rng.uniform(0, 359, len(dates)).round(2)
+            values[rng.random(len(dates)) < 0.1] = np.nan
+            frames.append(pd.DataFrame({
+                dhime_columns['station']: station,
+                dhime_columns['variable']: variable,
+                dhime_columns['date']: dates.strftime('%Y-%m-%d %H:%M'),
+                dhime_columns['value']: values,
+                'NombreEstacion': 'ignored',
+            }))
+    # Records of the series interleaved, as in the exports
+    records = pd.concat(frames).sample(frac=1, random_state=seed)
+    records.to_csv(path, index=False)
+    return records
+
+
+@pytest.mark.parametrize('chunksize', [37, 100000])
+def test_ingest_matches_monthly_table(tmp_path, chunksize):
+    path = tmp_path / 'dhime.csv'
+    records = dhime_export(path)
+    tables = ingest_dhime_csv(path, chunksize=chunksize)
+
+    assert len(tables) == 6
+    for (station, variable), table in tables.items():
+        series = records[(records[dhime_columns['station']] == station)
+                         & (records[dhime_columns['variable']] == variable)]
+        expected = monthly_table(series[[dhime_columns['date'], dhime_columns['value']]],
+                                 variable_aggregation.get(variable, 'sum'))
+        pd.testing.assert_frame_equal(table.reset_index(drop=True), expected, check_dtype=False,
+                                      rtol=1e-9, atol=1e-9)
+
+
+def test_cli_writes_the_station_tables(tmp_path, monkeypatch):
+    import cli
+
+    monkeypatch.setattr(utils, 'project_dir', lambda: str(tmp_path))
+    path = tmp_path / 'dhime.csv'
+    dhime_export(path)
+
+    args = cli.build_parser().parse_args(['dhime', str(path), '--chunksize', '500'])
+    assert args.run is cli.dhime
+    output_files = main(args.file_path, args.chunksize)
+
+    assert len(output_files) == 6
+    assert all(os.path.exists(output_file) for output_file in output_files)
+    assert all(output_file.startswith(str(tmp_path)) for output_file in output_files)
+
+
+def test_dhime_table_keeps_the_workbook_outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'project_dir', lambda: str(tmp_path))
+    path = tmp_path / 'dhime.csv'
+    dhime_export(path)
+    output_dir = utils.variable_directory('52010010', 'PRECIPITACION')
+    workbook_raw = pd.DataFrame({'Year': [1990], 'Jan': [1.0]})
+    with utils.staged_station_directory('52010010', 'PRECIPITACION') as staging_dir:
+        write_table(workbook_raw, staging_dir, 'PRECIPITACION', 'raw')
+        with open(os.path.join(staging_dir, 'manifest.json'), 'w') as f:
+            f.write('{}')
+
+    main(path, chunksize=1000)
+
+    pd.testing.assert_frame_equal(read_table(output_dir, 'PRECIPITACION', 'raw'), workbook_raw)
+    assert os.path.exists(os.path.join(output_dir, 'manifest.json'))
+    assert os.path.exists(table_path(output_dir, 'PRECIPITACION', 'dhime'))
+
+    # A workbook processed again keeps the DHIME table
+    from store import kept_files
+    with utils.staged_station_directory('52010010', 'PRECIPITACION', kept_files('PRECIPITACION')) as staging_dir:
+        write_table(workbook_raw, staging_dir, 'PRECIPITACION', 'raw')
+    assert sorted(os.listdir(output_dir)) == sorted(
+        os.path.basename(table_path(output_dir, 'PRECIPITACION', stage)) for stage in ['raw', 'dhime'])
@@ -0,0 +1,66 @@
+import re
+import zipfile
+from datetime import datetime, timedelta
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from read_xks import header_row, read_xks_excel, read_xks_excel_streaming
+from synthetic_data import write_synthetic_workbook
+
+
+def set_dimension(path, ref):
+    """Rewrites the <dimension> tag of the sheet (removed when `ref` is None)."""
+    with zipfile.ZipFile(path) as source:
+        parts = {name: source.read(name) for name in source.namelist()}
+    sheet = 'xl/worksheets/sheet1.xml'
+    tag = b'' if ref is None else f'<dimension ref="{ref}"/>'.encode()
+    parts[sheet] = re.sub(rb'<dimension ref="[^"]*"/>', tag, parts[sheet])
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for name, data in parts.items():
+            target.writestr(name, data)
+
+
+@pytest.mark.parametrize('variable', ['PRECIPITACION', 'TEMPERATURA'])
+@pytest.mark.parametrize('chunk_rows', [100, 50000])
+def test_streaming_matches_legacy(tmp_path, variable, chunk_rows):
+    path = write_synthetic_workbook(str(tmp_path / 'station.xlsx'), 2, variable=variable, seed=4)
+    legacy, legacy_info = read_xks_excel(path)
+    df, info = read_xks_excel_streaming(path, chunk_rows=chunk_rows)
+
+    assert info == legacy_info
+    pd.testing.assert_frame_equal(df, legacy)
+
+
+@pytest.mark.parametrize('ref', [None, 'A1'])
+def test_streaming_ignores_wrong_dimension(tmp_path, ref):
+    path = write_synthetic_workbook(str(tmp_path / 'station.xlsx'), 2, seed=1)
+    legacy, legacy_info = read_xks_excel(path)
+    set_dimension(path, ref)
+    df, info = read_xks_excel_streaming(path, chunk_rows=100)
+
+    assert info == legacy_info
+    pd.testing.assert_frame_equal(df, legacy)
+
+
+def test_streaming_widens_on_longer_rows(tmp_path):
+    # A value past the last header in a late row adds a column without header
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws['B2'] = 'ESTACION'
+    for col, name in zip([1, 3, 5, 7], ['Fecha', 'Valor', 'Grado', 'Calificador']):
+        ws.cell(row=header_row, column=col, value=name)
+    for i in range(250):
+        ws.cell(row=header_row + 1 + i, column=1, value=datetime(2000, 1, 1) + timedelta(days=i))
+        ws.cell(row=header_row + 1 + i, column=3, value=float(i))
+    ws.cell(row=header_row + 240, column=9, value=7.5)
+    path = str(tmp_path / 'station.xlsx')
+    wb.save(path)
+
+    df, _ = read_xks_excel_streaming(path, chunk_rows=100)
+    assert list(df.columns) == ['Fecha', 'Valor', 'Grado', 'Calificador', None, None]
+    assert len(df) == 250
+    assert df['Valor'].tolist() == [float(i) for i in range(250)]
+    extra = df.iloc[:, -1]
+    assert extra.iloc[239] == 7.5 and extra.drop(extra.index[239]).isna().all()
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from streamflow import lyne_hollick, eckhardt, _interpolate
+
+
+def reference_lyne_hollick(q, alpha, passes):
+    """One station, one day at a time, the quickflow kept between 0 and Q."""
+    base = list(q)
+    for i in range(passes):
+        x = base if i % 2 == 0 else base[::-1]
+        quick, out = 0.0, [x[0]]
+        for t in range(1, len(x)):
+            quick = alpha * quick + (1 + alpha) / 2 * (x[t] - x[t - 1])
+            quick = min(max(quick, 0.0), x[t])
+            out.append(x[t] - quick)
+        base = out if i % 2 == 0 else out[::-1]
+    return np.array(base)
+
+
+def reference_eckhardt(q, alpha, bfi_max):
+    b = [q[0]]
+    for t in range(1, len(q)):
+        value = ((1 - bfi_max) * alpha * b[-1] + (1 - alpha) * bfi_max * q[t]) / (1 - alpha * bfi_max)
+        b.append(min(max(value, 0.0), q[t]))
+    return np.array(b)
+
+
+@pytest.fixture
+def flows():
+    rng = np.random.default_rng(5)
+    n_days = 400
+    rain = rng.gamma(0.3, 20.0, (4, n_days)) * (rng.random((4, n_days)) < 0.2)
+    q = np.empty((4, n_days))
+    q[:, 0] = 5.0
+    for t in range(1, n_days):
+        q[:, t] = 0.9 * q[:, t - 1] + rain[:, t]
+    q[1, 50:70] = np.nan  # a gap
+    q[2, :30] = np.nan  # starts late
+    q[3] = np.nan  # no data
+    return q
+
+
+@pytest.mark.parametrize('passes', [1, 3])
+def test_lyne_hollick_matches_reference(flows, passes):
+    baseflow = lyne_hollick(flows, alpha=0.925, passes=passes)
+    filled = _interpolate(flows)
+    for row in range(3):
+        expected = reference_lyne_hollick(filled[row], 0.925, passes)
+        expected[np.isnan(flows[row])] = np.nan
+        np.testing.assert_allclose(baseflow[row], expected, rtol=1e-12, equal_nan=True)
+    assert np.isnan(baseflow[3]).all()
+    valid = ~np.isnan(flows)
+    assert (baseflow[valid] >= 0).all() and (baseflow[valid] <= flows[valid] + 1e-12).all()
+
+
+def test_eckhardt_matches_reference(flows):
+    baseflow = eckhardt(flows, alpha=0.98, bfi_max=0.8)
+    filled = _interpolate(flows)
+    for row in range(3):
+        expected = reference_eckhardt(filled[row], 0.98, 0.8)
+        expected[np.isnan(flows[row])] = np.nan
+        np.testing.assert_allclose(baseflow[row], expected, rtol=1e-12, equal_nan=True)
+    assert baseflow[0, 0] == flows[0, 0]
+
+
+def test_one_station_as_a_row(flows):
+    np.testing.assert_array_equal(lyne_hollick(flows[0])[0], lyne_hollick(flows)[0])
+    np.testing.assert_array_equal(eckhardt(flows[1])[0], eckhardt(flows)[1])
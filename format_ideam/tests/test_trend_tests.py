@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from trend_tests import mann_kendall_sen, pettitt, snht_statistic, series_trend_tests
+
+
+def reference_mann_kendall(x, years):
+    """Mann-Kendall and Sen's slope of one series with plain loops."""
+    from scipy.special import ndtr
+
+    observed = ~np.isnan(x)
+    x, years = x[observed], np.asarray(years, dtype=float)[observed]
+    n = len(x)
+    s = sum(np.sign(x[j] - x[i]) for i in range(n) for j in range(i + 1, n))
+    _, t = np.unique(x, return_counts=True)
+    var_s = (n * (n - 1) * (2 * n + 5) - np.sum(t * (t - 1) * (2 * t + 5))) / 18
+    z = (s - np.sign(s)) / np.sqrt(var_s) if var_s > 0 else 0.0
+    slopes = [(x[j] - x[i]) / (years[j] - years[i]) for i in range(n) for j in range(i + 1, n)]
+    slope = np.median(slopes)
+    return {'s': s, 'var_s': var_s, 'z': z, 'p': 2 * ndtr(-abs(z)), 'tau': s / (n * (n - 1) / 2),
+            'slope': slope, 'intercept': np.median(x - slope * years)}
+
+
+def reference_pettitt(x):
+    """Pettitt K, change position (index in x) and p with the sign sums."""
+    observed = np.flatnonzero(~np.isnan(x))
+    values = x[observed]
+    n = len(values)
+    u = [sum(np.sign(values[i] - values[j]) for i in range(t + 1) for j in range(t + 1, n))
+         for t in range(n - 1)]
+    t = int(np.argmax(np.abs(u)))
+    k = abs(u[t])
+    return k, observed[t], min(1.0, 2 * np.exp(-6 * k ** 2 / (n ** 3 + n ** 2)))
+
+
+def reference_snht(x):
+    observed = np.flatnonzero(~np.isnan(x))
+    values = x[observed]
+    n = len(values)
+    z = (values - values.mean()) / values.std(ddof=1)
+    t = [(k + 1) * z[:k + 1].mean() ** 2 + (n - k - 1) * z[k + 1:].mean() ** 2 for k in range(n - 1)]
+    return max(t), observed[int(np.argmax(t))]
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(3)
+    years = np.arange(1981, 2021)
+    x = np.round(rng.normal(0, 1, (6, len(years))) + np.linspace(0, 1.5, len(years)), 1)  # ties
+    x[1, 20:] += 3  # a change point
+    x[2, rng.random(len(years)) < 0.3] = np.nan  # gaps
+    x[3] = np.round(x[3])  # many ties
+    return x, years
+
+
+def test_mann_kendall_sen_match_reference(series):
+    x, years = series
+    result = mann_kendall_sen(x, years)
+    for row in range(len(x)):
+        expected = reference_mann_kendall(x[row], years)
+        for name, value in expected.items():
+            assert result[name][row] == pytest.approx(value, rel=1e-9, abs=1e-12), (row, name)
+
+
+def test_sen_slope_matches_scipy(series):
+    from scipy.stats import theilslopes
+
+    x, years = series
+    result = mann_kendall_sen(x[:1], years)
+    assert result['slope'][0] == pytest.approx(theilslopes(x[0], years)[0])
+
+
+def test_pettitt_and_snht_match_reference(series):
+    x, years = series
+    change = pettitt(x)
+    t0, position = snht_statistic(x)
+    for row in range(len(x)):
+        k, at, p = reference_pettitt(x[row])
+        assert change['k'][row] == pytest.approx(k)
+        assert change['position'][row] == at
+        assert change['p'][row] == pytest.approx(p)
+        expected_t0, expected_at = reference_snht(x[row])
+        assert t0[row] == pytest.approx(expected_t0)
+        assert position[row] == expected_at
+    # The shifted series breaks after its 20th year
+    assert years[change['position'][1]] == 2000
+
+
+def test_short_series_are_nan():
+    years = np.arange(2000, 2005)
+    x = np.array([[1.0, 2.0, np.nan, np.nan, np.nan],
+                  [np.nan] * 5,
+                  [1.0, 3.0, 2.0, 5.0, 4.0]])
+    mk = mann_kendall_sen(x, years)
+    assert np.isnan(mk['tau'][:2]).all() and np.isnan(mk['s'][:2]).all() and np.isnan(mk['p'][:2]).all()
+    assert mk['tau'][2] == pytest.approx(0.6)
+
+    table = series_trend_tests(x, years, min_years=3)
+    assert list(table['trend'][:2]) == ['insufficient data'] * 2
+    assert table['kendall_tau'][:2].isna().all()
+    assert table['homogeneous'][:2].isna().all()
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import utils
+
+
+@pytest.fixture
+def published(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'project_dir', lambda: str(tmp_path))
+    with utils.staged_station_directory('station', 'VAR') as staging_dir:
+        with open(os.path.join(staging_dir, 'old.txt'), 'w') as f:
+            f.write('old')
+    return utils.variable_directory('station', 'VAR')
+
+
+def test_publish_swaps_the_folder(published):
+    with utils.staged_station_directory('station', 'VAR') as staging_dir:
+        with open(os.path.join(staging_dir, 'new.txt'), 'w') as f:
+            f.write('new')
+    assert os.listdir(published) == ['new.txt']
+    assert os.listdir(os.path.dirname(staging_dir)) == []
+
+
+def test_publish_gives_up_and_restores(published, monkeypatch):
+    rename = os.rename
+    calls = []
+
+    def failing_rename(source, target):
+        if target == published and '.old' not in source:
+            calls.append(source)
+            raise OSError('busy')
+        return rename(source, target)
+
+    monkeypatch.setattr(os, 'rename', failing_rename)
+    with pytest.raises(OSError, match='busy'):
+        with utils.staged_station_directory('station', 'VAR') as staging_dir:
+            with open(os.path.join(staging_dir, 'new.txt'), 'w') as f:
+                f.write('new')
+    assert len(calls) == 10
+    # The previous outputs are back and nothing is left in the staging area
+    assert os.listdir(published) == ['old.txt']
+    assert os.listdir(os.path.dirname(staging_dir)) == []
+
+
+def test_keep_outputs(published):
+    with utils.staged_station_directory('station', 'VAR', keep_outputs=True) as staging_dir:
+        with open(os.path.join(staging_dir, 'new.txt'), 'w') as f:
+            f.write('new')
+    assert sorted(os.listdir(published)) == ['new.txt', 'old.txt']
+
+    with utils.staged_station_directory('station', 'VAR', keep_outputs=['new.txt']):
+        pass
+    assert os.listdir(published) == ['new.txt']
+
+
+def test_kept_outputs_are_copies(published):
+    with utils.staged_station_directory('station', 'VAR', keep_outputs=True) as staging_dir:
+        with open(os.path.join(staging_dir, 'old.txt'), 'w') as f:
+            f.write('rewritten')
+        with open(os.path.join(published, 'old.txt')) as f:
+            assert f.read() == 'old'
+    with open(os.path.join(published, 'old.txt')) as f:
+        assert f.read() == 'rewritten'
@@ -0,0 +1,101 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+from config import months, wind_direction_variable, wind_speed_variable, wind_speed_bins
+from format_data import monthly_aggregate
+from compute_stats import stats_table
+from clean_data import clean_tables
+from store import write_table, table_path, read_table
+from wind import direction_sectors, wind_rose, export_wind_roses
+
+
+@pytest.fixture
+def hourly():
+    rng = np.random.default_rng(1)
+    dates = pd.date_range('2001-01-01', '2003-12-31 23:00', freq='h')
+    # Around north, so a linear mean would give ~180
+    directions = (rng.normal(0, 30, len(dates)) % 360).round(1)
+    directions[rng.random(len(dates)) < 0.1] = np.nan
+    speeds = rng.gamma(2.0, 2.0, len(dates)).round(1)
+    speeds[rng.random(len(dates)) < 0.1] = np.nan
+    return dates, directions, speeds
+
+
+def test_circular_mean_matches_brute_force(hourly):
+    dates, directions, _ = hourly
+    years, table = monthly_aggregate(dates.to_numpy(), directions, 'circular_mean')
+    series = pd.Series(directions, index=dates).dropna()
+    expected = series.groupby([series.index.year, series.index.month]).apply(
+        lambda x: np.degrees(np.arctan2(np.sin(np.radians(x)).sum(), np.cos(np.radians(x)).sum())) % 360)
+    difference = (table - expected.unstack().to_numpy() + 180) % 360 - 180
+    assert np.abs(difference).max() < 1e-9
+    assert ((table < 30) | (table > 330)).all()
+
+
+def test_daily_mean_matches_brute_force(hourly):
+    dates, _, speeds = hourly
+    years, table = monthly_aggregate(dates.to_numpy(), speeds, 'daily_mean')
+    series = pd.Series(speeds, index=dates).dropna()
+    daily = series.groupby(series.index.normalize()).sum()
+    expected = daily.groupby([daily.index.year, daily.index.month]).mean().unstack().to_numpy()
+    np.testing.assert_allclose(table, expected, rtol=1e-12)
+
+
+def test_directions_skip_the_linear_stages(hourly):
+    dates, directions, _ = hourly
+    years, table = monthly_aggregate(dates.to_numpy(), directions, 'circular_mean')
+    raw = pd.DataFrame(table, columns=months)
+    raw.insert(0, 'Year', years)
+    raw.loc[0, 'Jan'] = 180.0  # an outlier on a linear scale
+
+    _, cleaned, outliers = clean_tables(raw, wind_direction_variable)
+    assert outliers.empty
+    pd.testing.assert_frame_equal(cleaned, raw)
+
+    stats = stats_table(cleaned, wind_direction_variable).set_index('Stat')
+    assert list(stats.index) == ['mean', 'std', 'resultant_length', 'count']
+    for i, month in enumerate(months):
+        radians = np.radians(table[:, i] if i else raw['Jan'].to_numpy())
+        resultant = np.hypot(np.sin(radians).mean(), np.cos(radians).mean())
+        assert stats.loc['resultant_length', month] == pytest.approx(resultant)
+        assert stats.loc['std', month] == pytest.approx(np.degrees(np.sqrt(-2 * np.log(resultant))))
+    assert ((stats.loc['mean'] < 30) | (stats.loc['mean'] > 330)).all()
+
+
+def test_wind_rose_is_published_with_the_direction(hourly, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'project_dir', lambda: str(tmp_path))
+    dates, directions, speeds = hourly
+    for variable, values in [(wind_direction_variable, directions), (wind_speed_variable, speeds[::2])]:
+        with utils.staged_station_directory('S1', variable) as staging_dir:
+            records = pd.DataFrame({'Date': dates[::2] if variable == wind_speed_variable else dates,
+                                    'value': values})
+            write_table(records, staging_dir, variable, 'records')
+            with open(os.path.join(staging_dir, f"{variable}_manifest.json"), 'w') as f:
+                json.dump({'outputs': []}, f)
+
+    results = [{'station': 'S1', 'variable': wind_speed_variable, 'status': 'ok', 'rebuilt': 'all'},
+               {'station': 'S2', 'variable': wind_speed_variable, 'status': 'ok', 'rebuilt': 'all'}]
+    assert len(export_wind_roses(results)) == 1
+
+    output_dir = utils.variable_directory('S1', wind_direction_variable)
+    rose = read_table(output_dir, wind_direction_variable, 'wind_rose')
+    with open(os.path.join(output_dir, f"{wind_direction_variable}_manifest.json")) as f:
+        assert json.load(f)['outputs'] == [os.path.basename(table_path(output_dir, wind_direction_variable, 'wind_rose'))]
+    assert os.path.exists(table_path(output_dir, wind_direction_variable, 'records'))
+
+    # Brute force: every other hour has both records
+    paired = ~np.isnan(directions[::2]) & ~np.isnan(speeds[::2])
+    sector = direction_sectors(directions[::2][paired])
+    speed_bin = np.digitize(speeds[::2][paired], wind_speed_bins)
+    expected = np.zeros((16, len(wind_speed_bins)), dtype=int)
+    for s, b in zip(sector, speed_bin):
+        if b > 0:
+            expected[s, b - 1] += 1
+    assert rose['count'].iloc[0] == (speed_bin == 0).sum()
+    np.testing.assert_array_equal(rose['count'].to_numpy()[1:].reshape(expected.shape), expected)
+    assert rose['frequency'].sum() == pytest.approx(1)
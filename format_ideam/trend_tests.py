@@ -0,0 +1,251 @@
+"""
+Trend and homogeneity tests of all the station series at once.
+
+Each row of the input matrix is one series (a station month, or its annual
+values) over the same years, NaN when missing:
+    * Mann-Kendall S, exact variance with ties, Z, p and Kendall tau
+    * Sen's slope and intercept
+    * Pettitt change point (rank form, approximate p)
+    * SNHT (Alexandersson) change point, p from Monte Carlo simulation
+
+Every statistic is computed on the whole matrix (pairwise arrays over
+blocks of series to bound the memory), with no loop over the series.
+Missing years are skipped: tests use the observed values in time order.
+Directions (circular_mean variables) are not tested: the tests assume a
+linear scale, where 350 and 10 degrees are far apart.
+"""
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from config import *
+
+# Pairwise differences kept in memory at once (series x pairs)
+pair_block_size = 4000000
+
+
+def _tie_sums(x):
+    """Sum of t(t-1)(2t+5) over the groups of tied values of every row."""
+    n_rows, n_cols = x.shape
+    ordered = np.sort(x, axis=1)  # NaN last
+    valid = ~np.isnan(ordered)
+    new_group = np.ones_like(valid)
+    new_group[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    # Group ids of row r are in [r * n_cols, (r + 1) * n_cols)
+    group = np.cumsum(new_group, axis=1) - 1 + np.arange(n_rows)[:, None] * n_cols
+    t = np.bincount(group[valid], minlength=n_rows * n_cols).astype(float)
+    rows = np.arange(t.size) // n_cols
+    return np.bincount(rows, weights=t * (t - 1) * (2 * t + 5), minlength=n_rows)
+
+
+def mann_kendall_sen(x, years):
+    """
+    Mann-Kendall test and Sen's slope of every row of `x`.
+
+    Parameters:
+        x (np.ndarray): (n_series, n_years) values, NaN when missing.
+        years (np.ndarray): Year of each column.
+
+    Returns:
+        dict: n, s, var_s, z, p, tau, slope and intercept arrays (n_series).
+    """
+    from scipy.special import ndtr
+
+    n_series, n_years = x.shape
+    years = np.asarray(years, dtype=float)
+    i, j = np.triu_indices(n_years, 1)
+    s = np.zeros(n_series)
+    slope = np.full(n_series, np.nan)
+    block = max(1, pair_block_size // max(len(i), 1))
+    for start in range(0, n_series, block):
+        rows = slice(start, start + block)
+        diff = x[rows][:, j] - x[rows][:, i]
+        s[rows] = np.nansum(np.sign(diff), axis=1)
+        with np.errstate(all='ignore'):
+            pair_slopes = diff / (years[j] - years[i])
+        if pair_slopes.shape[1]:
+            has_pairs = ~np.isnan(pair_slopes).all(axis=1)
+            slope[rows][has_pairs] = np.nanmedian(pair_slopes[has_pairs], axis=1)
+
+    n = (~np.isnan(x)).sum(axis=1).astype(float)
+    var_s = (n * (n - 1) * (2 * n + 5) - _tie_sums(x)) / 18
+    with np.errstate(all='ignore'), warnings.catch_warnings():
+        # Series without values give NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        z = np.where(var_s > 0, (s - np.sign(s)) / np.sqrt(var_s), 0.0)
+        tau = s / (n * (n - 1) / 2)
+        intercept = np.nanmedian(x - slope[:, None] * years, axis=1)
+    p = 2 * ndtr(-np.abs(z))
+    few = n < 3
+    s, var_s, z, p, tau = (np.where(few, np.nan, a) for a in (s, var_s, z, p, tau))
+    return {'n': n, 's': s, 'var_s': var_s, 'z': z, 'p': p, 'tau': tau,
+            'slope': slope, 'intercept': intercept}
+
+
+def pettitt(x):
+    """
+    Pettitt test of every row of `x` (NaN skipped).
+
+    Returns:
+        dict: k statistic, position (column index of the last value before
+        the change) and approximate p value.
+    """
+    from scipy.stats import rankdata
+
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=1, keepdims=True).astype(float)
+    ranks = rankdata(x, axis=1, nan_policy='omit')
+    count = np.cumsum(valid, axis=1)
+    u = 2 * np.cumsum(np.where(valid, ranks, 0), axis=1) - count * (n + 1)
+    u = np.where(valid & (count < n), np.abs(u), -1)
+    position = u.argmax(axis=1)
+    k = np.take_along_axis(u, position[:, None], axis=1)[:, 0]
+    n = n[:, 0]
+    with np.errstate(all='ignore'):
+        p = np.minimum(1.0, 2 * np.exp(-6 * k ** 2 / (n ** 3 + n ** 2)))
+    missing = k < 0
+    return {'k': np.where(missing, np.nan, k), 'position': np.where(missing, -1, position),
+            'p': np.where(missing, np.nan, p)}
+
+
+def snht_statistic(x):
+    """SNHT T0 statistic of every row of `x` (NaN skipped) and its column index."""
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=1, keepdims=True).astype(float)
+    with np.errstate(all='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        z = (x - np.nanmean(x, axis=1, keepdims=True)) / np.nanstd(x, axis=1, ddof=1, keepdims=True)
+    z = np.where(valid, z, 0.0)
+    count = np.cumsum(valid, axis=1)
+    cumulative = np.cumsum(z, axis=1)
+    with np.errstate(all='ignore'):
+        before = cumulative / count
+        after = (cumulative[:, -1:] - cumulative) / (n - count)
+        t = count * before ** 2 + (n - count) * after ** 2
+    t = np.where(valid & (count < n) & np.isfinite(t), t, -1)
+    position = t.argmax(axis=1)
+    t0 = np.take_along_axis(t, position[:, None], axis=1)[:, 0]
+    return np.where(t0 < 0, np.nan, t0), np.where(t0 < 0, -1, position)
+
+
+def snht(x, simulations=snht_simulations, seed=0):
+    """
+    SNHT test of every row of `x`. The p value of each series comes from
+    `simulations` normal series of its length (one simulation per length).
+    """
+    t0, position = snht_statistic(x)
+    n = (~np.isnan(x)).sum(axis=1)
+    p = np.full(len(t0), np.nan)
+    rng = np.random.default_rng(seed)
+    for length in np.unique(n[np.isfinite(t0)]):
+        simulated, _ = snht_statistic(rng.standard_normal((simulations, length)))
+        simulated.sort()
+        rows = (n == length) & np.isfinite(t0)
+        exceed = simulations - np.searchsorted(simulated, t0[rows], side='left')
+        p[rows] = (exceed + 1) / (simulations + 1)
+    return {'t0': t0, 'position': position, 'p': p}
+
+
+def series_trend_tests(x, years, min_years=trend_min_years, alpha=trend_alpha):
+    """
+    All the tests of every row of `x` as one table (one row per series).
+    Series with fewer than `min_years` values get NaN results.
+    """
+    years = np.asarray(years)
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=1)
+    short = n < min_years
+    tested = np.where(short[:, None], np.nan, x)
+
+    mk = mann_kendall_sen(tested, years)
+    change = pettitt(tested)
+    homogeneity = snht(tested)
+
+    first = np.where(valid.any(axis=1), years[valid.argmax(axis=1)], -1)
+    last = np.where(valid.any(axis=1), years[len(years) - 1 - valid[:, ::-1].argmax(axis=1)], -1)
+
+    def change_year(position):
+        return np.where(position >= 0, years[np.maximum(position, 0)], -1)
+
+    trend = np.where(mk['p'] < alpha, np.where(mk['s'] > 0, 'increasing', 'decreasing'), 'no trend')
+    table = pd.DataFrame({
+        'n': n,
+        'first_year': first,
+        'last_year': last,
+        'mk_s': mk['s'],
+        'mk_var_s': mk['var_s'],
+        'mk_z': mk['z'],
+        'mk_p': mk['p'],
+        'kendall_tau': mk['tau'],
+        'trend': np.where(short, 'insufficient data', trend),
+        'sen_slope': mk['slope'],
+        'sen_intercept': mk['intercept'],
+        'pettitt_k': change['k'],
+        'pettitt_year': change_year(change['position']),
+        'pettitt_p': change['p'],
+        'snht_t0': homogeneity['t0'],
+        'snht_year': change_year(homogeneity['position']),
+        'snht_p': homogeneity['p'],
+    })
+    homogeneous = (table['pettitt_p'] >= alpha) & (table['snht_p'] >= alpha)
+    table['homogeneous'] = homogeneous.astype('boolean').mask(short)
+    return table
+
+
+def cube_series(values, variable):
+    """
+    (n_stations, years, 12) cube values as a (n_stations * 13, years) matrix:
+    the 12 months of each station and its annual value (sum or mean of the
+    12 months following config.variable_aggregation, NaN if a month is missing).
+    """
+    how = variable_aggregation.get(variable, 'sum')
+    aggregate = {'mean': np.mean, 'daily_mean': np.mean, 'min': np.min, 'max': np.max}.get(how, np.sum)
+    annual = aggregate(values, axis=2)
+    series = np.concatenate([values.transpose(0, 2, 1), annual[:, None, :]], axis=1)
+    return series.reshape(-1, values.shape[1])
+
+
+def trend_table(cube_dir, variables=None, start_year=None, end_year=None):
+    """
+    Runs every test on the months and the annual series of each station of
+    `variables` (default: all) in the data cube.
+
+    Returns:
+        pd.DataFrame: station, variable, series and the test results.
+    """
+    from data_cube import StationCube
+
+    cube = StationCube(cube_dir)
+    if variables is None:
+        variables = cube.stations()['variable'].unique()
+    tables = []
+    for variable in sorted(variables):
+        if variable_aggregation.get(variable) == 'circular_mean':
+            print(f"{variable}: directions are not tested for trends")
+            continue
+        index, years, values = cube.query(variable=variable, start_year=start_year, end_year=end_year)
+        if index.empty:
+            continue
+        table = series_trend_tests(cube_series(values, variable), years)
+        names = months + ['Annual']
+        table.insert(0, 'series', np.tile(names, len(index)))
+        table.insert(0, 'variable', variable)
+        table.insert(0, 'station', np.repeat(index['station'].to_numpy(), len(names)))
+        tables.append(table)
+        print(f"{variable}: tests of {len(table)} series of {len(index)} stations")
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+
+def export_trend_tests(cube_dir, output_dir, variables=None):
+    """Writes trend_table of the cube as one table (and workbook with export_excel)."""
+    from store import write_frame, table_extension
+
+    table = trend_table(cube_dir, variables)
+    output_file = write_frame(table, os.path.join(output_dir, f"{trend_tests_file}.{table_extension()}"))
+    if export_excel:
+        table.to_excel(os.path.join(output_dir, f"{trend_tests_file}.xlsx"), index=False, engine=excel_engine)
+    print(f"Trend and homogeneity tests saved to: {output_file}")
+    return output_file
@@ -1,14 +1,145 @@
 import os
-from config import *
+import re
 import shutil
+import tempfile
+from contextlib import contextmanager
+
+from config import *
+
+
+def project_dir():
+    # Folder that holds the code folder, the input and the results folders
+    return os.path.dirname(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
+
+
+def station_directory(station_name):
+    return os.path.join(project_dir(), output_stations, station_name)
+
+
+def variable_directory(station_name, variable):
+    """Folder with the outputs of one station variable: <station>/<variable>/."""
+    return os.path.join(station_directory(station_name), variable)
+
+
+def staging_directory(station_name, variable):
+    """New empty folder, unique to this process, to build the outputs of a station variable."""
+    staging_root = os.path.join(project_dir(), output_stations, staging_folder)
+    os.makedirs(staging_root, exist_ok=True)
+    prefix = re.sub(r'[^\w.-]+', '_', f"{station_name}__{variable}") + "__"
+    return tempfile.mkdtemp(prefix=prefix, dir=staging_root)
+
+
+def publish_directory(staging_dir, station_name, variable, attempts=10):
+    """
+    Swaps a complete staging folder into <station>/<variable>/.
+
+    Each swap is two renames on the same disk (the published folder to a
+    trash name, the staging folder to the published name), so the folder
+    always holds the complete outputs of one run, never half-written tables
+    or files of two runs. Between the two renames <variable>/ is missing for
+    a moment: a reader that does not find it (or its manifest) should look
+    again instead of taking the variable as never processed. Other variables
+    of the station are in their own folders and are never touched: writers
+    of different variables need no lock. If two writers publish the same
+    variable at once, the last one wins.
+
+    Parameters:
+        staging_dir (str): Folder with the complete outputs.
+        station_name (str): Station of the outputs.
+        variable (str): Variable of the outputs.
+        attempts (int): Swaps tried when another writer publishes in between;
+            the last error is raised after them, with the previous outputs
+            put back in place when possible.
+
+    Returns:
+        str: The published folder.
+    """
+    output_dir = variable_directory(station_name, variable)
+    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+    trash = []
+    try:
+        for attempt in range(attempts):
+            if os.path.exists(output_dir):
+                trash.append(f"{staging_dir}.old{len(trash)}")
+                try:
+                    os.rename(output_dir, trash[-1])
+                except FileNotFoundError:
+                    # Another writer moved it first
+                    trash.pop()
+                    continue
+            try:
+                os.rename(staging_dir, output_dir)
+                return output_dir
+            except OSError:
+                # Another writer published in between: try again
+                if not os.path.isdir(staging_dir) or attempt == attempts - 1:
+                    _restore(trash, output_dir)
+                    raise
+        raise OSError(f"Could not publish {staging_dir} to {output_dir} in {attempts} attempts")
+    finally:
+        for old_dir in trash:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _restore(trash, output_dir):
+    """Puts the last published folder back when a swap failed (best effort)."""
+    if trash and not os.path.exists(output_dir):
+        try:
+            os.rename(trash[-1], output_dir)
+            trash.pop()
+        except OSError:
+            pass
+
+
+def _copy_forward(output_dir, staging_dir, names=None):
+    """
+    Files of the published folder (only `names` when given) copied into the
+    staging folder. Copies, not hard links: the writer may rewrite them in
+    place and the published files must not change before the swap.
+    """
+    if not os.path.isdir(output_dir):
+        return
+    for name in os.listdir(output_dir):
+        source = os.path.join(output_dir, name)
+        if names is not None and name not in names or not os.path.isfile(source):
+            continue
+        shutil.copy2(source, os.path.join(staging_dir, name))
+
+
+@contextmanager
+def staged_station_directory(station_name, variable, keep_outputs=False):
+    """
+    Staging folder of a station variable, published when the block ends
+    without errors and deleted otherwise.
+
+    Parameters:
+        keep_outputs (bool or list): Start the staging folder with the files
+            already published (True) or with the listed file names, for
+            writers that add or replace only some tables.
+
+    Example:
+        with staged_station_directory(station, variable) as output_dir:
+            write_table(df, output_dir, variable, 'raw')
+    """
+    staging_dir = staging_directory(station_name, variable)
+    try:
+        if keep_outputs:
+            names = None if keep_outputs is True else set(keep_outputs)
+            _copy_forward(variable_directory(station_name, variable), staging_dir, names)
+        yield staging_dir
+        publish_directory(staging_dir, station_name, variable)
+    finally:
+        # Already gone when published (renamed into place)
+        shutil.rmtree(staging_dir, ignore_errors=True)
 
 
-def manage_station_directory(station_name):
-    current_file_parent_dir = os.path.dirname(os.path.dirname((os.path.dirname(os.path.abspath(__file__)))))
-    output_dir = os.path.join(current_file_parent_dir, output_stations, station_name)
+def manage_station_directory(station_name, clean=True):
+    output_dir = station_directory(station_name)
     #Crear subdirectory para la estación relativo!!!! por lo que se va a ejecutar en otras maquinas
     print (f"Output directory: {output_dir}")
     if os.path.exists(output_dir):
+        if not clean:
+            return output_dir
         # Remove all files and subdirectories in the output directory
         for filename in os.listdir(output_dir):
             file_path = os.path.join(output_dir, filename)
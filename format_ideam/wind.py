@@ -0,0 +1,198 @@
+"""
+Wind direction and speed kernels over (hourly) records.
+
+    * direction_sectors: sector of each direction (sector 0 centred on north)
+    * sector_frequencies: share of the records of each month in each sector
+    * wind_rose: share of the records in each sector x speed bin (calms apart)
+    * pair_records: direction and speed records of the same timestamps
+The station stage writes the direction sectors and the records of the
+direction and speed workbooks (export_wind_tables); the wind roses are built
+after the batch from those records (export_wind_roses).
+Every kernel is a bincount over integer codes of the records, so decades of
+hourly data are binned in one pass without grouping.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import *
+
+compass_names = {
+    4: ["N", "E", "S", "W"],
+    8: ["N", "NE", "E", "SE", "S", "SW", "W", "NW"],
+    16: ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+         "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"],
+}
+
+
+def sector_labels(n_sectors=wind_sectors):
+    """Compass names of the sectors (centre in degrees if there are no names)."""
+    if n_sectors in compass_names:
+        return list(compass_names[n_sectors])
+    return [f"{i * 360 / n_sectors:g}" for i in range(n_sectors)]
+
+
+def speed_labels(speed_bins=wind_speed_bins):
+    """Labels of the speed bins above calm: '0.5-2', ..., '>=10'."""
+    edges = list(speed_bins)
+    return [f"{lo:g}-{hi:g}" for lo, hi in zip(edges[:-1], edges[1:])] + [f">={edges[-1]:g}"]
+
+
+def direction_sectors(directions, n_sectors=wind_sectors):
+    """Sector index of each direction in degrees (-1 for NaN)."""
+    directions = np.asarray(directions, dtype=float)
+    width = 360 / n_sectors
+    with np.errstate(invalid='ignore'):
+        sector = np.floor((np.mod(directions, 360) + width / 2) / width) % n_sectors
+    return np.where(np.isnan(directions), -1, sector).astype(np.int64)
+
+
+def sector_frequencies(dates, directions, n_sectors=wind_sectors):
+    """
+    Share of the records of each calendar month (and of the whole record)
+    in each direction sector.
+
+    Returns:
+        pd.DataFrame: Month (Jan..Dec, Annual) and one column per sector.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    sector = direction_sectors(directions, n_sectors)
+    valid = ~np.isnat(dates) & (sector >= 0)
+    month = dates[valid].astype('datetime64[M]').astype(np.int64) % 12
+    counts = np.bincount(month * n_sectors + sector[valid], minlength=12 * n_sectors)
+    counts = counts.reshape(12, n_sectors).astype(float)
+    counts = np.vstack([counts, counts.sum(axis=0)])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = counts / counts.sum(axis=1, keepdims=True)
+    table = pd.DataFrame(shares, columns=sector_labels(n_sectors))
+    table.insert(0, 'Month', months + ['Annual'])
+    return table
+
+
+def wind_rose(directions, speeds, n_sectors=wind_sectors, speed_bins=wind_speed_bins):
+    """
+    Joint sector x speed histogram of paired direction and speed records.
+    Speeds below speed_bins[0] are calms (no direction).
+
+    Returns:
+        pd.DataFrame: sector, speed, count and frequency (share of all the
+        records with direction and speed), with one 'calm' row first.
+    """
+    speeds = np.asarray(speeds, dtype=float)
+    sector = direction_sectors(directions, n_sectors)
+    valid = (sector >= 0) & ~np.isnan(speeds)
+    sector, speeds = sector[valid], speeds[valid]
+    # 0 = calm, 1.. = the bins from speed_bins[0]
+    speed_bin = np.searchsorted(np.asarray(speed_bins, dtype=float), speeds, side='right')
+    calm = speed_bin == 0
+    n_bins = len(speed_bins)
+    counts = np.bincount(sector[~calm] * n_bins + speed_bin[~calm] - 1, minlength=n_sectors * n_bins)
+
+    total = len(speeds)
+    table = pd.DataFrame({
+        'sector': ['calm'] + list(np.repeat(sector_labels(n_sectors), n_bins)),
+        'speed': [f"<{speed_bins[0]:g}"] + speed_labels(speed_bins) * n_sectors,
+        'count': np.r_[calm.sum(), counts],
+    })
+    table['frequency'] = table['count'] / total if total else np.nan
+    return table
+
+
+def pair_records(direction_dates, directions, speed_dates, speeds):
+    """Direction and speed values of the timestamps present in both series."""
+    direction_dates = np.asarray(direction_dates, dtype='datetime64[ns]')
+    speed_dates = np.asarray(speed_dates, dtype='datetime64[ns]')
+    _, i, j = np.intersect1d(direction_dates, speed_dates, assume_unique=False, return_indices=True)
+    return np.asarray(directions, dtype=float)[i], np.asarray(speeds, dtype=float)[j]
+
+
+def workbook_records(df):
+    """Dates and values of a workbook dataframe (dates first, values second)."""
+    dates = pd.to_datetime(df.iloc[:, 0], errors='coerce').to_numpy(dtype='datetime64[ns]')
+    return dates, pd.to_numeric(df.iloc[:, 1], errors='coerce').to_numpy(dtype=float)
+
+
+def records_table(df):
+    """Date and value columns of the records of a workbook dataframe."""
+    dates, values = workbook_records(df)
+    return pd.DataFrame({'Date': dates, 'value': values})
+
+
+def export_wind_tables(df, output_dir, variable):
+    """
+    Per-station tables of a wind workbook: 'direction_sectors' of the
+    direction and, with wind_roses, the 'records' (dates and values) of the
+    direction and the speed that export_wind_roses pairs after the batch.
+    Returns the output file names.
+    """
+    from store import write_table
+
+    outputs = []
+    if variable == wind_direction_variable:
+        output_file = write_table(sector_frequencies(*workbook_records(df)), output_dir, variable, 'direction_sectors')
+        print(f"Direction sectors saved to: {output_file}")
+        outputs.append(os.path.basename(output_file))
+    if wind_roses:
+        outputs.append(os.path.basename(write_table(records_table(df), output_dir, variable, 'records')))
+    return outputs
+
+
+def station_wind_rose(station):
+    """
+    Wind rose of a station from the 'records' tables of its published
+    direction and speed folders (None if one of them is missing).
+    """
+    from utils import variable_directory
+    from store import read_table, table_path
+
+    records = []
+    for variable in (wind_direction_variable, wind_speed_variable):
+        output_dir = variable_directory(station, variable)
+        if not os.path.exists(table_path(output_dir, variable, 'records')):
+            return None
+        table = read_table(output_dir, variable, 'records')
+        records += [table['Date'].to_numpy(dtype='datetime64[ns]'), table['value'].to_numpy(dtype=float)]
+    return wind_rose(*pair_records(*records))
+
+
+def export_wind_roses(results):
+    """
+    Writes the wind rose of every station of the batch `results` whose
+    direction or speed was rebuilt, as the 'wind_rose' stage of the direction
+    folder: the folder is published again with the rose added to its
+    manifest outputs and to its workbook. The records are read from the
+    'records' tables written by the station stage, not from the workbooks.
+
+    Returns:
+        list: Written wind rose files.
+    """
+    from utils import staged_station_directory, variable_directory
+    from store import write_table, export_station_workbook
+    from manifest import read_manifest, save_manifest
+
+    stations = sorted({
+        result['station'] for result in results
+        if result['status'] == 'ok' and result.get('rebuilt') != 'none'
+        and result['variable'] in (wind_direction_variable, wind_speed_variable)
+    })
+    output_files = []
+    for station in stations:
+        try:
+            rose = station_wind_rose(station)
+            if rose is None:
+                continue
+            with staged_station_directory(station, wind_direction_variable, keep_outputs=True) as staging_dir:
+                output_file = os.path.basename(write_table(rose, staging_dir, wind_direction_variable, 'wind_rose'))
+                if export_excel:
+                    export_station_workbook(staging_dir, wind_direction_variable)
+                entry = read_manifest(staging_dir, wind_direction_variable)
+                if entry is not None and output_file not in entry['outputs']:
+                    entry['outputs'].append(output_file)
+                    save_manifest(staging_dir, wind_direction_variable, entry)
+        except Exception as e:
+            print(f"Wind rose of {station} failed: {e!r}")
+            continue
+        output_files.append(os.path.join(variable_directory(station, wind_direction_variable), output_file))
+        print(f"Wind rose saved to: {output_files[-1]}")
+    return output_files
@@ -1,10 +1,5 @@
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-
-import matplotlib.pyplot as plt
 
 
 def perform_clustering(df, n_clusters=3, random_state=42):
@@ -19,6 +14,9 @@ def perform_clustering(df, n_clusters=3, random_state=42):
     Returns:
         tuple: (fitted KMeans model, scaled data, cluster labels)
     """
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
     # Select only numerical columns
     numerical_cols = df.select_dtypes(include=[np.number]).columns
     X = df[numerical_cols].dropna()
@@ -43,6 +41,9 @@ def plot_clustering_results(X_scaled, labels, output_dir="./"):
         labels (np.ndarray): Cluster labels
         output_dir (str): Directory to save plots
     """
+    from sklearn.decomposition import PCA
+    import matplotlib.pyplot as plt
+
     # PCA for visualization
     pca = PCA(n_components=2)
     X_pca = pca.fit_transform(X_scaled)
@@ -2,36 +2,22 @@ from config import *
 import os
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from sklearn.cluster import AgglomerativeClustering
-from scipy.cluster.hierarchy import dendrogram, linkage
-from sklearn.metrics import silhouette_score
 
 
 # Ejecución de PCA
-# Inicializamos PCA con todas las variables para ver la varianza
+# Un solo ajuste con todas las variables (ver pca_stage.py): curva de varianza,
+# k, scores y cargas salen de la misma descomposición
 def run_pca(df, columns):
+    from pca_stage import fit_pca
 
-    # Drop rows with NA in the selected columns and return the filtered df
-    df_clean = df.dropna(subset=columns)
+    # fit.data: the df without NA in the selected columns
+    fit = fit_pca(df, columns)
 
-    # Estandarizar los datos
-    scaler = StandardScaler()
-    scaled_data = scaler.fit_transform(df_clean[columns])
-
-    # Ejecutar PCA
-    pca = PCA()
-    pca.fit(scaled_data)
-
-    cumulative_variance = np.cumsum(pca.explained_variance_ratio_)
-
-    return pca, scaled_data, cumulative_variance, df_clean
+    return fit, fit.cumulative_variance
 
 
 def plot_pca_results(cumulative_variance):
+    import matplotlib.pyplot as plt
 
     plt.figure(figsize=(8, 5))
     plt.plot(
@@ -45,8 +31,8 @@ def plot_pca_results(cumulative_variance):
     plt.ylabel("Varianza Acumulada (%)")
     plt.grid(True)
     # Sugerencia: Busque el punto donde la curva se "dobla" (el codo) o donde alcanza ~85-90%
-    plt.axhline(y=0.85, color="r", linestyle="-")
-    plt.text(1, 0.86, "85% Varianza", color="red")
+    plt.axhline(y=pca_variance_threshold, color="r", linestyle="-")
+    plt.text(1, pca_variance_threshold + 0.01, f"{pca_variance_threshold:.0%} Varianza", color="red")
     plt.savefig(
         os.path.join(output_plots_clustering_path, "cumulative_variance.png"),
         dpi=300,
@@ -73,27 +59,26 @@ def plot_pca_results(cumulative_variance):
     return pca_df"""
 
 
-def k_optimization(cumulative_variance, X_scaled, index=None):
-    # Determinar k: Tomamos el número de componentes que explican, por ejemplo, el 85%
-    k = np.argmax(cumulative_variance >= 0.85) + 1
+def k_optimization(fit):
+    # Determinar k: el número de componentes que explican, por ejemplo, el 85%
+    k = fit.k
     print(
-        f"\nSe seleccionan {k} Componentes Principales (PC) para explicar el 85% de la varianza."
+        f"\nSe seleccionan {k} Componentes Principales (PC) para explicar el {fit.threshold:.0%} de la varianza."
     )
 
-    # 2.4 Re-ejecutar PCA con el k óptimo
-    pca_final = PCA(n_components=k)
-    X_pca = pca_final.fit_transform(X_scaled)
-    X_pca_df = pd.DataFrame(X_pca, columns=[f"PC{i+1}" for i in range(k)])
-    # if an index (from the filtered df) is provided, assign it so labels match
-    if index is not None:
-        X_pca_df.index = index
+    # Los k primeros componentes del mismo ajuste, sin re-ejecutar PCA
+    X_pca_df = fit.scores
+    X_pca = X_pca_df.to_numpy()
     print(X_pca_df.head())
-    return pca_final, k, X_pca, X_pca_df
+    return fit.pca, k, X_pca, X_pca_df
 
 
 def loading_analysis(pca_final, columns, k):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     loadings_df = pd.DataFrame(
-        pca_final.components_.T,
+        pca_final.components_[:k].T,
         columns=[f"PC{i+1}" for i in range(k)],
         index=columns,
     )
@@ -118,6 +103,10 @@ def loading_analysis(pca_final, columns, k):
 
 
 def hierarchical_clustering(X_pca, df, X_pca_df, max_clusters=10):
+    import matplotlib.pyplot as plt
+    from sklearn.cluster import AgglomerativeClustering
+    from scipy.cluster.hierarchy import dendrogram, linkage
+
     linked = linkage(X_pca, method="ward")
 
     plt.figure(figsize=(12, 6))
@@ -161,6 +150,9 @@ def hierarchical_clustering(X_pca, df, X_pca_df, max_clusters=10):
 
 
 def zoning_validation(df, X_pca_df, pca_final, n_clusters_optimo):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # 5.1 Validación con la variable SubCuenca
     print("\n--- Validación Cruzada: Subcuenca vs. Cluster_ID ---")
     print(pd.crosstab(df["Subcuenca"], df["Cluster_ID"]))
@@ -205,11 +197,10 @@ def zoning_validation(df, X_pca_df, pca_final, n_clusters_optimo):
 
 
 def gemini_PCA(df, columns):
-    pca, scaled_data, cummulative_variance, df_clean = run_pca(df, columns)
+    fit, cummulative_variance = run_pca(df, columns)
     plot_pca_results(cummulative_variance)
-    pca_final, k, X_pca, X_pca_df = k_optimization(
-        cummulative_variance, scaled_data, index=df_clean.index
-    )
+    pca_final, k, X_pca, X_pca_df = k_optimization(fit)
     loading_analysis(pca_final, columns, k)
+    df_clean = fit.data.copy()
     n_clusters_optimo = hierarchical_clustering(X_pca, df_clean, X_pca_df)
     zoning_validation(df_clean, X_pca_df, pca_final, n_clusters_optimo)
@@ -1,12 +1,40 @@
 excel_file_path = r"C:\Code\TIP\Balance_hidrico\input\hidroquimica\TablaShape.xlsx"
 data_sheet_name = "Termales"
 output_plots_path = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\plots"
+# Parquet copies of the workbook sheets (see utils/cached_reader.py)
+excel_cache_dir = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\cache"
 output_plots_clustering_path = output_plots_path + r"\clustering"
+run_report_file = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\run_report.json"
 
 complejo_volcanico_column_name = "Complejo Volcánico "
 complejo_volcanico_name = "Azufral"
 not_null_columns = ["pH", "Temperatura (°C)"]
 
+# Append-only sample store (see sample_store.py): samples are keyed by these
+# columns (those in the sheet) and only new or changed samples get their
+# derived columns computed
+use_sample_store = True
+sample_store_dir = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\samples"
+sample_key_columns = ["Nombre", "Fecha"]
+log_transform_columns = ["Cl", "SO4", "HCO3", "Ca", "Mg", "Na", "K", "Li", "B"]
+
+# Sample subsets (see sample_table.py): groups and date of the samples
+sample_group_columns = [complejo_volcanico_column_name, "Subcuenca"]
+sample_date_column = "Fecha"
+
+# PCA (see pca_stage.py): one fit gives the scree curve, k, scores and loadings.
+# pca_solver: "full", "randomized" (first pca_max_components only, which
+# must then be set), "incremental" (batches of pca_batch_size rows) or "auto"
+# (full, incremental from pca_incremental_rows rows). pca_cache_dir=None
+# disables the cache.
+pca_solver = "auto"
+pca_variance_threshold = 0.85
+pca_max_components = None
+pca_batch_size = 10000
+pca_incremental_rows = 200000
+pca_random_state = 0
+pca_cache_dir = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\pca"
+
 spyder_variables = {
     "ID": "MUESTRA",
     "pH": "pH",
@@ -29,6 +57,11 @@ max_spyder_values = {
     "SO4": 400,
 }
 
+# Lab results below the detection limit ("<0.01") in the ionic balance:
+# "zero" (taken as 0), "half" (half the limit), "limit" (the limit) or "nan"
+# (left out of the cation and anion sums, like the not detected values)
+detection_limit_mode = "zero"
+not_detected_values = ["ND", "N.D.", "NO DETECTADO", "NO DETECTABLE"]
 
 # Molecular weights of cations and anions
 iones = {
@@ -1,6 +1,53 @@
 from config import *
+import numpy as np
 import pandas as pd
 
+cations = ["Na", "Ca", "Mg", "K"]
+anions = ["HCO3", "CO3", "Cl", "SO4"]
+
+
+def parse_concentrations(column, mode=detection_limit_mode):
+    """Parse a column of lab results (mg/L) into floats, without a per-cell loop.
+
+    Numbers and numeric strings are taken as they are, decimal commas are
+    accepted ("0,5"). Values below the detection limit ("<0.01") become 0,
+    half the limit, the limit or NaN following `mode` ("zero", "half",
+    "limit", "nan"); not detected values (config.not_detected_values, e.g.
+    "ND") are 0, or NaN with mode "nan". Values above the range (">500")
+    take the limit. A "<" without a number ("<LD") is 0, or NaN with mode
+    "nan". Missing and other non-numeric values are 0.
+    """
+    if mode not in ("zero", "half", "limit", "nan"):
+        raise ValueError(f"Unknown detection limit mode: {mode}")
+
+    column = pd.Series(column)
+    values = pd.to_numeric(column, errors="coerce").to_numpy(dtype=float)
+
+    # Only the cells that are not plain numbers go through the string parsing
+    text_rows = np.flatnonzero(np.isnan(values) & column.notna().to_numpy())
+    if len(text_rows):
+        text = column.iloc[text_rows].astype(str).str.strip().str.upper()
+        below = text.str.startswith("<").to_numpy()
+        not_detected = text.isin([value.upper() for value in not_detected_values]).to_numpy()
+        number = pd.to_numeric(
+            text.str.lstrip("<>= ").str.replace(",", ".", regex=False), errors="coerce"
+        ).to_numpy(dtype=float)
+
+        parsed = np.where(np.isnan(number), 0.0, number)
+        if mode == "zero":
+            parsed[below] = 0.0
+        elif mode == "half":
+            parsed[below] /= 2
+        elif mode == "nan":
+            parsed[below | not_detected] = np.nan
+        values[text_rows] = parsed
+
+    missing = np.isnan(values)
+    values[missing & column.isna().to_numpy()] = 0.0
+    if mode != "nan":
+        values[missing] = 0.0
+    return values
+
 
 def calculate_meq(value, molecular_weight):
     """Convert ion concentration (mg/L) to milliequivalents (meq/L).
@@ -11,59 +58,50 @@ def calculate_meq(value, molecular_weight):
     if molecular_weight is None or molecular_weight == 0:
         raise ValueError("molecular_weight must be a non-zero number")
 
-    # pandas.isna covers None and NaN
-    if pd.isna(value):
-        return 0
-
-    try:
-        val = float(value)
-    except (TypeError, ValueError):
-        return 0
-
-    if val == 0:
-        return 0
-
-    return val / molecular_weight
+    return parse_concentrations([value])[0] / molecular_weight
 
 
-def calculate_ionic_balance(df, iones):
+def calculate_ionic_balance(df, iones, mode=detection_limit_mode):
     """
     Calculate ionic balance for water samples.
 
+    All the ions are parsed (see parse_concentrations) into one samples x
+    ions matrix and converted to meq/L with one division by the weights.
+
     Parameters:
     df: DataFrame with ion concentrations (mg/L)
     iones: dict with ion names as keys and molecular weights as values
+    mode: handling of the values below the detection limit
 
     Returns:
     DataFrame with meq/L values and ionic balance percentage
     """
-    meq_df = df.copy()
+    names = list(iones)
+    weights = np.array([iones[ion] for ion in names], dtype=float)
+    if (weights == 0).any() or np.isnan(weights).any():
+        raise ValueError("molecular_weight must be a non-zero number")
 
-    # Calculate meq/L for each ion
-    for ion, mw in iones.items():
+    # Ions without a column are 0
+    mg_l = np.zeros((len(df), len(names)))
+    for j, ion in enumerate(names):
         if ion in df.columns:
-            meq_df[f"{ion}_meq"] = df[ion].apply(lambda x: calculate_meq(x, mw))
-        else:
-            meq_df[f"{ion}_meq"] = 0
-
-    # Separate cations and anions
-    cations = ["Na", "Ca", "Mg", "K"]
-    anions = ["HCO3", "CO3", "Cl", "SO4"]
-
-    # Sum meq/L
-    meq_df["sum_cations"] = meq_df[
-        [f"{ion}_meq" for ion in cations if f"{ion}_meq" in meq_df.columns]
-    ].sum(axis=1)
-    meq_df["sum_anions"] = meq_df[
-        [f"{ion}_meq" for ion in anions if f"{ion}_meq" in meq_df.columns]
-    ].sum(axis=1)
-
-    # Calculate ionic balance percentage
-    meq_df["ionic_balance"] = (
-        (meq_df["sum_cations"] - meq_df["sum_anions"])
-        / (meq_df["sum_cations"] + meq_df["sum_anions"])
-        * 100
-    )
+            mg_l[:, j] = parse_concentrations(df[ion], mode)
+    meq = mg_l / weights
+
+    def ion_sum(group):
+        columns = [j for j, ion in enumerate(names) if ion in group]
+        return np.nansum(meq[:, columns], axis=1)
+
+    sum_cations = ion_sum(cations)
+    sum_anions = ion_sum(anions)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        balance = (sum_cations - sum_anions) / (sum_cations + sum_anions) * 100
+
+    meq_df = df.copy()
+    meq_df[[f"{ion}_meq" for ion in names]] = meq
+    meq_df["sum_cations"] = sum_cations
+    meq_df["sum_anions"] = sum_anions
+    meq_df["ionic_balance"] = balance
 
     print(meq_df.head())
 
@@ -1,18 +1,10 @@
+from instrumentation import stage, write_report
 from dataframe_creator import read_excel_to_dataframe
-from plots_creator import *
 from config import *
-from cluster_creator import *
-from pca_analysis import *
-from clustering_analysis import *
-from code.hidroquimica.preprocess.ionic_balance import calculate_ionic_balance
+from ionic_balance import calculate_ionic_balance
 from preprocess_data import log_transform_data
-
-df = read_excel_to_dataframe(excel_file_path, data_sheet_name)
-df = df[df[complejo_volcanico_column_name] == complejo_volcanico_name]
-df_guaitara = df[df["Subcuenca"] == "Guaitara"]
-df_mira = df[df["Subcuenca"] == "Mira"]
-df_crater = df[df["Subcuenca"] == "Crater"]
-df_no_crater = df[df["Subcuenca"] != "Crater"]
+from sample_store import SampleStore, log_view
+from sample_table import SampleTable
 
 
 columns = [
@@ -30,30 +22,72 @@ columns = [
     # "B",
 ]
 
-log_transform_columns = ["Cl", "SO4", "HCO3", "Ca", "Mg", "Na", "K", "Li", "B"]
 
+def main(
+    file_path=excel_file_path,
+    sheet_name=data_sheet_name,
+    complejo=complejo_volcanico_name,
+    report_path=run_report_file,
+):
+    """
+    Runs the hidrochemistry workflow (read -> subset -> crossplot -> ionic
+    balance -> log transform). The plotting and PCA modules are imported by the
+    stage that uses them.
+    """
+    with stage("read"):
+        df = read_excel_to_dataframe(file_path, sheet_name)
+    if use_sample_store:
+        # Ionic balance and logs are computed for the new or changed samples only
+        with stage("sample_store"):
+            store = SampleStore()
+            # The whole sheet: samples deleted or re-keyed in it leave the store
+            store.ingest(df, remove_missing=True)
+            df = store.table()
+    with stage("subset"):
+        # Grouped once, every subset is then a lookup (see sample_table.py)
+        table = SampleTable(df)
+        in_complejo = {complejo_volcanico_column_name: complejo}
+        df = table.select(in_complejo)
+        df_guaitara = table.select({**in_complejo, "Subcuenca": "Guaitara"})
+        df_mira = table.select({**in_complejo, "Subcuenca": "Mira"})
+        df_crater = table.select({**in_complejo, "Subcuenca": "Crater"})
+        df_no_crater = table.select(in_complejo, exclude={"Subcuenca": "Crater"})
+
+    print(len(df))
 
-print(len(df))
+    """
 
+    run_pca_analysis(
+        df,
+        columns,
+        output_plots_path,
+    )
+    """
+    # kMeans, X_scaled, labels = perform_clustering(df, n_clusters=3)
+    # plot_clustering_results(X_scaled, labels, output_dir=output_plots_path)
 
-"""
+    with stage("plot"):
+        from plots_creator import create_crossplot
 
-run_pca_analysis(
-    df,
-    columns,
-    output_plots_path,
-)
-"""
-# kMeans, X_scaled, labels = perform_clustering(df, n_clusters=3)
-# plot_clustering_results(X_scaled, labels, output_dir=output_plots_path)
+        create_crossplot(df, "Cl", "SO4", "Nombre2")
+    with stage("ionic_balance"):
+        df = df_guaitara if use_sample_store else calculate_ionic_balance(df_guaitara, iones)
 
-create_crossplot(df, "Cl", "SO4", "Nombre2")
-df = calculate_ionic_balance(df_guaitara, iones)
+    with stage("log_transform"):
+        if use_sample_store:
+            df = df_log = log_view(df)
+        else:
+            df_log = log_transform_data(df, log_transform_columns)
+    # create_histograms([df_log], columns)
 
+    df_log = df[df["ionic_balance"].abs() <= 20]
+    # with stage("pca"):
+    #     from clustering_analysis import gemini_PCA
+    #     gemini_PCA(df_log, columns)
 
-df_log = log_transform_data(df, log_transform_columns)
-# create_histograms([df_log], columns)
+    write_report(report_path)
+    return df_log
 
 
-df_log = df[df["ionic_balance"].abs() <= 20]
-# gemini_PCA(df_log, columns)
+if __name__ == "__main__":
+    main()
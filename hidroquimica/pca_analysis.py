@@ -1,28 +1,21 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
 
+from pca_stage import fit_pca
 
-def perform_pca(data, columns):
-
-    data = data.dropna(subset=columns)
-    # Standardize the data
-    scaled_data = StandardScaler().fit_transform(data[columns])
 
-    # Perform PCA
-    pca = PCA()
-    principal_components = pca.fit_transform(scaled_data)
+def perform_pca(data, columns):
+    # Standardize the data and perform PCA (see pca_stage.py)
+    fit = fit_pca(data, columns)
 
     # Create a DataFrame with the principal components
-    pca_df = pd.DataFrame(
-        data=principal_components, columns=[f"PC{i+1}" for i in range(len(columns))]
-    )
-    return pca_df, pca
+    pca_df = fit.component_scores().reset_index(drop=True)
+    return pca_df, fit.pca
 
 
 def plot_pca(pca_df, pca, output_file):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(10, 7))
     plt.scatter(pca_df["PC1"], pca_df["PC2"], alpha=0.5)
     plt.title("PCA Result")
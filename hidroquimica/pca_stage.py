@@ -0,0 +1,409 @@
+"""
+PCA stage: one standardize + decompose of the selected columns.
+
+The scree curve (cumulative explained variance), the number of components
+k that reaches config.pca_variance_threshold, the scores and the loadings
+all come from the same fit:
+
+    fit = fit_pca(df, columns)
+    fit.cumulative_variance, fit.k, fit.scores, fit.loadings
+
+Solvers (config.pca_solver):
+* full: exact SVD of the whole standardized table.
+* randomized: randomized SVD of the first pca_max_components components
+  (required: the explained variance ratios are still relative to the total
+  variance, but only those components are computed).
+* incremental: the scaler and IncrementalPCA are fitted on batches of
+  pca_batch_size rows, so only one standardized batch is in memory at a time.
+* auto: full, incremental from pca_incremental_rows rows.
+
+Tables that do not fit in memory go through fit_pca_stream, with a Parquet
+file or an iterator of chunks (e.g. pd.read_csv(..., chunksize=...)): the
+incremental solver reads the rows twice (scaler, then PCA) and the scores
+are streamed block by block (fit.iter_scores, fit.write_scores) instead of
+kept in memory:
+
+    fit = fit_pca_stream("samples.parquet", columns)
+    fit.write_scores("scores.parquet")
+
+The fitted model, the scaler and the scores are saved with joblib in
+config.pca_cache_dir, keyed by a hash of the data (values and index), the
+column list and the solver settings; a rerun on the same samples loads them.
+"""
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from config import *
+
+# Bump when the layout of the cached files changes
+cache_version = 1
+
+
+class PCAFit:
+    """
+    Result of fit_pca: the fitted `scaler` and `pca`, the samples used
+    (`data`, rows without missing values in `columns`), the scores of every
+    fitted component and the chosen k.
+    """
+
+    def __init__(self, columns, data, scaler, pca, all_scores, solver, threshold, source=None, spool=None):
+        self.columns = list(columns)
+        self.data = data
+        self.scaler = scaler
+        self.pca = pca
+        self.all_scores = all_scores
+        self.solver = solver
+        self.threshold = threshold
+        # Streamed fits (data and all_scores None): callable giving the
+        # (row positions, values) pieces again, and the folder of the copy
+        # of an iterator source (deleted with the fit)
+        self.source = source
+        self._spool = spool
+        self.cumulative_variance = np.cumsum(pca.explained_variance_ratio_)
+
+        reached = self.cumulative_variance >= threshold
+        self.k = int(np.argmax(reached)) + 1 if reached.any() else len(self.cumulative_variance)
+        if not reached.any():
+            print(f"The {self.k} fitted components explain {self.cumulative_variance[-1]:.1%} "
+                  f"of the variance, below {threshold:.0%}; using all of them")
+
+    def component_names(self, n):
+        return [f"PC{i+1}" for i in range(n)]
+
+    def component_scores(self, n=None):
+        """Scores of the first `n` components (default: all fitted), indexed as `data`."""
+        if self.all_scores is None:
+            raise ValueError("The scores of a streamed fit are not kept: use iter_scores or write_scores")
+        n = self.all_scores.shape[1] if n is None else n
+        return pd.DataFrame(self.all_scores[:, :n], columns=self.component_names(n), index=self.data.index)
+
+    def iter_scores(self, n=None):
+        """
+        Scores of the first `n` components (default: k) block by block: the
+        row positions in the source for streamed fits, one block indexed as
+        `data` otherwise.
+        """
+        n = self.k if n is None else n
+        if self.source is None:
+            yield self.component_scores(n)
+            return
+        for positions, values in self.source():
+            scores = self.pca.transform(self.scaler.transform(values))[:, :n]
+            yield pd.DataFrame(scores, columns=self.component_names(n), index=positions)
+
+    def write_scores(self, path, n=None):
+        """Writes iter_scores to a Parquet file (row column: position or index of the sample)."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        partial = f"{path}.{os.getpid()}.tmp"
+        writer = None
+        try:
+            for block in self.iter_scores(n):
+                table = pa.Table.from_pandas(block.rename_axis("row").reset_index(), preserve_index=False)
+                writer = writer or pq.ParquetWriter(partial, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(partial, path)
+        print(f"PCA scores saved to: {path}")
+        return path
+
+    @property
+    def scores(self):
+        """Scores of the first k components."""
+        return self.component_scores(self.k)
+
+    @property
+    def loadings(self):
+        """Loadings (columns x first k components)."""
+        return pd.DataFrame(self.pca.components_[: self.k].T, columns=self.component_names(self.k), index=self.columns)
+
+
+def resolve_solver(solver, n_rows):
+    if solver == "auto":
+        return "incremental" if n_rows >= pca_incremental_rows else "full"
+    if solver not in ("full", "randomized", "incremental"):
+        raise ValueError(f"Unknown PCA solver: {solver}")
+    return solver
+
+
+def row_batches(n_rows, batch_size, min_rows):
+    """[start, stop) row batches; a last batch shorter than `min_rows` joins the previous one."""
+    bounds = list(range(0, n_rows, batch_size)) + [n_rows]
+    if len(bounds) > 2 and bounds[-1] - bounds[-2] < min_rows:
+        del bounds[-2]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parquet_pieces(path, columns, batch_size):
+    """(row positions, float values) of the rows of a Parquet file without missing values in `columns`."""
+    import pyarrow.parquet as pq
+
+    return _complete_rows(
+        (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns)),
+        columns)
+
+
+def _complete_rows(chunks, columns):
+    offset = 0
+    for chunk in chunks:
+        values = chunk[columns].astype(float).to_numpy()
+        keep = ~np.isnan(values).any(axis=1)
+        yield offset + np.flatnonzero(keep), values[keep]
+        offset += len(chunk)
+
+
+def _spool_pieces(path, n_columns):
+    """Pieces written to a spool file by fit_pca_stream."""
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches():
+        table = batch.to_pandas()
+        yield table["row"].to_numpy(), table[[f"c{i}" for i in range(n_columns)]].to_numpy()
+
+
+def _blocks(pieces, batch_size, min_rows):
+    """
+    Regroups (positions, values) pieces into blocks of batch_size rows; a last
+    block shorter than `min_rows` joins the previous one (as row_batches).
+    """
+    buffered, held = [], None
+    n = 0
+    for piece in pieces:
+        buffered.append(piece)
+        n += len(piece[0])
+        if n < batch_size:
+            continue
+        positions = np.concatenate([p for p, _ in buffered])
+        values = np.concatenate([v for _, v in buffered])
+        start = 0
+        while n - start >= batch_size:
+            if held is not None:
+                yield held
+            held = positions[start:start + batch_size], values[start:start + batch_size]
+            start += batch_size
+        buffered, n = [(positions[start:], values[start:])], n - start
+    rest = (np.concatenate([p for p, _ in buffered]), np.concatenate([v for _, v in buffered])) if n else None
+    if rest is not None and held is not None and n < min_rows:
+        held, rest = (np.concatenate([held[0], rest[0]]), np.concatenate([held[1], rest[1]])), None
+    for block in (held, rest):
+        if block is not None:
+            yield block
+
+
+def cache_key(values, columns, settings):
+    """Hash of the data (values and index), the column list and the solver settings."""
+    digest = hashlib.sha1(repr((cache_version, list(columns), settings)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(values, index=True).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _fit(values, solver, n_components, batch_size):
+    """Scaler, PCA model and scores of every fitted component."""
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.decomposition import PCA, IncrementalPCA
+
+    if solver == "incremental":
+        batches = row_batches(len(values), batch_size, n_components)
+        scaler = StandardScaler()
+        for start, stop in batches:
+            scaler.partial_fit(values[start:stop])
+        pca = IncrementalPCA(n_components=n_components)
+        for start, stop in batches:
+            pca.partial_fit(scaler.transform(values[start:stop]))
+        scores = np.vstack([pca.transform(scaler.transform(values[start:stop])) for start, stop in batches])
+        return scaler, pca, scores
+
+    scaler = StandardScaler()
+    scaled = scaler.fit_transform(values)
+    if solver == "randomized":
+        pca = PCA(n_components=n_components, svd_solver="randomized", random_state=pca_random_state)
+    else:
+        pca = PCA(svd_solver="full")
+    scores = pca.fit_transform(scaled)
+    return scaler, pca, scores
+
+
+def fit_pca(
+    df,
+    columns,
+    solver=pca_solver,
+    threshold=pca_variance_threshold,
+    max_components=pca_max_components,
+    batch_size=pca_batch_size,
+    cache_dir=pca_cache_dir,
+):
+    """
+    Standardizes `columns` of the samples without missing values and fits
+    the PCA once (loaded from the cache when the same data was fitted).
+
+    Parameters:
+        df (pd.DataFrame): Samples.
+        columns (list): Variables of the PCA.
+        solver (str): "full", "randomized", "incremental" or "auto" (see above).
+        threshold (float): Cumulative explained variance that sets k.
+        max_components (int, optional): Components of the randomized and
+            incremental solvers (None: all of them).
+        batch_size (int): Rows per batch of the incremental solver.
+        cache_dir (str, optional): Folder of the fitted models (None: no cache).
+
+    Returns:
+        PCAFit: Scaler, model, scree curve, k, scores and loadings.
+    """
+    data = df.dropna(subset=columns)
+    values = data[columns].astype(float)
+    solver = resolve_solver(solver, len(values))
+    if solver == "randomized" and max_components is None:
+        raise ValueError("The randomized solver computes only the first max_components "
+                         "(config.pca_max_components): set it")
+    n_components = min(max_components or len(columns), len(columns), len(values))
+    settings = {"solver": solver, "random_state": pca_random_state}
+    if solver != "full":
+        settings["n_components"] = n_components
+    if solver == "incremental":
+        settings["batch_size"] = batch_size
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, f"pca-{cache_key(values, columns, settings)}.joblib")
+    if path is not None and os.path.exists(path):
+        import joblib
+
+        try:
+            cached = joblib.load(path)
+            print(f"PCA loaded from cache: {path}")
+            return PCAFit(columns, data, cached["scaler"], cached["pca"], cached["scores"], solver, threshold)
+        except Exception as e:
+            print(f"PCA cache not read ({e!r}): {path}")
+
+    scaler, pca, scores = _fit(values.to_numpy(), solver, n_components, batch_size)
+
+    if path is not None:
+        import joblib
+
+        try:
+            # Written aside and renamed, so readers never see half a file
+            os.makedirs(cache_dir, exist_ok=True)
+            partial = f"{path}.{os.getpid()}.tmp"
+            joblib.dump({"scaler": scaler, "pca": pca, "scores": scores}, partial)
+            os.replace(partial, path)
+            print(f"PCA cache saved to: {path}")
+        except Exception as e:
+            # The cache is an optimization: a failed write never stops the fit
+            print(f"PCA cache not saved ({e!r}): {path}")
+    return PCAFit(columns, data, scaler, pca, scores, solver, threshold)
+
+
+def fit_pca_stream(
+    source,
+    columns,
+    threshold=pca_variance_threshold,
+    max_components=pca_max_components,
+    batch_size=pca_batch_size,
+    cache_dir=pca_cache_dir,
+):
+    """
+    fit_pca with the incremental solver on a table that is never loaded
+    whole: the scaler is fitted on a first pass over the rows without
+    missing values in `columns`, the IncrementalPCA on a second one. An
+    iterator source is copied (only `columns`) to a temporary Parquet file on
+    the first pass, so it can be read again.
+
+    Parameters:
+        source (str or iterable): Parquet file, or iterator of DataFrame chunks.
+        columns (list): Variables of the PCA.
+        threshold (float): Cumulative explained variance that sets k.
+        max_components (int, optional): Components fitted (None: all of them).
+        batch_size (int): Rows per batch.
+        cache_dir (str, optional): Folder of the fitted models (None: no cache).
+
+    Returns:
+        PCAFit: Without data nor all_scores: the scores are read with
+        iter_scores or write_scores, indexed by the row position in the source.
+    """
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.decomposition import IncrementalPCA
+
+    columns = list(columns)
+    spool = None
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        pieces = lambda: _parquet_pieces(path, columns, batch_size)
+        first_pass = pieces()
+    else:
+        spool = tempfile.TemporaryDirectory(prefix="pca-")
+        path = os.path.join(spool.name, "rows.parquet")
+        pieces = lambda: _spool_pieces(path, len(columns))
+        first_pass = _spooled(_complete_rows(iter(source), columns), path, len(columns))
+
+    # First pass: scaler, row count and the data hash of the cache key
+    # (positions and values hashed apart, so the chunk sizes do not matter)
+    scaler = StandardScaler()
+    position_digest, value_digest = hashlib.sha1(), hashlib.sha1()
+    n_rows = 0
+    for positions, values in first_pass:
+        if len(values):
+            scaler.partial_fit(values)
+        position_digest.update(positions.astype(np.int64).tobytes())
+        value_digest.update(np.ascontiguousarray(values).tobytes())
+        n_rows += len(values)
+    if n_rows == 0:
+        raise ValueError(f"No rows without missing values in {columns}")
+    n_components = min(max_components or len(columns), len(columns), n_rows)
+    settings = {"solver": "incremental", "stream": True, "n_components": n_components,
+                "batch_size": batch_size, "random_state": pca_random_state}
+
+    cache_path = None
+    if cache_dir is not None:
+        key = hashlib.sha1(repr((cache_version, columns, settings, position_digest.hexdigest(),
+                                  value_digest.hexdigest())).encode("utf-8"))
+        cache_path = os.path.join(cache_dir, f"pca-{key.hexdigest()[:16]}.joblib")
+    if cache_path is not None and os.path.exists(cache_path):
+        import joblib
+
+        try:
+            cached = joblib.load(cache_path)
+            print(f"PCA loaded from cache: {cache_path}")
+            return PCAFit(columns, None, cached["scaler"], cached["pca"], None, "incremental", threshold,
+                          source=pieces, spool=spool)
+        except Exception as e:
+            print(f"PCA cache not read ({e!r}): {cache_path}")
+
+    # Second pass: the PCA on standardized blocks
+    pca = IncrementalPCA(n_components=n_components)
+    for _, values in _blocks(pieces(), batch_size, n_components):
+        pca.partial_fit(scaler.transform(values))
+
+    if cache_path is not None:
+        import joblib
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            partial = f"{cache_path}.{os.getpid()}.tmp"
+            joblib.dump({"scaler": scaler, "pca": pca, "scores": None}, partial)
+            os.replace(partial, cache_path)
+            print(f"PCA cache saved to: {cache_path}")
+        except Exception as e:
+            print(f"PCA cache not saved ({e!r}): {cache_path}")
+    return PCAFit(columns, None, scaler, pca, None, "incremental", threshold, source=pieces, spool=spool)
+
+
+def _spooled(pieces, path, n_columns):
+    """Passes the pieces through while writing them to a Parquet file."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("row", pa.int64())] + [(f"c{i}", pa.float64()) for i in range(n_columns)])
+    with pq.ParquetWriter(path, schema) as writer:
+        for positions, values in pieces:
+            data = {"row": positions.astype(np.int64)}
+            data.update({f"c{i}": values[:, i] for i in range(n_columns)})
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            yield positions, values
@@ -1,6 +1,8 @@
 excel_file_path = r"C:\Code\TIP\Balance_hidrico\input\hidroquimica\TablaShape.xlsx"
 data_sheet_name = "Termales"
 output_plots_path = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\plots"
+# Parquet copies of the workbook sheets (see utils/cached_reader.py)
+excel_cache_dir = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\cache"
 output_plots_clustering_path = output_plots_path + r"\clustering"
 
 complejo_volcanico_column_name = "Complejo Volcánico "
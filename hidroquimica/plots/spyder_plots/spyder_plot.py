@@ -1,12 +1,15 @@
 import pandas as pd
 from config import *
 import numpy as np
-import matplotlib.pyplot as plt
+
+from utils.cached_reader import read_excel_cached
 
 
 def read_excel_to_dataframe(file_path, sheet_name=0):
     """
-    Reads an Excel file and returns a pandas DataFrame.
+    Reads the spyder variables of an Excel file and returns a pandas DataFrame.
+    Only those columns are loaded from the Parquet copy of the sheet (see
+    utils/cached_reader.py).
 
     Parameters:
         file_path (str): Path to the Excel file.
@@ -15,8 +18,7 @@ def read_excel_to_dataframe(file_path, sheet_name=0):
     Returns:
         pd.DataFrame: DataFrame containing the Excel data.
     """
-    df = pd.read_excel(file_path, sheet_name=sheet_name)
-    df = df[[col for col in df.columns if col in spyder_variables.values()]]
+    df = read_excel_cached(file_path, sheet_name, columns=list(spyder_variables.values()))
     print(df.head())
     return df
 
@@ -31,6 +33,8 @@ def plot_spyder(df, spyder_variables, title="Spyder Plot"):
         spyder_variables (dict): Dictionary where keys are display names and values are column names in df.
         title (str): Title of the plot.
     """
+    import matplotlib.pyplot as plt
+
     labels = list(spyder_variables.keys())
     columns = list(spyder_variables.values())
     num_vars = len(labels)
@@ -63,6 +67,8 @@ def plot_spyder2(df, spyder_variables, axis_ranges, title="Star Plot"):
         axis_ranges (dict): Dictionary where keys are column names and values are (min, max) tuples for axis scaling.
         title (str): Title of the plot.
     """
+    import matplotlib.pyplot as plt
+
     labels = list(spyder_variables.keys())
     columns = list(spyder_variables.values())
     num_vars = len(labels)
@@ -118,6 +124,8 @@ def generate_random_spyder_data(spyder_variables, num_series=3, seed=None):
 
 #### stackoverflow sample
 def spider(df, *, id_column, title=None, max_values=None, padding=1.25):
+    import matplotlib.pyplot as plt
+
     categories = df._get_numeric_data().columns.tolist()
     data = df[categories].to_dict(orient="list")
     ids = df[id_column].tolist()
@@ -152,51 +160,56 @@ def spider(df, *, id_column, title=None, max_values=None, padding=1.25):
     plt.show()
 
 
-df = read_excel_to_dataframe(excel_file_path)
 radar = spider
 
-"""
-spider(
-    pd.DataFrame(
-        {
-            "x": [*"abcde"],
-            "c1": [10, 11, 12, 13, 14],
-            "c2": [0.1, 0.3, 0.4, 0.1, 0.9],
-            "c3": [1e5, 2e5, 3.5e5, 8e4, 5e4],
-            "c4": [9, 12, 5, 2, 0.2],
-            "test": [1, 1, 1, 1, 5],
-        }
-    ),
-    id_column="x",
-    title="Sample Spider",
-    padding=1.1,
-)
-"""
-spider(
-    df,
-    id_column=spyder_variables["ID"],
-    title="Sample Spider",
-    padding=1.1,
-)
-
-
-# Example usage:
-# random_df = generate_random_spyder_data(spyder_variables, num_series=3, seed=42)
-# plot_spyder(random_df, spyder_variables, title="Random Spyder Plot")
-
-
-df = read_excel_to_dataframe(excel_file_path)
-
-"""
-axis_ranges = {
-    "PH": (0, 120),
-    "Coliformes Totales (NMP/100 mL)": (0, 120),
-    "ARSENICO": (0, 120),
-    "NITRATOS": (0, 120),
-    "Plomo": (0, 120),
-    "CADMIO": (0, 120),
-    "SULFATOS": (0, 120),
-}
-plot_spyder2(df, spyder_variables, axis_ranges, title="Spyder Plot Example")
-
-"""
+
+def main(file_path=excel_file_path):
+    """Spyder plot of every sample in the hidrochemistry workbook."""
+    df = read_excel_to_dataframe(file_path)
+
+    """
+    spider(
+        pd.DataFrame(
+            {
+                "x": [*"abcde"],
+                "c1": [10, 11, 12, 13, 14],
+                "c2": [0.1, 0.3, 0.4, 0.1, 0.9],
+                "c3": [1e5, 2e5, 3.5e5, 8e4, 5e4],
+                "c4": [9, 12, 5, 2, 0.2],
+                "test": [1, 1, 1, 1, 5],
+            }
+        ),
+        id_column="x",
+        title="Sample Spider",
+        padding=1.1,
+    )
+    """
+    spider(
+        df,
+        id_column=spyder_variables["ID"],
+        title="Sample Spider",
+        padding=1.1,
+    )
+
+    # Example usage:
+    # random_df = generate_random_spyder_data(spyder_variables, num_series=3, seed=42)
+    # plot_spyder(random_df, spyder_variables, title="Random Spyder Plot")
+
+    """
+    axis_ranges = {
+        "PH": (0, 120),
+        "Coliformes Totales (NMP/100 mL)": (0, 120),
+        "ARSENICO": (0, 120),
+        "NITRATOS": (0, 120),
+        "Plomo": (0, 120),
+        "CADMIO": (0, 120),
+        "SULFATOS": (0, 120),
+    }
+    plot_spyder2(df, spyder_variables, axis_ranges, title="Spyder Plot Example")
+
+    """
+    return df
+
+
+if __name__ == "__main__":
+    main()
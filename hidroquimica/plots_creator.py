@@ -2,8 +2,6 @@ import pandas as pd
 from pathlib import Path
 from config import *
 
-import matplotlib.pyplot as plt
-
 
 def create_histograms(dataframes, column_names, output_dir=output_plots_path):
     """
@@ -14,6 +12,8 @@ def create_histograms(dataframes, column_names, output_dir=output_plots_path):
         column_names: list of column names to create histograms for
         output_dir: directory to save histogram images
     """
+    import matplotlib.pyplot as plt
+
     # Handle single dataframe
     if isinstance(dataframes, pd.DataFrame):
         dataframes = [dataframes]
@@ -69,6 +69,8 @@ def create_crossplot(
         tag_column: name of column to tag/color each point
         output_dir: directory to save crossplot image
     """
+    import matplotlib.pyplot as plt
+
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
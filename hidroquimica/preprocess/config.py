@@ -1,6 +1,8 @@
 excel_file_path = r"C:\Code\TIP\Balance_hidrico\input\hidroquimica\TablaShape.xlsx"
 data_sheet_name = "Termales"
 output_plots_path = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\plots"
+# Parquet copies of the workbook sheets (see utils/cached_reader.py)
+excel_cache_dir = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\cache"
 output_preprocess_path = r"C:\Code\TIP\Balance_hidrico\results\hidroquimica\preprocess"
 output_plots_clustering_path = output_plots_path + r"\clustering"
 
@@ -8,6 +10,15 @@ complejo_volcanico_column_name = "Complejo Volcánico "
 complejo_volcanico_name = "Azufral"
 not_null_columns = ["pH", "Temperatura (°C)"]
 
+# Read the samples from the append-only sample store (see sample_store.py
+# and its settings in hidroquimica/config.py)
+use_sample_store = True
+
+# Lab results below the detection limit ("<0.01") in the ionic balance:
+# "zero" (taken as 0), "half" (half the limit), "limit" (the limit) or "nan"
+# (left out of the cation and anion sums, like the not detected values)
+detection_limit_mode = "zero"
+not_detected_values = ["ND", "N.D.", "NO DETECTADO", "NO DETECTABLE"]
 
 # Molecular weights of cations and anions
 iones = {
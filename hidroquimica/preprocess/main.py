@@ -1,32 +1,66 @@
+from instrumentation import stage, write_report
 from utils.dataframe_creator import read_excel_to_dataframe
-from plots_creator import *
 from .config import *
-from clustering_analysis import *
 from ionic_balance import calculate_ionic_balance
+from sample_store import SampleStore
+from sample_table import SampleTable
 from . import stats
 
-# This should be run from outside of this folder, like python -m preprocess.main
-df = read_excel_to_dataframe(excel_file_path, data_sheet_name)
-df = df[df[complejo_volcanico_column_name] == complejo_volcanico_name]
-# df_guaitara = df[df["Subcuenca"] == "Guaitara"]
-
-# Clean nan important columns
-
-df = calculate_ionic_balance(df, iones)
-
-stats.create_stats_table(
-    df,
-    sample_name_column="Nombre",
-    parameters=[
-        "pH in situ",
-        "T°",
-        "Cl",
-        "SO4",
-        "HCO3",
-        "Ca",
-        "Mg",
-        "Na",
-        "K",
-    ],
-    output_path=output_preprocess_path + r"\stats_table.xlsx",
-)
+stats_parameters = [
+    "pH in situ",
+    "T°",
+    "Cl",
+    "SO4",
+    "HCO3",
+    "Ca",
+    "Mg",
+    "Na",
+    "K",
+]
+
+
+def main(
+    file_path=excel_file_path,
+    sheet_name=data_sheet_name,
+    complejo=complejo_volcanico_name,
+    output_path=output_preprocess_path,
+):
+    """
+    Ionic balance and per sample stats table of the hidrochemistry data.
+    This should be run from outside of this folder, like python -m preprocess.main
+    """
+    with stage("read"):
+        df = read_excel_to_dataframe(file_path, sheet_name)
+    store = None
+    if use_sample_store:
+        # Ionic balance and stats are computed for the new or changed samples only
+        with stage("sample_store"):
+            store = SampleStore()
+            # The whole sheet: samples deleted or re-keyed in it leave the store
+            store.ingest(df, remove_missing=True)
+            df = store.table()
+    df = SampleTable(df).select({complejo_volcanico_column_name: complejo})
+    # df_guaitara = df[df["Subcuenca"] == "Guaitara"]
+
+    # Clean nan important columns
+
+    with stage("ionic_balance"):
+        if store is None:
+            df = calculate_ionic_balance(df, iones)
+
+    with stage("stats"):
+        stats.create_stats_table(
+            df,
+            sample_name_column="Nombre",
+            parameters=stats_parameters,
+            output_path=output_path + r"\stats_table.xlsx",
+            df_stats=None if store is None else store.stats_table(
+                "Nombre", stats_parameters, {complejo_volcanico_column_name: complejo}),
+        )
+
+    write_report(output_path + r"\run_report.json")
+    return df
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,10 @@
-def create_stats_table(df, sample_name_column, parameters, output_path):
+def stats_table(df, sample_name_column, parameters):
+    """describe() of `parameters` for every sample name."""
     df = df[[sample_name_column] + parameters]
-    df_stats = df.groupby(sample_name_column).describe()  # .transpose()
+    return df.groupby(sample_name_column).describe()  # .transpose()
+
+
+def create_stats_table(df, sample_name_column, parameters, output_path, df_stats=None):
+    if df_stats is None:
+        df_stats = stats_table(df, sample_name_column, parameters)
     df_stats.to_excel(output_path)
@@ -0,0 +1,380 @@
+"""
+Append-only store of the lab samples (Parquet partitions).
+
+Each ingest of the spreadsheet (or of a new campaign) compares the hash of
+every row with the stored version of its sample, keyed by
+config.sample_key_columns, and appends one partition with only the new and
+changed rows. The derived columns (the *_meq columns, sum_cations,
+sum_anions, ionic_balance and the <ion>_log columns of
+config.log_transform_columns) are computed on those rows only, so a rerun
+after a campaign costs time proportional to the new data.
+
+    store = SampleStore()
+    store.ingest(read_excel_to_dataframe(excel_file_path, data_sheet_name), remove_missing=True)
+    df = store.table()
+
+Samples are matched on their keys as normalized_values, so a key read as
+a date or as text, or as 1 or 1.0, is the same sample.
+
+The latest version of each sample wins; partitions are never rewritten
+except by compact(). Each partition records the fingerprint of the settings
+and the code of its derived columns (derivation_fingerprint); when they
+change, refresh() (run by ingest, table and compact) appends the latest
+version of the samples of the older partitions with their derived columns
+computed again.
+"""
+import os
+import glob
+import json
+import inspect
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import *
+from utils.cached_reader import write_typed_parquet, read_typed_parquet, typed_parquet_info
+
+# Bookkeeping columns of the stored rows
+internal_columns = ["_occurrence", "_row_hash", "_batch", "_order", "_deleted"]
+# Settings of config.py used by derive_columns
+derivation_settings = ["iones", "detection_limit_mode", "not_detected_values", "log_transform_columns"]
+
+
+def normalized_values(column):
+    """
+    Values of `column` as text that does not depend on how the sheet was
+    read: numbers as floats (1 and 1.0 alike, numeric text too), dates as
+    'YYYY-MM-DD HH:MM:SS' whether typed or stored as text, missing cells as "".
+    """
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+        text = column.astype(float).astype(str)
+    elif pd.api.types.is_datetime64_any_dtype(column):
+        text = column.map(str)
+    else:
+        number = pd.to_numeric(column, errors="coerce")
+        text = column.map(lambda v: str(pd.Timestamp(v)) if isinstance(v, datetime) else str(v))
+        text = text.where(number.isna(), number.astype(float).astype(str))
+    return text.where(column.notna(), "")
+
+
+def row_hashes(df):
+    """
+    Hash of every row of `df` (values and column names), stable across
+    reads: the values are hashed as normalized_values, so the same sheet
+    read by pd.read_excel or from its Parquet copy gives the same hashes.
+    """
+    columns = sorted(df.columns, key=str)
+    normalized = {i: normalized_values(df[name]) for i, name in enumerate(columns)}
+    normalized["columns"] = "|".join(map(str, columns))
+    return pd.util.hash_pandas_object(pd.DataFrame(normalized, index=df.index), index=False).to_numpy()
+
+
+def sample_keys(df, keys):
+    """
+    Key columns of `df` as normalized_values (named k0, k1...), so a sample
+    matches its stored version whatever the types the keys were read with.
+    """
+    return pd.DataFrame({f"k{i}": normalized_values(df[key]) for i, key in enumerate(keys)}, index=df.index)
+
+
+def derive_columns(df):
+    """Ionic balance (see ionic_balance.py) and log of the ions of `df`."""
+    from ionic_balance import calculate_ionic_balance
+
+    derived = calculate_ionic_balance(df, iones, detection_limit_mode)
+    epsilon = 1e-12
+    for column in log_transform_columns:
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors="coerce")
+            with np.errstate(invalid="ignore", divide="ignore"):
+                derived[f"{column}_log"] = np.log(values + epsilon)
+    return derived
+
+
+def derivation_fingerprint():
+    """
+    Hash of the derivation_settings values, of the module that defines the
+    calculate_ionic_balance used by derive_columns and of derive_columns:
+    partitions with another fingerprint have stale derived columns.
+    """
+    from ionic_balance import calculate_ionic_balance, not_detected_values
+
+    settings = {name: globals()[name] for name in derivation_settings}
+    settings["not_detected_values"] = not_detected_values
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    with open(inspect.getsourcefile(calculate_ionic_balance), "rb") as f:
+        digest.update(f.read())
+    digest.update(inspect.getsource(derive_columns).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def is_derived(column):
+    """Whether `column` is one of the names derive_columns may add."""
+    return column in ("sum_cations", "sum_anions", "ionic_balance") or \
+        str(column).endswith(("_meq", "_log"))
+
+
+def log_view(df):
+    """`df` with every ion column replaced by its <ion>_log column (as log_transform_data)."""
+    df = df.copy()
+    for column in log_transform_columns:
+        if f"{column}_log" in df.columns:
+            df[column] = df[f"{column}_log"]
+    return df
+
+
+class SampleStore:
+    """
+    Parquet partitions (part-<batch>.parquet) of sample versions in `path`.
+    Rows are keyed by `key_columns` plus the occurrence of the key in the
+    ingested table, so repeated keys are kept apart.
+    """
+
+    def __init__(self, path=sample_store_dir, key_columns=sample_key_columns):
+        self.path = path
+        self.key_columns = list(key_columns)
+
+    def partitions(self):
+        return sorted(glob.glob(os.path.join(self.path, "part-*.parquet")))
+
+    def _write(self, part, batch, refreshed=None):
+        """
+        Writes partition `batch` with its key columns and derivation
+        fingerprint in the metadata (and the last batch it refreshes).
+        """
+        keys = [column for column in self.key_columns if column in part.columns]
+        write_typed_parquet(part.reset_index(drop=True), os.path.join(self.path, f"part-{batch:06d}.parquet"), {
+            "key_columns": keys,
+            "derivation": derivation_fingerprint(),
+            "refreshed": refreshed,
+        })
+
+    def stale_batches(self):
+        """
+        Partitions whose derived columns were computed with other settings or
+        code, and not yet refreshed by a later partition.
+        """
+        current = derivation_fingerprint()
+        infos = {}
+        for part in self.partitions():
+            info = typed_parquet_info(part)
+            infos[_batch_number(part)] = (info or {}).get("metadata") or {}
+        # A refresh covers every partition up to its "refreshed" batch
+        covered = max((meta.get("refreshed") or -1 for meta in infos.values()
+                       if meta.get("derivation") == current), default=-1)
+        return sorted(batch for batch, meta in infos.items()
+                      if meta.get("derivation") != current and batch > covered)
+
+    def refresh(self):
+        """
+        Computes again the derived columns of the latest version of the
+        samples stored in stale_batches(), appended as one partition.
+
+        Returns:
+            int: Number of samples refreshed.
+        """
+        stale = self.stale_batches()
+        if not stale:
+            return 0
+        # Rows keep their batch when compacted: the stale ones are found by file
+        latest = self._latest(self._read(partition=True))
+        rows = latest[~latest["_deleted"].astype(bool) & latest["_partition"].isin(stale)]
+        last = self.last_batch()
+        original = rows[[column for column in rows.columns if not is_derived(column) and column != "_partition"]]
+        # Written even without rows, so the stale partitions are settled
+        part = derive_columns(original) if len(rows) else original.copy()
+        part["_batch"] = last + 1
+        self._write(part, last + 1, refreshed=last)
+        print(f"Sample store: derived columns computed again for {len(rows)} samples")
+        return len(rows)
+
+    def _keys(self, df):
+        keys = [column for column in self.key_columns if column in df.columns]
+        if not keys:
+            raise ValueError(f"None of the sample key columns {self.key_columns} is in the table")
+        return keys
+
+    def _read(self, columns=None, partition=False):
+        """
+        Every stored version (only `columns` plus the bookkeeping ones, if
+        given), with the number of its partition file in '_partition' if
+        `partition`.
+        """
+        parts = self.partitions()
+        if columns is not None:
+            columns = list(columns) + self.key_columns + internal_columns
+        if not parts:
+            return pd.DataFrame(columns=list(dict.fromkeys(columns or self.key_columns + internal_columns)))
+        versions = [read_typed_parquet(part, columns) for part in parts]
+        if partition:
+            versions = [rows.assign(_partition=_batch_number(part)) for rows, part in zip(versions, parts)]
+        return pd.concat(versions, ignore_index=True)
+
+    def _latest(self, versions):
+        """Latest version of every key (versions are read in batch order)."""
+        keys = [column for column in self.key_columns if column in versions.columns]
+        sample = sample_keys(versions, keys).assign(_occurrence=versions["_occurrence"].to_numpy())
+        latest = versions[~sample.duplicated(keep="last").to_numpy()]
+        return latest.sort_values("_order", kind="stable")
+
+    def ingest(self, df, remove_missing=False):
+        """
+        Appends the new and changed rows of `df` (with their derived
+        columns) as one partition.
+
+        Parameters:
+            df (pd.DataFrame): Samples as read from the spreadsheet.
+            remove_missing (bool): Mark the stored samples that are not in
+                `df` as deleted (the whole sheet is given). By default `df`
+                may be a campaign with only some samples.
+
+        Returns:
+            dict: Number of new, changed, unchanged and removed samples.
+        """
+        keys = self._keys(df)
+        self.refresh()
+        incoming = df.reset_index(drop=True).copy()
+        # Samples are matched on their normalized keys (see sample_keys)
+        incoming_keys = sample_keys(incoming, keys)
+        sample = list(incoming_keys.columns) + ["_occurrence"]
+        incoming["_occurrence"] = incoming_keys.groupby(sample[:-1], sort=False).cumcount()
+        incoming_keys["_occurrence"] = incoming["_occurrence"]
+        incoming["_row_hash"] = row_hashes(df.reset_index(drop=True))
+
+        stored = self._read(keys)
+        if len(stored):
+            stored = self._latest(stored)
+            stored = stored[~stored["_deleted"].astype(bool)]
+        stored_keys = sample_keys(stored, keys).assign(_occurrence=stored["_occurrence"].to_numpy())
+        if len(stored):
+            known = incoming_keys.merge(stored_keys.assign(_order=stored["_order"].to_numpy()),
+                                        on=sample, how="left", indicator=True)
+            same = incoming_keys.assign(_row_hash=incoming["_row_hash"]).merge(
+                stored_keys.assign(_row_hash=stored["_row_hash"].to_numpy()),
+                on=sample + ["_row_hash"], how="left", indicator=True)
+            new = (known["_merge"] == "left_only").to_numpy()
+            changed = ~new & (same["_merge"] == "left_only").to_numpy()
+            order = known["_order"].to_numpy(dtype=float)
+        else:
+            new = np.ones(len(incoming), dtype=bool)
+            changed = ~new
+            order = np.zeros(len(incoming))
+
+        # Changed samples keep their place, new ones go after the stored ones
+        order[new] = (stored["_order"].max() + 1 if len(stored) else 0) + np.arange(new.sum())
+        incoming["_order"] = order
+
+        removed = pd.DataFrame()
+        if remove_missing and len(stored):
+            present = stored_keys.merge(incoming_keys, on=sample, how="left", indicator=True)
+            removed = stored.loc[(present["_merge"] == "left_only").to_numpy(), keys + internal_columns].copy()
+            removed["_deleted"] = True
+
+        rows = incoming[new | changed]
+        counts = {"new": int(new.sum()), "changed": int(changed.sum()),
+                  "unchanged": int(len(incoming) - new.sum() - changed.sum()), "removed": len(removed)}
+        if len(rows) or len(removed):
+            batch = self.last_batch() + 1
+            part = derive_columns(rows) if len(rows) else rows.copy()
+            part["_deleted"] = False
+            if len(removed):
+                part = pd.concat([part, removed], ignore_index=True)
+            part["_batch"] = batch
+            self._write(part, batch)
+        print(f"Sample store: {counts['new']} new, {counts['changed']} changed, "
+              f"{counts['unchanged']} unchanged, {counts['removed']} removed samples")
+        return counts
+
+    def table(self, columns=None):
+        """Latest version of every stored sample, with its derived columns."""
+        self.refresh()
+        versions = self._read(columns)
+        if versions.empty:
+            return versions.drop(columns=internal_columns)
+        latest = self._latest(versions)
+        latest = _drop_obsolete(latest[~latest["_deleted"].astype(bool)])
+        return latest.drop(columns=internal_columns).reset_index(drop=True)
+
+    def last_batch(self):
+        parts = self.partitions()
+        return _batch_number(parts[-1]) if parts else -1
+
+    def stats_table(self, sample_name_column, parameters, filters=None):
+        """
+        Per sample describe() of `parameters` (see preprocess/stats.py) over
+        the stored samples matching `filters` ({column: value}). The table is
+        kept next to the partitions and only the samples with rows ingested
+        since the last call are recomputed.
+        """
+        from preprocess.stats import stats_table
+
+        filters = filters or {}
+        setup = json.dumps([sample_name_column, list(parameters), sorted(filters.items())], default=str)
+        stats_path = os.path.join(self.path, f"stats-{hashlib.sha1(setup.encode()).hexdigest()[:12]}.parquet")
+        info = typed_parquet_info(stats_path)
+        last = self.last_batch()
+        if info is not None and info["metadata"]["batch"] == last:
+            return _stats_frame(read_typed_parquet(stats_path, info=info))
+
+        columns = [sample_name_column] + list(parameters) + list(filters)
+        versions = self._read(columns)
+        latest = self._latest(versions)
+        latest = latest[~latest["_deleted"].astype(bool)]
+        for column, value in filters.items():
+            latest = latest[latest[column] == value]
+
+        if info is None:
+            stats = stats_table(latest, sample_name_column, list(parameters))
+        else:
+            # Samples with versions ingested after the stored table
+            touched = versions.loc[versions["_batch"] > info["metadata"]["batch"], sample_name_column].unique()
+            stats = _stats_frame(read_typed_parquet(stats_path, info=info))
+            recomputed = stats_table(latest[latest[sample_name_column].isin(touched)],
+                                     sample_name_column, list(parameters))
+            kept = stats[~stats.index.isin(touched) & stats.index.isin(latest[sample_name_column])]
+            stats = pd.concat([kept, recomputed]).sort_index()
+            print(f"Stats recomputed for {len(recomputed)} of {len(stats)} samples")
+        write_typed_parquet(stats.reset_index(), stats_path, {"batch": last})
+        return stats
+
+    def compact(self):
+        """
+        Writes the latest version of every sample as a new partition and
+        then removes the older ones. The deleted markers are kept in the new
+        partition, so a sample removed before is never read back from an
+        old partition, even if the removal of the old ones is interrupted.
+        Rows keep their batch, so the stats tables stay valid.
+        """
+        self.refresh()
+        parts = self.partitions()
+        if len(parts) <= 1:
+            return
+        latest = self._latest(self._read())
+        deleted = latest["_deleted"].astype(bool)
+        kept = _drop_obsolete(latest[~deleted]).columns
+        latest = latest.drop(columns=[column for column in latest.columns if column not in kept])
+        batch = self.last_batch() + 1
+        self._write(latest, batch, refreshed=batch - 1)
+        for part in parts:
+            os.remove(part)
+        print(f"Sample store compacted: {int((~deleted).sum())} samples from {len(parts)} partitions")
+
+
+def _batch_number(part):
+    """Batch of a part-<batch>.parquet file."""
+    return int(os.path.basename(part)[5:11])
+
+
+def _drop_obsolete(latest):
+    """Derived columns with no value in the latest versions (left by other settings)."""
+    obsolete = [column for column in latest.columns
+                if is_derived(column) and latest[column].isna().all()]
+    return latest.drop(columns=obsolete)
+
+
+def _stats_frame(flat):
+    """Rebuilds the (parameter, statistic) columns of a stored stats table."""
+    flat.columns = pd.MultiIndex.from_tuples(flat.columns)
+    return flat.set_index(flat.columns[0]).rename_axis(flat.columns[0][0])
@@ -0,0 +1,154 @@
+"""
+Samples grouped by volcanic complex and sub-basin for repeated subsetting.
+
+The rows are sorted once by the group columns (config.sample_group_columns,
+stored as categoricals) and by date (config.sample_date_column), so every
+group is a contiguous block of rows and its date range a sub-block found
+by binary search. The start and end row of every group are kept in
+`groups`, so a selection reads that small index instead of comparing
+whole string columns:
+
+    table = SampleTable(df)
+    df_guaitara = table.select({"Subcuenca": "Guaitara"}, start="2015-01-01")
+    df_no_crater = table.select(exclude={"Subcuenca": "Crater"})
+    counts = table.apply(len, by=["Subcuenca"])
+
+A selection that is one contiguous block (a complex, a complex and
+sub-basin, with or without a date range) is a view of the table rows; any
+other combination is gathered from the group positions.
+"""
+import numpy as np
+import pandas as pd
+
+from config import *
+
+
+class SampleTable:
+    """
+    Samples sorted by group and date (self.df) with the [start, stop) rows
+    of every group (self.groups). Group columns missing from `df` are
+    ignored; without the date column, date ranges cannot be selected.
+    """
+
+    def __init__(self, df, group_columns=None, date_column=sample_date_column):
+        if group_columns is None:
+            group_columns = sample_group_columns
+        self.group_columns = [column for column in group_columns if column in df.columns]
+        self.date_column = date_column if date_column in df.columns else None
+
+        codes = []
+        data = df.copy()
+        for column in self.group_columns:
+            data[column] = data[column].astype("category")
+            codes.append(data[column].cat.codes.to_numpy())
+        if self.date_column is not None:
+            # NaT sorts last in its group
+            dates = pd.to_datetime(data[self.date_column], errors="coerce").to_numpy(dtype="datetime64[ns]")
+            date_key = np.where(np.isnat(dates), np.iinfo(np.int64).max, dates.astype(np.int64))
+        else:
+            date_key = np.zeros(len(data), dtype=np.int64)
+
+        # np.lexsort is stable and sorts by the last key first
+        order = np.lexsort([date_key] + codes[::-1]) if len(data) else np.arange(0)
+        self.df = data.iloc[order].reset_index(drop=True)
+        self.dates = date_key[order]
+        self.groups = self._group_index([c[order] for c in codes])
+
+    def _group_index(self, codes):
+        """Group values and [start, stop) rows of every group, in table order."""
+        n_rows = len(self.df)
+        if not self.group_columns:
+            return pd.DataFrame({"start": [0], "stop": [n_rows]})
+        change = np.zeros(n_rows, dtype=bool)
+        change[:1] = True
+        for c in codes:
+            change[1:] |= c[1:] != c[:-1]
+        starts = np.flatnonzero(change)
+        groups = pd.DataFrame({column: self.df[column].iloc[starts].to_numpy() for column in self.group_columns})
+        groups["start"] = starts
+        groups["stop"] = np.r_[starts[1:], n_rows].astype(int)
+        return groups
+
+    def values(self, column):
+        """Categories of a group column (the complexes or the sub-basins)."""
+        return list(self.df[column].cat.categories)
+
+    def _matching(self, filters=None, exclude=None):
+        """Mask of the groups that match `filters` and not `exclude` ({column: value or list})."""
+        mask = np.ones(len(self.groups), dtype=bool)
+        for column, values in (filters or {}).items():
+            mask &= self._isin(column, values)
+        for column, values in (exclude or {}).items():
+            mask &= ~self._isin(column, values)
+        return mask
+
+    def _isin(self, column, values):
+        if column not in self.group_columns:
+            raise KeyError(f"{column!r} is not a group column of the table: {self.group_columns}")
+        values = [values] if isinstance(values, str) or not np.iterable(values) else list(values)
+        group_values = self.groups[column]
+        mask = group_values.isin([value for value in values if not pd.isna(value)]).to_numpy()
+        if any(pd.isna(value) for value in values):
+            mask |= group_values.isna().to_numpy()
+        return mask
+
+    def _runs(self, groups, start=None, end=None):
+        """[start, stop) row runs of `groups` within the date range, adjacent runs merged."""
+        starts = groups["start"].to_numpy()
+        stops = groups["stop"].to_numpy()
+        if start is not None or end is not None:
+            if self.date_column is None:
+                raise ValueError("The table has no date column to select a date range")
+            lo = np.iinfo(np.int64).min if start is None else pd.Timestamp(start).value
+            # `end` is inclusive; NaT (the max key) is never in a range
+            hi = np.iinfo(np.int64).max - 1 if end is None else pd.Timestamp(end).value
+            first = [s + np.searchsorted(self.dates[s:e], lo, side="left") for s, e in zip(starts, stops)]
+            last = [s + np.searchsorted(self.dates[s:e], hi, side="right") for s, e in zip(starts, stops)]
+            starts, stops = np.asarray(first, dtype=int), np.asarray(last, dtype=int)
+        runs = []
+        for s, e in sorted(zip(starts, stops)):
+            if e <= s:
+                continue
+            if runs and runs[-1][1] == s:
+                runs[-1][1] = e
+            else:
+                runs.append([s, e])
+        return runs
+
+    def _rows(self, runs):
+        if len(runs) == 1:
+            return self.df.iloc[runs[0][0]:runs[0][1]]
+        if not runs:
+            return self.df.iloc[0:0]
+        return self.df.take(np.concatenate([np.arange(s, e) for s, e in runs]))
+
+    def select(self, filters=None, exclude=None, start=None, end=None):
+        """
+        Samples of the groups matching `filters` and not `exclude` (dicts of
+        group column -> value or list of values, None/NaN for the samples
+        without one), dated from `start` to `end` (inclusive, None = open).
+
+        Returns:
+            pd.DataFrame: A view of the table when the selection is one
+            contiguous block of rows, a new frame otherwise.
+        """
+        return self._rows(self._runs(self.groups[self._matching(filters, exclude)], start, end))
+
+    def apply(self, func, by=None, filters=None, exclude=None, start=None, end=None):
+        """
+        Runs `func` on the samples of every group of the `by` columns
+        (default: all the group columns), in one pass over the group index.
+
+        Returns:
+            pd.Series or pd.DataFrame: The results keyed by group (func
+            results that are frames or series are concatenated).
+        """
+        by = self.group_columns if by is None else list(by)
+        groups = self.groups[self._matching(filters, exclude)]
+        results = {}
+        for key, members in groups.groupby(by, observed=True, sort=False, dropna=False):
+            results[key[0] if len(by) == 1 else key] = func(self._rows(self._runs(members, start, end)))
+        if results and all(isinstance(r, (pd.DataFrame, pd.Series)) for r in results.values()):
+            return pd.concat(results, names=by)
+        series = pd.Series(results) if results else pd.Series(dtype=object)
+        return series.rename_axis(by if len(by) > 1 else by[0])
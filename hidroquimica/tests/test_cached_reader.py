@@ -0,0 +1,80 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from utils.cached_reader import (read_excel_cached, read_typed_parquet,
+                                 typed_parquet_info, write_typed_parquet)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """Sheet with dates, ints, floats and text mixed in the same columns."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Termales"
+    ws.append(["Nombre", "Fecha", "Cl", "Na", "pH"])
+    rows = [
+        ["F1", datetime(2020, 3, 1, 10, 30), 12, "<0.01", 7.1],
+        ["F2", "sin fecha", 3.5, 4, 6.8],
+        ["F3", datetime(2021, 1, 15), "ND", 2.25, None],
+        ["F4", None, None, "0,5", 7.0],
+        ["F5", 20200301, 7, None, 6.5],
+    ]
+    for row in rows:
+        ws.append(row)
+    path = tmp_path / "TablaShape.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+def test_miss_and_hit_return_the_same_frame(workbook, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    miss = read_excel_cached(workbook, "Termales", cache_dir=cache_dir)
+    hit = read_excel_cached(workbook, "Termales", cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(miss, hit)
+    # The types of the values do not depend on the cache state
+    for column in miss.columns:
+        assert [type(v) for v in miss[column]] == [type(v) for v in hit[column]]
+
+    # Same values as the workbook, with dates as dates and ints as ints
+    raw = pd.read_excel(workbook, sheet_name="Termales")
+    fecha = hit["Fecha"]
+    assert isinstance(fecha[0], datetime) and fecha[0] == datetime(2020, 3, 1, 10, 30)
+    assert fecha[1] == "sin fecha" and isinstance(fecha[2], datetime) and pd.isna(fecha[3])
+    assert fecha[4] == 20200301 and isinstance(fecha[4], (int, np.integer))
+    assert hit["Cl"][0] == 12 and isinstance(hit["Cl"][0], (int, np.integer))
+    assert hit["Cl"][1] == 3.5 and hit["Cl"][2] == "ND"
+    assert hit["Na"].tolist()[:2] == ["<0.01", 4] and hit["Na"][3] == "0,5"
+    pd.testing.assert_series_equal(hit["pH"], raw["pH"])
+    for column in raw.columns:
+        for expected, value in zip(raw[column], hit[column]):
+            assert (pd.isna(expected) and pd.isna(value)) or expected == value
+
+
+def test_hit_loads_only_some_columns(workbook, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    miss = read_excel_cached(workbook, "Termales", columns=["Fecha", "pH", "Otra"], cache_dir=cache_dir)
+    hit = read_excel_cached(workbook, "Termales", columns=["Fecha", "pH", "Otra"], cache_dir=cache_dir)
+    assert list(hit.columns) == ["Fecha", "pH"]
+    pd.testing.assert_frame_equal(miss, hit)
+
+
+def test_reads_the_first_layout(tmp_path):
+    # Sample store partitions written before the int and date parts
+    path = str(tmp_path / "part-000001.parquet")
+    table = pa.table({"c0": [1.0, None], "t0": [None, "<0.01"], "c1": ["F1", "F2"]})
+    info = {"columns": ["Cl", "Nombre"], "mixed": [0], "metadata": None}
+    pq.write_table(table.replace_schema_metadata({b"excel_cache": json.dumps(info).encode()}), path)
+    df = read_typed_parquet(path)
+    assert df["Cl"].tolist() == [1.0, "<0.01"] and df["Nombre"].tolist() == ["F1", "F2"]
+
+    # And the current layout writes the same values back
+    write_typed_parquet(df, path)
+    assert typed_parquet_info(path)["mixed"] == [0]
+    pd.testing.assert_frame_equal(read_typed_parquet(path), df)
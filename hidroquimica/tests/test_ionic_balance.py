@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import not_detected_values
+from ionic_balance import parse_concentrations, calculate_ionic_balance, calculate_meq
+
+cells = [1.5, 0, "2.25", " 3,5 ", "<0.01", "< 0,2", "<=4", ">500", "> 1,5", "ND", "n.d.",
+         "No detectado", "abc", "<LD", None, np.nan, "", 7]
+
+
+def reference_parse(cell, mode):
+    """One cell at a time, following the parse_concentrations docstring."""
+    if cell is None or (isinstance(cell, float) and np.isnan(cell)):
+        return 0.0
+    if isinstance(cell, (int, float)):
+        return float(cell)
+    text = cell.strip().upper()
+    if text in [value.upper() for value in not_detected_values]:
+        return np.nan if mode == "nan" else 0.0
+    try:
+        number = float(text.lstrip("<>= ").replace(",", "."))
+    except ValueError:
+        # Other text is 0; below an unknown limit ("<LD") is 0, or NaN with mode "nan"
+        if not text.startswith("<"):
+            return 0.0
+        number = 0.0
+    if text.startswith("<"):
+        return {"zero": 0.0, "half": number / 2, "limit": number, "nan": np.nan}[mode]
+    return number
+
+
+@pytest.mark.parametrize("mode", ["zero", "half", "limit", "nan"])
+def test_parse_matches_reference(mode):
+    expected = [reference_parse(cell, mode) for cell in cells]
+    np.testing.assert_array_equal(parse_concentrations(pd.Series(cells, dtype=object), mode), expected)
+
+
+def test_parse_examples():
+    parsed = parse_concentrations(pd.Series(["<0.4", ">500", "0,5", "ND"], dtype=object), "half")
+    np.testing.assert_array_equal(parsed, [0.2, 500.0, 0.5, 0.0])
+    with pytest.raises(ValueError):
+        parse_concentrations([1.0], "double")
+
+
+def test_numeric_column_is_unchanged():
+    column = pd.Series([1.0, 2.5, np.nan])
+    np.testing.assert_array_equal(parse_concentrations(column, "nan"), [1.0, 2.5, 0.0])
+
+
+def test_ionic_balance_leaves_nan_out_of_the_sums():
+    iones = {"Na": 23, "Cl": 35, "Ca": 20}
+    df = pd.DataFrame({"Na": ["<1", 23.0], "Cl": [35.0, "ND"], "Ca": [20.0, "4,0"]})
+    result = calculate_ionic_balance(df, iones, mode="nan")
+    np.testing.assert_allclose(result["sum_cations"], [1.0, 1.2])
+    np.testing.assert_allclose(result["sum_anions"], [1.0, 0.0])
+    np.testing.assert_allclose(result["ionic_balance"], [0.0, 100.0])
+    assert np.isnan(result.loc[0, "Na_meq"])
+
+    limit = calculate_ionic_balance(df, iones, mode="limit")
+    assert limit.loc[0, "Na_meq"] == pytest.approx(1 / 23)
+    assert calculate_meq("<46", 23) == 0.0
+
+
+def test_preprocess_uses_the_same_implementation():
+    # One implementation for both workflows, the one the sample store fingerprints
+    import inspect
+    import ionic_balance
+    from preprocess import ionic_balance as preprocess_balance
+
+    assert preprocess_balance.calculate_ionic_balance is ionic_balance.calculate_ionic_balance
+    assert preprocess_balance.parse_concentrations is ionic_balance.parse_concentrations
+    assert inspect.getsourcefile(preprocess_balance.calculate_ionic_balance) == ionic_balance.__file__
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pca_stage import fit_pca, fit_pca_stream, _blocks, row_batches
+
+columns = ["Na", "Ca", "Mg", "Cl", "SO4"]
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(8)
+    n = 2500
+    latent = rng.normal(size=(n, 2))
+    values = latent @ rng.normal(size=(2, len(columns))) + 0.3 * rng.normal(size=(n, len(columns)))
+    df = pd.DataFrame(values * [5, 20, 3, 40, 10] + 50, columns=columns)
+    df.loc[rng.random(n) < 0.05, "Cl"] = np.nan
+    df["Nombre"] = [f"M{i}" for i in range(n)]
+    return df
+
+
+def chunks(df, size):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+
+def test_blocks_match_row_batches():
+    pieces = [(np.arange(a, b), np.arange(a, b)[:, None] * 1.0) for a, b in [(0, 7), (7, 8), (8, 31), (31, 33)]]
+    blocks = list(_blocks(iter(pieces), 10, 4))
+    assert [(p[0], p[-1] + 1) for p, _ in blocks] == row_batches(33, 10, 4)
+
+
+@pytest.mark.parametrize("source", ["parquet", "chunks"])
+def test_stream_matches_the_in_memory_fit(tmp_path, samples, source):
+    expected = fit_pca(samples, columns, solver="incremental", batch_size=400, cache_dir=None)
+    if source == "parquet":
+        samples.to_parquet(tmp_path / "samples.parquet", index=False)
+        fit = fit_pca_stream(str(tmp_path / "samples.parquet"), columns, batch_size=400, cache_dir=None)
+    else:
+        fit = fit_pca_stream(chunks(samples, 333), columns, batch_size=400, cache_dir=None)
+
+    assert fit.data is None and fit.all_scores is None
+    np.testing.assert_allclose(fit.scaler.mean_, expected.scaler.mean_, rtol=1e-10)
+    np.testing.assert_allclose(fit.pca.components_, expected.pca.components_, atol=1e-8)
+    np.testing.assert_allclose(fit.cumulative_variance, expected.cumulative_variance, rtol=1e-8)
+    assert fit.k == expected.k
+
+    fit.write_scores(str(tmp_path / "scores.parquet"))
+    scores = pd.read_parquet(tmp_path / "scores.parquet").set_index("row")
+    pd.testing.assert_frame_equal(scores, expected.scores, check_names=False, atol=1e-8)
+    with pytest.raises(ValueError):
+        fit.component_scores()
+
+
+def test_stream_cache(tmp_path, samples):
+    first = fit_pca_stream(chunks(samples, 500), columns, batch_size=400, cache_dir=str(tmp_path))
+    again = fit_pca_stream(chunks(samples, 700), columns, batch_size=400, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("pca-*.joblib"))) == 1
+    np.testing.assert_array_equal(first.pca.components_, again.pca.components_)
+    assert sum(len(block) for block in again.iter_scores()) == samples["Cl"].notna().sum()
+
+
+def test_randomized_needs_max_components(samples):
+    with pytest.raises(ValueError, match="max_components"):
+        fit_pca(samples, columns, solver="randomized", max_components=None, cache_dir=None)
+    fit = fit_pca(samples, columns, solver="randomized", max_components=3, cache_dir=None)
+    assert fit.all_scores.shape == (samples["Cl"].notna().sum(), 3)
@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sample_store
+from sample_store import SampleStore, derive_columns
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(2)
+    n = 12
+    df = pd.DataFrame({
+        "Nombre": [f"M{i % 6}" for i in range(n)],
+        "Fecha": pd.Timestamp("2020-01-01") + pd.to_timedelta(np.arange(n) // 6 * 30, unit="D"),
+        "pH": rng.uniform(5, 8, n).round(2),
+    })
+    for ion in ["Na", "Ca", "Mg", "K", "HCO3", "Cl", "SO4"]:
+        df[ion] = rng.uniform(1, 100, n).round(2)
+    df["Cl"] = df["Cl"].astype(object)
+    df.loc[3, "Cl"] = "<0.5"
+    return df
+
+
+def expected_table(df):
+    return derive_columns(df).reset_index(drop=True)
+
+
+def assert_same(table, df):
+    expected = expected_table(df)
+    pd.testing.assert_frame_equal(table[expected.columns], expected, check_dtype=False)
+
+
+def test_ingest_change_remove(tmp_path, samples):
+    store = SampleStore(str(tmp_path))
+    assert store.ingest(samples) == {"new": 12, "changed": 0, "unchanged": 0, "removed": 0}
+    assert_same(store.table(), samples)
+    assert store.ingest(samples)["unchanged"] == 12
+    assert len(store.partitions()) == 1
+
+    changed = samples.copy()
+    changed.loc[4, "Na"] = 999.0
+    campaign = pd.DataFrame([{**samples.iloc[0].to_dict(), "Nombre": "M9"}])
+    assert store.ingest(pd.concat([changed, campaign], ignore_index=True)) == \
+        {"new": 1, "changed": 1, "unchanged": 11, "removed": 0}
+    after = pd.concat([changed, campaign], ignore_index=True)
+    assert_same(store.table(), after)
+
+    assert store.ingest(after.drop(index=[0, 12]), remove_missing=True)["removed"] == 2
+    assert_same(store.table(), after.drop(index=[0, 12]))
+
+
+def test_derived_columns_follow_the_settings(tmp_path, samples, monkeypatch):
+    store = SampleStore(str(tmp_path))
+    store.ingest(samples.iloc[:6])
+    store.ingest(samples)
+    assert store.stale_batches() == []
+
+    iones = {ion: weight for ion, weight in sample_store.iones.items() if ion != "K"}
+    monkeypatch.setattr(sample_store, "iones", iones)
+    monkeypatch.setattr(sample_store, "log_transform_columns", ["Na"])
+    assert store.stale_batches() == [0, 1]
+
+    table = store.table()
+    assert store.stale_batches() == []
+    assert "K_meq" not in table.columns and "Cl_log" not in table.columns
+    assert_same(table, samples)
+    # Settled: nothing is computed again
+    assert store.refresh() == 0 and store.ingest(samples)["unchanged"] == 12
+
+
+def test_compact_keeps_the_removed_samples_out(tmp_path, samples, monkeypatch):
+    store = SampleStore(str(tmp_path))
+    store.ingest(samples.iloc[:6])
+    store.ingest(samples)
+    kept = samples.drop(index=[1, 7])
+    store.ingest(kept, remove_missing=True)
+    before = store.table()
+
+    # Interrupted after writing the compacted partition
+    remove = os.remove
+    monkeypatch.setattr(os, "remove", lambda path: (_ for _ in ()).throw(OSError("interrupted")))
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.setattr(os, "remove", remove)
+    pd.testing.assert_frame_equal(store.table(), before)
+
+    store.compact()
+    assert len(store.partitions()) == 1
+    pd.testing.assert_frame_equal(store.table(), before)
+    assert_same(before, kept)
+
+    # Compacted rows are still refreshed when the settings change
+    monkeypatch.setattr(sample_store, "log_transform_columns", ["Na"])
+    assert store.refresh() == len(kept)
+    assert "Cl_log" not in store.table().columns
+
+
+def test_keys_match_whatever_their_types(tmp_path, samples):
+    # First read: dates stored as text and integer codes as floats (as in a
+    # copy of the sheet with mixed columns); second read: typed values
+    store = SampleStore(str(tmp_path))
+    first = samples.iloc[:3].copy()
+    first["Nombre"] = [101.0, 102.0, 103.0]
+    first["Fecha"] = first["Fecha"].map(str).astype(object)
+    store.ingest(first)
+
+    second = samples.iloc[:4].copy()
+    second["Nombre"] = pd.Series([101, 102, 103, 104], dtype=object, index=second.index)
+    assert store.ingest(second) == {"new": 1, "changed": 0, "unchanged": 3, "removed": 0}
+    assert len(store.table()) == 4
+    assert store.ingest(second, remove_missing=True)["removed"] == 0
+
+
+def test_workbook_edited_between_ingests(tmp_path, samples):
+    from utils.cached_reader import read_excel_cached
+
+    workbook = str(tmp_path / "TablaShape.xlsx")
+    sheet = samples.iloc[:3].copy()
+    sheet["Fecha"] = sheet["Fecha"].astype(object)
+    sheet.loc[2, "Fecha"] = "sin fecha"  # a mixed date column
+    sheet.to_excel(workbook, sheet_name="Termales", index=False)
+    store = SampleStore(str(tmp_path / "samples"))
+    cache_dir = str(tmp_path / "cache")
+    store.ingest(read_excel_cached(workbook, "Termales", cache_dir=cache_dir), remove_missing=True)
+    assert store.ingest(read_excel_cached(workbook, "Termales", cache_dir=cache_dir),
+                        remove_missing=True)["unchanged"] == 3
+
+    # One more row in the spreadsheet, and a corrected date
+    edited = pd.concat([sheet, samples.iloc[[3]]], ignore_index=True)
+    edited.loc[1, "Fecha"] = pd.Timestamp("2020-02-15")
+    edited.to_excel(workbook, sheet_name="Termales", index=False)
+    counts = store.ingest(read_excel_cached(workbook, "Termales", cache_dir=cache_dir), remove_missing=True)
+    assert counts == {"new": 2, "changed": 0, "unchanged": 2, "removed": 1}
+    table = store.table()
+    assert len(table) == 4
+    assert sorted(map(str, table["Fecha"])) == sorted(map(str, edited["Fecha"]))
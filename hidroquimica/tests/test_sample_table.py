@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sample_table import SampleTable
+
+complex_column, basin_column, date_column = "Complejo", "Subcuenca", "Fecha"
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(4)
+    n = 300
+    df = pd.DataFrame({
+        "id": np.arange(n),
+        complex_column: rng.choice(["Azufral", "Cumbal", "Chiles", None], n),
+        basin_column: rng.choice(["Guaitara", "Crater", "Blanco", None], n),
+        date_column: pd.Timestamp("2010-01-01") + pd.to_timedelta(rng.integers(0, 4000, n), unit="D"),
+        "pH": rng.uniform(2, 8, n),
+    })
+    df.loc[rng.random(n) < 0.05, date_column] = pd.NaT
+    return df
+
+
+def isin(column, values):
+    values = values if isinstance(values, list) else [values]
+    mask = column.isin([v for v in values if v is not None])
+    return mask | column.isna() if None in values else mask
+
+
+cases = [
+    ({complex_column: "Azufral"}, None, None, None),
+    ({complex_column: "Azufral", basin_column: "Guaitara"}, None, "2012-03-01", "2015-06-30"),
+    ({basin_column: ["Crater", None]}, None, None, "2013-01-01"),
+    (None, {basin_column: "Crater"}, None, None),
+    (None, {complex_column: ["Cumbal", "Chiles"]}, "2014-01-01", None),
+    ({complex_column: None}, {basin_column: "Blanco"}, "2011-01-01", "2018-12-31"),
+    ({complex_column: "Nevado"}, None, None, None),
+    (None, None, None, None),
+]
+
+
+@pytest.mark.parametrize("filters, exclude, start, end", cases)
+def test_select_matches_boolean_masks(samples, filters, exclude, start, end):
+    table = SampleTable(samples, [complex_column, basin_column], date_column)
+    selected = table.select(filters, exclude, start, end)
+
+    mask = pd.Series(True, index=samples.index)
+    for column, values in (filters or {}).items():
+        mask &= isin(samples[column], values)
+    for column, values in (exclude or {}).items():
+        mask &= ~isin(samples[column], values)
+    if start is not None or end is not None:
+        dates = samples[date_column]
+        mask &= dates.notna()
+        if start is not None:
+            mask &= dates >= pd.Timestamp(start)
+        if end is not None:
+            mask &= dates <= pd.Timestamp(end)
+    expected = samples[mask]
+
+    assert sorted(selected["id"]) == sorted(expected["id"])
+    pd.testing.assert_frame_equal(
+        selected.sort_values("id").reset_index(drop=True)[["id", "pH", date_column]],
+        expected.sort_values("id").reset_index(drop=True)[["id", "pH", date_column]])
+    # Within each group the samples are in date order
+    for _, group in selected.groupby([complex_column, basin_column], observed=True, dropna=False):
+        dated = group[date_column].dropna()
+        assert dated.is_monotonic_increasing
+
+
+def test_apply_counts_match_groupby(samples):
+    table = SampleTable(samples, [complex_column, basin_column], date_column)
+    counts = table.apply(len, by=[complex_column], start="2012-01-01")
+    dated = samples[samples[date_column] >= pd.Timestamp("2012-01-01")]
+    expected = dated.groupby(complex_column, dropna=False).size()
+    assert {k if not pd.isna(k) else None: v for k, v in counts.items() if v} == \
+        {k if not pd.isna(k) else None: v for k, v in expected.items()}
+
+
+def test_range_without_date_column(samples):
+    table = SampleTable(samples.drop(columns=date_column), [complex_column], date_column)
+    assert len(table.select({complex_column: "Cumbal"})) == (samples[complex_column] == "Cumbal").sum()
+    with pytest.raises(ValueError):
+        table.select(start="2012-01-01")
+    with pytest.raises(KeyError):
+        table.select({basin_column: "Crater"})
@@ -0,0 +1,166 @@
+"""
+Cached Excel reads.
+
+The first read of a sheet parses the workbook with pd.read_excel and keeps a
+typed Parquet copy in config.excel_cache_dir; later reads of the same sheet
+load the copy while the workbook keeps the same path, mtime and size, so a
+script run costs milliseconds instead of a full parse. `columns` loads only
+some columns from the copy.
+
+Parquet needs one type per column: the columns that mix numbers, dates and
+text ("<0.01", "ND", "sin fecha") are stored as a float, an integer, a
+timestamp and a text part and put back together on load, so ints stay ints
+and dates stay dates (as pd.Timestamp). The first read returns the frame
+read back from the copy, so the values have the same types whether the
+sheet came from the workbook or from the cache.
+"""
+import os
+import json
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import excel_cache_dir
+
+# Bump when the layout of the cached files changes
+cache_version = 2
+# Parts of a mixed column, in the order they are put back together
+mixed_parts = ("c", "n", "d", "t")
+
+
+def cache_path(file_path, sheet_name=0, cache_dir=excel_cache_dir):
+    """Parquet copy of a sheet (cache_dir=None: .excel_cache next to the workbook)."""
+    file_path = os.path.abspath(file_path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(file_path), ".excel_cache")
+    key = hashlib.sha1(f"{file_path}|{sheet_name!r}".encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(cache_dir, f"{stem}_{key}.parquet")
+
+
+def _source_stamp(file_path, sheet_name):
+    stat = os.stat(file_path)
+    return {
+        "version": cache_version,
+        "path": os.path.abspath(file_path),
+        "sheet": repr(sheet_name),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+def typed_parquet_info(path):
+    """Layout and user metadata of a file written by write_typed_parquet (None if unreadable)."""
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(path):
+        return None
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+        return json.loads(metadata[b"excel_cache"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def write_typed_parquet(df, path, metadata=None):
+    """
+    Writes `df` to Parquet whatever its headers (stored with positional
+    names) and its mixed number/date/text columns, with `metadata` (JSON).
+    The file is written aside and renamed, so readers never see half a file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    stored = {}
+    mixed = []
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        if column.dtype == object:
+            try:
+                pa.array(column, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Floats, ints and dates in a column each, everything else as text
+                present = column.notna()
+                is_int = present & column.map(
+                    lambda v: isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)))
+                is_float = present & column.map(lambda v: isinstance(v, (float, np.floating)))
+                is_date = present & column.map(lambda v: isinstance(v, datetime))
+                stored[f"n{i}"] = column.where(is_int).astype("Int64")
+                stored[f"d{i}"] = pd.to_datetime(column.where(is_date))
+                stored[f"t{i}"] = column.where(present & ~is_int & ~is_float & ~is_date).astype("string")
+                column = pd.to_numeric(column.where(is_float), errors="coerce")
+                mixed.append(i)
+        stored[f"c{i}"] = column
+    table = pa.Table.from_pandas(pd.DataFrame(stored, index=df.index), preserve_index=False)
+    info = {"columns": list(df.columns), "mixed": mixed, "metadata": metadata}
+    schema_metadata = dict(table.schema.metadata or {})
+    schema_metadata[b"excel_cache"] = json.dumps(info, default=str).encode("utf-8")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table.replace_schema_metadata(schema_metadata), partial)
+    os.replace(partial, path)
+
+
+def read_typed_parquet(path, columns=None, info=None):
+    """Reads back a write_typed_parquet file (only `columns`, those that exist, if given)."""
+    import pyarrow.parquet as pq
+
+    if info is None:
+        info = typed_parquet_info(path)
+    # Tuple headers (MultiIndex columns) come back from JSON as lists
+    names = [tuple(name) if isinstance(name, list) else name for name in info["columns"]]
+    positions = range(len(names)) if columns is None else [i for i, name in enumerate(names) if name in columns]
+    mixed = set(info["mixed"])
+    # Files of the first layout (sample store partitions) only have c and t parts
+    available = set(pq.read_schema(path).names)
+    parts = {i: [f"{part}{i}" for part in mixed_parts if f"{part}{i}" in available] if i in mixed else [f"c{i}"]
+             for i in positions}
+    table = pq.read_table(path, columns=[name for i in positions for name in parts[i]]).to_pandas()
+
+    data = {}
+    for i in positions:
+        column = table[f"c{i}"]
+        if i in mixed:
+            column = column.astype(object)
+            for name in parts[i][1:]:
+                part = table[name]
+                column = column.where(part.isna(), part.astype(object))
+        data[names[i]] = column
+    return pd.DataFrame(data, index=table.index, columns=[names[i] for i in positions])
+
+
+def read_excel_cached(file_path, sheet_name=0, columns=None, cache_dir=excel_cache_dir):
+    """
+    Reads a sheet like pd.read_excel, from its Parquet copy when the workbook
+    did not change.
+
+    Parameters:
+        file_path (str): Path to the Excel file.
+        sheet_name (str or int, optional): Name or index of the sheet. Defaults to the first sheet.
+        columns (list, optional): Only load these columns (those that exist, in the sheet order).
+        cache_dir (str, optional): Folder of the Parquet copies (see cache_path).
+
+    Returns:
+        pd.DataFrame: DataFrame containing the Excel data.
+    """
+    path = cache_path(file_path, sheet_name, cache_dir)
+    stamp = _source_stamp(file_path, sheet_name)
+    info = typed_parquet_info(path)
+    if info is not None and info.get("metadata") == {"source": stamp}:
+        return read_typed_parquet(path, columns, info)
+
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    try:
+        write_typed_parquet(df, path, {"source": stamp})
+        print(f"Excel cache saved to: {path}")
+        # Same types as the next reads, which come from the copy
+        return read_typed_parquet(path, columns)
+    except Exception as e:
+        # The cache is an optimization: a failed write never stops the read
+        print(f"Excel cache not saved ({e!r}): {file_path}")
+    if columns is not None:
+        df = df[[name for name in df.columns if name in columns]]
+    return df
@@ -1,18 +1,21 @@
-import pandas as pd
+from utils.cached_reader import read_excel_cached
 
 
-def read_excel_to_dataframe(file_path, sheet_name=0):
+def read_excel_to_dataframe(file_path, sheet_name=0, columns=None):
     """
     Read an Excel file and return as a pandas DataFrame.
+    Repeated reads of an unchanged file come from its Parquet copy
+    (see utils/cached_reader.py).
 
     Args:
         file_path (str): Path to the Excel file
         sheet_name (int or str): Sheet name or index (default: 0)
+        columns (list): Only these columns (default: all)
 
     Returns:
         pd.DataFrame: DataFrame containing the Excel data
     """
-    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    df = read_excel_cached(file_path, sheet_name, columns)
     return df
 
 
@@ -0,0 +1,239 @@
+"""
+Stage timing and memory instrumentation shared by all the pipelines.
+
+Usage:
+    from instrumentation import stage, write_report
+
+    with stage("read", file=file_path):
+        df = read_excel(file_path)
+    ...
+    write_report("run_report.json")  # or .csv
+
+Each stage records wall time, CPU time, the change of the resident memory
+of the process over the stage (rss_delta_mb) and the peak resident memory
+of the process so far (process_peak_rss_mb, a lifetime high-water mark:
+not the peak of the stage). Two environment variables enable the heavier
+tools for selected stages (comma separated stage names, or "all"):
+    BALANCE_PROFILE      cProfile of the stage, saved as .prof
+    BALANCE_TRACEMALLOC  tracemalloc peak of the stage (nested stages
+                         included) and its top allocations
+The files go to BALANCE_PROFILE_DIR (default: "profiles" in the working
+directory). BALANCE_REPORT overrides the path given to write_report.
+"""
+import os
+import sys
+import csv
+import json
+import time
+from datetime import datetime
+from contextlib import contextmanager
+
+profile_env = "BALANCE_PROFILE"
+tracemalloc_env = "BALANCE_TRACEMALLOC"
+profile_dir_env = "BALANCE_PROFILE_DIR"
+report_env = "BALANCE_REPORT"
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process since it started, in MB (None if unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return _windows_memory_mb("PeakWorkingSetSize")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def current_rss_mb():
+    """Resident memory of this process now, in MB (None if unavailable)."""
+    if sys.platform == "win32":
+        return _windows_memory_mb("WorkingSetSize")
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _windows_memory_mb(counter):
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+        return round(getattr(counters, counter) / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def _selected(stage_name, env_var):
+    value = os.environ.get(env_var, "")
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    return "all" in names or stage_name in names
+
+
+def _safe_name(text):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(text))
+
+
+class RunReport:
+    """Records of the stages run in this process."""
+
+    def __init__(self, name=None):
+        self.name = name or os.path.basename(sys.argv[0]) or "run"
+        self.started = datetime.now()
+        self.records = []
+        # Peaks seen so far by the traced stages that are running, outermost first
+        self._traced = []
+
+    @contextmanager
+    def stage(self, name, **labels):
+        profiler = None
+        if _selected(name, profile_env):
+            import cProfile
+            profiler = cProfile.Profile()
+
+        tracing = _selected(name, tracemalloc_env)
+        if tracing:
+            import tracemalloc
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            elif self._traced:
+                # Keep the peak of the enclosing stage before resetting it
+                self._traced[-1] = max(self._traced[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._traced.append(0)
+
+        rss_start = current_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            rss_end = current_rss_mb()
+            record = {
+                "stage": name,
+                **labels,
+                "wall_s": round(time.perf_counter() - wall_start, 4),
+                "cpu_s": round(time.process_time() - cpu_start, 4),
+                "rss_delta_mb": None if rss_start is None or rss_end is None else round(rss_end - rss_start, 1),
+                "process_peak_rss_mb": peak_rss_mb(),
+                "pid": os.getpid(),
+            }
+            n = len(self.records)
+            if profiler is not None:
+                path = self._output_path(name, n, labels, ".prof")
+                profiler.dump_stats(path)
+                record["profile"] = path
+            if tracing:
+                record.update(self._tracemalloc_record(name, n, labels))
+                if started_tracing:
+                    tracemalloc.stop()
+            self.records.append(record)
+
+    def _output_path(self, name, n, labels, extension):
+        output_dir = os.environ.get(profile_dir_env, "profiles")
+        os.makedirs(output_dir, exist_ok=True)
+        label = "_".join(_safe_name(v) for v in labels.values())
+        file_name = "_".join(p for p in [_safe_name(self.name), name, label, str(n)] if p)
+        return os.path.join(output_dir, file_name + extension)
+
+    def _tracemalloc_record(self, name, n, labels):
+        import tracemalloc
+        peak = max(self._traced.pop(), tracemalloc.get_traced_memory()[1])
+        if self._traced:
+            # The enclosing stage saw this peak too
+            self._traced[-1] = max(self._traced[-1], peak)
+        snapshot = tracemalloc.take_snapshot()
+        path = self._output_path(name, n, labels, ".tracemalloc.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            for stat in snapshot.statistics("lineno")[:25]:
+                f.write(f"{stat}\n")
+        return {"tracemalloc_peak_mb": round(peak / (1024 * 1024), 2), "tracemalloc": path}
+
+    def drain(self):
+        """Returns and clears the records (to ship them from a worker)."""
+        records, self.records = self.records, []
+        return records
+
+    def extend(self, records):
+        """Adds records collected in other processes."""
+        self.records.extend(records or [])
+
+    def summary(self):
+        """Totals per stage."""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {
+                "stage": record["stage"], "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                "max_rss_delta_mb": None, "process_peak_rss_mb": None})
+            total["calls"] += 1
+            total["wall_s"] = round(total["wall_s"] + record["wall_s"], 4)
+            total["cpu_s"] = round(total["cpu_s"] + record["cpu_s"], 4)
+            for key, total_key in [("rss_delta_mb", "max_rss_delta_mb"),
+                                   ("process_peak_rss_mb", "process_peak_rss_mb")]:
+                if record.get(key) is not None:
+                    total[total_key] = record[key] if total[total_key] is None else max(total[total_key], record[key])
+        return list(totals.values())
+
+    def write(self, path):
+        """Writes the report as JSON, or as CSV (one row per record) for .csv paths."""
+        path = os.environ.get(report_env, path)
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        if path.endswith(".csv"):
+            columns = []
+            for record in self.records:
+                columns += [key for key in record if key not in columns]
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.records)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "run": self.name,
+                    "started": self.started.isoformat(timespec="seconds"),
+                    "finished": datetime.now().isoformat(timespec="seconds"),
+                    "summary": self.summary(),
+                    "records": self.records,
+                }, f, indent=2, ensure_ascii=False, default=str)
+        print(f"Run report saved to: {path}")
+        return path
+
+
+report = RunReport()
+
+
+def stage(name, **labels):
+    """Times a stage in the report of this process."""
+    return report.stage(name, **labels)
+
+
+def write_report(path):
+    return report.write(path)
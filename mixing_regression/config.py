@@ -4,6 +4,10 @@ mixing_model_output_path = (
     "C:\Code\TIP\Balance_hidrico\results\mixing_model\mixing_results.xslx"
 )
 
+results_file = r"C:\Code\TIP\Balance_hidrico\results\mixing_model\results.xlsx"
+
+run_report_file = r"C:\Code\TIP\Balance_hidrico\results\mixing_model\run_report.json"
+
 keyword = {
     "end_member_type": "Tipo",
     "mix": "Mezcla",
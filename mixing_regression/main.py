@@ -1,9 +1,10 @@
 import pandas as pd
 from config import *
 from simple_mixing_regression import *
-from stats import *
 import itertools
 
+from instrumentation import stage, write_report
+
 
 def read_excel_file(file_path):
     """
@@ -52,12 +53,35 @@ def compute_mixing_results(df_samples_sets):
     return combined_results
 
 
-####USAGE EXAMPLE####
-df = read_excel_file(chemical_file_path)
-df_samples_sets = generate_grouped_samples_sets(df)
-combined_results = compute_mixing_results(df_samples_sets)
+def main(
+    file_path=chemical_file_path,
+    output_path=results_file,
+    report_path=run_report_file,
+    plot=True,
+):
+    """
+    Runs the mixing model for every combination of one sample per point.
+
+    Returns:
+        pd.DataFrame: Combined mixing results of all the sample sets.
+    """
+    with stage("read"):
+        df = read_excel_file(file_path)
+    with stage("sample_sets"):
+        df_samples_sets = generate_grouped_samples_sets(df)
+    with stage("mixing_solve"):
+        combined_results = compute_mixing_results(df_samples_sets)
+
+    if plot:
+        with stage("plot"):
+            from stats import generate_plot
+
+            generate_plot(combined_results)
+    with stage("write"):
+        combined_results.to_excel(output_path, index=False)
+    write_report(report_path)
+    return combined_results
+
 
-generate_plot(combined_results)
-combined_results.to_excel(
-    r"C:\Code\TIP\Balance_hidrico\results\mixing_model\results.xlsx", index=False
-)
+if __name__ == "__main__":
+    main()
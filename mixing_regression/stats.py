@@ -1,8 +1,6 @@
 import pandas as pd
 import numpy as np
 
-import matplotlib.pyplot as plt
-
 
 def group_by_element(df: pd.DataFrame) -> dict:
     """
@@ -24,6 +22,8 @@ def plot_histograms_with_error(groups: dict):
     Args:
         groups (dict): Dictionary of grouped DataFrames by 'element'.
     """
+    import matplotlib.pyplot as plt
+
     for element, group in groups.items():
         fig, ax = plt.subplots(figsize=(8, 5))
         bins = np.linspace(0, 1, 11)
@@ -75,6 +75,8 @@ def plot_histograms_with_lines(groups: dict):
     Args:
         groups (dict): Dictionary of grouped DataFrames by 'element'.
     """
+    import matplotlib.pyplot as plt
+
     for element, group in groups.items():
         fig, ax = plt.subplots(figsize=(8, 5))
         bins = np.linspace(0, 1, 101)
@@ -118,6 +120,8 @@ def plot_traditional_histograms(groups: dict):
     Args:
         groups (dict): Dictionary of grouped DataFrames by 'element'.
     """
+    import matplotlib.pyplot as plt
+
     for element, group in groups.items():
         fig, ax = plt.subplots(figsize=(8, 5))
         bins = np.linspace(0, 1, 21)
@@ -20,6 +20,10 @@ if ENTORNO == "TEST":
     carpeta_salida_temper = (
         "/app/data/results/modelos_hidroclimaticos/database/temperatura"
     )
+    carpeta_salida_precip = (
+        "/app/data/results/modelos_hidroclimaticos/database/precipitacion"
+    )
+    carpeta_reportes = "/app/data/results/modelos_hidroclimaticos"
 
 else:
     # Rutas en tu PC (Windows style)
@@ -28,10 +32,13 @@ else:
     carpeta_salida_temper = (
         BASE_DIR / "results" / "modelos_hidroclimaticos" / "database" / "temperatura"
     )
-
-    if not os.path.exists(carpeta_salida_temper):
-        os.makedirs(carpeta_salida_temper)
+    carpeta_salida_precip = (
+        BASE_DIR / "results" / "modelos_hidroclimaticos" / "database" / "precipitacion"
+    )
+    carpeta_reportes = BASE_DIR / "results" / "modelos_hidroclimaticos"
 
 # Convertir a string para evitar errores con librerías viejas
 ruta_shape = str(ruta_shape)
 carpeta_salida_temper = str(carpeta_salida_temper)
+carpeta_salida_precip = str(carpeta_salida_precip)
+carpeta_reportes = str(carpeta_reportes)
@@ -1,56 +1,73 @@
-import rioxarray
-import geopandas as gpd
-from shapely.geometry import mapping
 import os
 from config import *
 
-if not os.path.exists(carpeta_salida_precip):
-    os.makedirs(carpeta_salida_precip)
+from instrumentation import stage, write_report
 
-# --- 2. CARGAR POLÍGONO ---
-poligono = gpd.read_file(ruta_shape)
 
-# --- 3. DEFINIR PERIODO (30 AÑOS) ---
-anio_fin = 2021
-anio_inicio = anio_fin - 29  # Esto nos da 30 años exactos (1992-2021)
+def main(
+    ruta_shape=ruta_shape,
+    carpeta_salida=carpeta_salida_precip,
+    carpeta_reportes=carpeta_reportes,
+    anio_fin=2021,
+    n_anios=30,
+):
+    """Descarga la precipitación mensual de CHELSA de los `n_anios` hasta `anio_fin` y la recorta al polígono."""
+    import rioxarray
+    import geopandas as gpd
+    from shapely.geometry import mapping
 
-print(f"Iniciando descarga histórica de {anio_inicio} a {anio_fin}...")
+    os.makedirs(carpeta_salida, exist_ok=True)
 
-# --- 4. BUCLE ANIDADO (AÑOS Y MESES) ---
-for anio in range(anio_inicio, anio_fin + 1):
-    for mes in range(1, 13):
-        mes_str = str(mes).zfill(2)
+    # --- 2. CARGAR POLÍGONO ---
+    poligono = gpd.read_file(ruta_shape)
 
-        # Nombre único para cada archivo
-        nombre_final = f"prec_azufral_{anio}_{mes_str}.tif"
-        ruta_final = os.path.join(carpeta_salida_precip, nombre_final)
+    # --- 3. DEFINIR PERIODO (30 AÑOS) ---
+    anio_inicio = anio_fin - n_anios + 1  # 30 años dan 1992-2021
 
-        # MECANISMO DE REINICIO: Si el archivo ya existe, saltar al siguiente
-        if os.path.exists(ruta_final):
-            # Opcional: imprimir solo algunos para no llenar la pantalla
-            continue
+    print(f"Iniciando descarga histórica de {anio_inicio} a {anio_fin}...")
 
-        # URL de CHELSA (Nueva estructura confirmada)
-        url = f"https://os.unil.cloud.switch.ch/chelsa02/chelsa/global/monthly/pr/{anio}/CHELSA_pr_{mes_str}_{anio}_V.2.1.tif"
+    # --- 4. BUCLE ANIDADO (AÑOS Y MESES) ---
+    for anio in range(anio_inicio, anio_fin + 1):
+        for mes in range(1, 13):
+            mes_str = str(mes).zfill(2)
 
-        print(f"Descargando: {anio}-{mes_str}...")
+            # Nombre único para cada archivo
+            nombre_final = f"prec_azufral_{anio}_{mes_str}.tif"
+            ruta_final = os.path.join(carpeta_salida, nombre_final)
 
-        try:
-            with rioxarray.open_rasterio(url, masked=True) as src:
-                # Alinear coordenadas una sola vez o cuando cambie
-                if poligono.crs != src.rio.crs:
-                    poligono = poligono.to_crs(src.rio.crs)
+            # MECANISMO DE REINICIO: Si el archivo ya existe, saltar al siguiente
+            if os.path.exists(ruta_final):
+                # Opcional: imprimir solo algunos para no llenar la pantalla
+                continue
 
-                # Recortar al AOI
-                recorte = src.rio.clip(poligono.geometry.apply(mapping), poligono.crs)
+            # URL de CHELSA (Nueva estructura confirmada)
+            url = f"https://os.unil.cloud.switch.ch/chelsa02/chelsa/global/monthly/pr/{anio}/CHELSA_pr_{mes_str}_{anio}_V.2.1.tif"
 
-                # Guardar
-                recorte.rio.to_raster(ruta_final)
-                print(f"   ✅ Guardado: {nombre_final}")
+            print(f"Descargando: {anio}-{mes_str}...")
 
-        except Exception as e:
-            print(f"   ⚠️ No se pudo obtener {anio}-{mes_str}. Error: {e}")
-            # Si un año entero falla, es posible que no esté en esa carpeta (ej. años muy viejos)
-            # pero para 1992-2021 la estructura suele ser estable.
+            try:
+                with stage("download_clip", year=anio, month=mes_str):
+                    with rioxarray.open_rasterio(url, masked=True) as src:
+                        # Alinear coordenadas una sola vez o cuando cambie
+                        if poligono.crs != src.rio.crs:
+                            poligono = poligono.to_crs(src.rio.crs)
 
-print("\n🚀 ¡PROCESO FINALIZADO O COMPLETADO HASTA DONDE FUE POSIBLE!")
+                        # Recortar al AOI
+                        recorte = src.rio.clip(poligono.geometry.apply(mapping), poligono.crs)
+
+                        # Guardar
+                        recorte.rio.to_raster(ruta_final)
+                        print(f"   ✅ Guardado: {nombre_final}")
+
+            except Exception as e:
+                print(f"   ⚠️ No se pudo obtener {anio}-{mes_str}. Error: {e}")
+                # Si un año entero falla, es posible que no esté en esa carpeta (ej. años muy viejos)
+                # pero para 1992-2021 la estructura suele ser estable.
+
+    write_report(os.path.join(carpeta_reportes, "run_report_precipitacion.json"))
+
+    print("\n🚀 ¡PROCESO FINALIZADO O COMPLETADO HASTA DONDE FUE POSIBLE!")
+
+
+if __name__ == "__main__":
+    main()
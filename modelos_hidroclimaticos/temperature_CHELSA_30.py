@@ -1,9 +1,7 @@
-import rioxarray
-import geopandas as gpd
-from shapely.geometry import mapping
 import os
 from config import *
-import requests
+
+from instrumentation import stage, write_report
 
 os.environ["GDAL_NUM_THREADS"] = "1"  # Fuerza a usar solo 1 hilo
 os.environ["OMP_NUM_THREADS"] = "1"
@@ -14,6 +12,8 @@ def descargar_seguro(url, ruta_temp):
     Descarga el archivo por trozos (chunks) para no saturar RAM ni CPU.
     Retorna la ruta si tuvo éxito, o None si falló.
     """
+    import requests
+
     try:
         print(f"📥 Descargando archivo global (3 min aprox)...")
         with requests.get(url, stream=True, timeout=900) as r:
@@ -30,70 +30,93 @@ def descargar_seguro(url, ruta_temp):
         return None
 
 
-# --- 2. CARGAR POLÍGONO ---
-poligono = gpd.read_file(ruta_shape)
+def main(
+    ruta_shape=ruta_shape,
+    carpeta_salida=carpeta_salida_temper,
+    carpeta_reportes=carpeta_reportes,
+    anio_fin=2021,
+    n_anios=30,
+):
+    """
+    Descarga la temperatura mensual de CHELSA de los `n_anios` hasta `anio_fin`,
+    la recorta al polígono y la guarda en °C.
+    """
+    import rioxarray
+    import geopandas as gpd
+    from shapely.geometry import mapping
+
+    os.makedirs(carpeta_salida, exist_ok=True)
+
+    # --- 2. CARGAR POLÍGONO ---
+    poligono = gpd.read_file(ruta_shape)
+
+    # --- 3. DEFINIR PERIODO ---
+    anio_inicio = anio_fin - n_anios + 1
+
+    print(f"Iniciando descarga de TEMPERATURA de {anio_inicio} a {anio_fin}...")
+
+    # --- 4. BUCLE DE DESCARGA ---
+    for anio in range(anio_inicio, anio_fin + 1):
+        for mes in range(1, 13):
+            mes_str = str(mes).zfill(2)
 
-# --- 3. DEFINIR PERIODO ---
-anio_fin = 2021
-anio_inicio = anio_fin - 29
+            nombre_final = f"temp_azufral_{anio}_{mes_str}.tif"
+            ruta_final = os.path.join(carpeta_salida, nombre_final)
 
-print(f"Iniciando descarga de TEMPERATURA de {anio_inicio} a {anio_fin}...")
+            # MECANISMO DE REINICIO
+            if os.path.exists(ruta_final):
+                print(f"   ⏭️ Ya existe {nombre_final}, saltando...")
+                continue
 
-# --- 4. BUCLE DE DESCARGA ---
-for anio in range(anio_inicio, anio_fin + 1):
-    for mes in range(1, 13):
-        mes_str = str(mes).zfill(2)
+            # URL de CHELSA para Temperatura (tas)
+            url = f"https://os.unil.cloud.switch.ch/chelsa02/chelsa/global/monthly/tas/{anio}/CHELSA_tas_{mes_str}_{anio}_V.2.1.tif"
 
-        nombre_final = f"temp_azufral_{anio}_{mes_str}.tif"
-        ruta_final = os.path.join(carpeta_salida_temper, nombre_final)
+            print(f"Descargando Temperatura: {anio}-{mes_str}...")
 
-        # MECANISMO DE REINICIO
-        if os.path.exists(ruta_final):
-            print(f"   ⏭️ Ya existe {nombre_final}, saltando...")
-            continue
+            try:
+                with stage("download_clip", year=anio, month=mes_str):
+                    file = descargar_seguro(url, "temp.tif")
+                    with rioxarray.open_rasterio(
+                        file, chunks={"x": 1024, "y": 1024}, masked=True
+                    ) as src:
+                        if poligono.crs != src.rio.crs:
+                            poligono = poligono.to_crs(src.rio.crs)
 
-        # URL de CHELSA para Temperatura (tas)
-        url = f"https://os.unil.cloud.switch.ch/chelsa02/chelsa/global/monthly/tas/{anio}/CHELSA_tas_{mes_str}_{anio}_V.2.1.tif"
+                        # Recortar
+                        recorte = src.rio.clip(
+                            poligono.geometry.apply(mapping), poligono.crs, from_disk=True
+                        )
 
-        print(f"Descargando Temperatura: {anio}-{mes_str}...")
+                        # 2. CONVERSIÓN CORRECTA
+                        # CHELSA tas: (valor_crudo * 0.1) - 273.15
+                        # Forzamos a float para asegurar precisión decimal
+                        recorte_celsius = (recorte.astype(float) * 0.1) - 273.15
 
-        try:
-            file = descargar_seguro(url, "temp.tif")
-            with rioxarray.open_rasterio(
-                file, chunks={"x": 1024, "y": 1024}, masked=True
-            ) as src:
-                if poligono.crs != src.rio.crs:
-                    poligono = poligono.to_crs(src.rio.crs)
+                        # 3. LIMPIEZA DE METADATOS (Fundamental)
+                        # Eliminamos escalas y offsets previos para que el software GIS no los reaplique
+                        recorte_celsius.attrs["scale_factor"] = 1.0
+                        recorte_celsius.attrs["add_offset"] = 0.0
+                        recorte_celsius.rio.write_nodata(-9999, inplace=True)
 
-                # Recortar
-                recorte = src.rio.clip(
-                    poligono.geometry.apply(mapping), poligono.crs, from_disk=True
-                )
+                        print("Guardando archivo en °C...")
+                        # 4. Guardar como float32
+                        recorte_celsius.rio.to_raster(
+                            ruta_final, dtype="float32", driver="GTiff"
+                        )
+                        print(f"   ✅ Guardado: {nombre_final} (°C)")
 
-                # 2. CONVERSIÓN CORRECTA
-                # CHELSA tas: (valor_crudo * 0.1) - 273.15
-                # Forzamos a float para asegurar precisión decimal
-                recorte_celsius = (recorte.astype(float) * 0.1) - 273.15
+            except Exception as e:
+                print(f"   ⚠️ Falló {anio}-{mes_str}. Error: {e}")
 
-                # 3. LIMPIEZA DE METADATOS (Fundamental)
-                # Eliminamos escalas y offsets previos para que el software GIS no los reaplique
-                recorte_celsius.attrs["scale_factor"] = 1.0
-                recorte_celsius.attrs["add_offset"] = 0.0
-                recorte_celsius.rio.write_nodata(-9999, inplace=True)
+            finally:
+                if os.path.exists(file):
+                    os.remove(file)
+                    print(f"🗑️ Archivo global borrado para liberar espacio.")
 
-                print("Guardando archivo en °C...")
-                # 4. Guardar como float32
-                recorte_celsius.rio.to_raster(
-                    ruta_final, dtype="float32", driver="GTiff"
-                )
-                print(f"   ✅ Guardado: {nombre_final} (°C)")
+    write_report(os.path.join(carpeta_reportes, "run_report_temperatura.json"))
 
-        except Exception as e:
-            print(f"   ⚠️ Falló {anio}-{mes_str}. Error: {e}")
+    print("\n🚀 ¡PROCESO DE TEMPERATURA FINALIZADO!")
 
-        finally:
-            if os.path.exists(file):
-                os.remove(file)
-                print(f"🗑️ Archivo global borrado para liberar espacio.")
 
-print("\n🚀 ¡PROCESO DE TEMPERATURA FINALIZADO!")
+if __name__ == "__main__":
+    main()
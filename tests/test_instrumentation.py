@@ -0,0 +1,38 @@
+import numpy as np
+
+from instrumentation import RunReport
+
+
+def allocate(mb):
+    return np.ones(mb * 1024 * 1024 // 8)
+
+
+def test_nested_stage_keeps_the_outer_tracemalloc_peak(monkeypatch, tmp_path):
+    monkeypatch.setenv("BALANCE_TRACEMALLOC", "all")
+    monkeypatch.setenv("BALANCE_PROFILE_DIR", str(tmp_path))
+    report = RunReport("test")
+    with report.stage("outer"):
+        big = allocate(40)
+        del big
+        with report.stage("inner"):
+            small = allocate(4)
+            del small
+    inner, outer = report.records
+    assert inner["stage"] == "inner" and outer["stage"] == "outer"
+    assert 3.5 < inner["tracemalloc_peak_mb"] < 20
+    # The 40 MB allocated before the inner stage reset the peak still counts
+    assert outer["tracemalloc_peak_mb"] >= 40
+
+
+def test_stage_memory_fields():
+    report = RunReport("test")
+    with report.stage("work"):
+        data = allocate(50)
+        data[:] = 2
+    record = report.records[0]
+    assert "peak_rss_mb" not in record
+    assert record["process_peak_rss_mb"] is None or record["process_peak_rss_mb"] > 0
+    if record["rss_delta_mb"] is not None:
+        assert record["rss_delta_mb"] > 30
+    summary = report.summary()[0]
+    assert summary["max_rss_delta_mb"] == record["rss_delta_mb"]